@@ -0,0 +1,145 @@
+"""
+Throughput vs. recall benchmark for the embedding inference backends.
+
+Embeds a synthetic nutrition menu (see synthetic_menu.py) with every
+backend of ``rag_core.embeddings`` (torch, onnx, onnx-int8) and compares:
+
+- load time, and encode throughput for the menu chunks (chunks/s)
+- query encode latency, one question at a time (p50/p95 ms)
+- hit recall@k on the golden questions: the share whose top-k chunks
+  contain the right menu row
+- agreement@k with torch: how many of torch's top-k chunks the backend also
+  returns, and the mean cosine between its vectors and torch's
+
+Usage:
+    python benchmarks/embedding_backend_benchmark.py
+    python benchmarks/embedding_backend_benchmark.py --pages 100 --backends torch onnx-int8
+    python benchmarks/embedding_backend_benchmark.py --output backends.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKENDS, load_embedding_model
+from rag_core.ingest import chunk_text, extract_text_from_pdf
+from rag_core.stats import percentile
+from rag_core.vector_store import normalize_rows
+from synthetic_menu import generate_menu, golden_questions, write_menu_pdf
+
+
+def recall_at_k(expected, found):
+    """Fraction of the expected hits that were found."""
+    return len(set(expected) & set(found)) / max(len(expected), 1)
+
+
+def load_corpus(pages, questions, seed, workdir):
+    """Chunks of a synthetic menu PDF and its golden questions."""
+    os.makedirs(workdir, exist_ok=True)
+    menu = generate_menu(pages, seed=seed)
+    path = os.path.join(workdir, f"synthetic_menu_{pages}p_seed{seed}.pdf")
+    if not os.path.exists(path):
+        write_menu_pdf(path, menu)
+    chunks = chunk_text(extract_text_from_pdf(path))
+    golden = [{"question": q["question"], "hit": f"Item: {q['item']} |"}
+              for q in golden_questions(menu, count=questions, seed=seed)]
+    return chunks, golden
+
+
+def run_backend(backend, chunks, golden, model_name, k, batch_size):
+    """Benchmark one backend; returns (result dict, chunk vectors, top-k per question)."""
+    started = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_seconds = time.perf_counter() - started
+    model.encode(["warm up"])
+
+    started = time.perf_counter()
+    chunk_vectors = normalize_rows(model.encode(chunks, batch_size=batch_size))
+    encode_seconds = time.perf_counter() - started
+
+    latencies, top = [], []
+    for item in golden:
+        started = time.perf_counter()
+        query_vector = normalize_rows(model.encode(item["question"]))[0]
+        latencies.append(1000 * (time.perf_counter() - started))
+        top.append(list(np.argsort(-(chunk_vectors @ query_vector))[:k]))
+
+    hits = sum(any(item["hit"] in chunks[i] for i in found) for item, found in zip(golden, top))
+    result = {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "encode_seconds": encode_seconds,
+        "chunks_per_second": len(chunks) / encode_seconds,
+        "query_p50_ms": percentile(latencies, 0.50),
+        "query_p95_ms": percentile(latencies, 0.95),
+        f"hit_recall@{k}": hits / len(golden),
+    }
+    return result, chunk_vectors, top
+
+
+def run(backends, pages=50, questions=50, k=5, model_name=DEFAULT_EMBEDDING_MODEL,
+        batch_size=64, seed=0, workdir=None):
+    """Run the benchmark and return one result dict per backend."""
+    chunks, golden = load_corpus(pages, questions, seed,
+                                 workdir or os.path.join(tempfile.gettempdir(), "rag_benchmark"))
+    k = min(k, len(chunks))
+    results = []
+    reference = None  # torch's vectors and top-k, what the others are compared to
+    for backend in backends:
+        print(f"Benchmarking {backend} ...", file=sys.stderr)
+        result, vectors, top = run_backend(backend, chunks, golden, model_name, k, batch_size)
+        if backend == "torch":
+            reference = (vectors, top)
+        if reference is not None:
+            reference_vectors, reference_top = reference
+            result[f"agreement@{k}"] = float(np.mean(
+                [recall_at_k(expected, found) for expected, found in zip(reference_top, top)]
+            ))
+            result["cosine_to_torch"] = float(np.mean(np.sum(vectors * reference_vectors, axis=1)))
+        result["chunks"] = len(chunks)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="*", default=list(EMBEDDING_BACKENDS),
+                        choices=EMBEDDING_BACKENDS,
+                        help="Backends to compare (torch first to compare against it)")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--pages", type=int, default=50, help="Synthetic menu size in pages")
+    parser.add_argument("--questions", type=int, default=50, help="Golden questions")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per question")
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.backends, args.pages, args.questions, args.k, args.model,
+                  args.batch_size, args.seed)
+
+    k = min(args.k, results[0]["chunks"])
+    print(f"{'backend':<11}{'load s':>8}{'chunks/s':>10}{'query p50':>11}{'p95 ms':>8}"
+          f"{'recall':>8}{'agree':>7}{'cosine':>8}")
+    for row in results:
+        agreement = row.get(f"agreement@{k}")
+        cosine = row.get("cosine_to_torch")
+        print(f"{row['backend']:<11}{row['load_seconds']:>8.1f}{row['chunks_per_second']:>10.1f}"
+              f"{row['query_p50_ms']:>11.2f}{row['query_p95_ms']:>8.2f}"
+              f"{row[f'hit_recall@{k}']:>8.3f}"
+              f"{'' if agreement is None else f'{agreement:.3f}':>7}"
+              f"{'' if cosine is None else f'{cosine:.4f}':>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Load test: many concurrent chat sessions against a fake model server.
+
+Each virtual session is a thread that behaves like a customer at a kiosk:
+it waits a random think time, asks a quick-question button or a free-text
+question, reads the streamed answer, and keeps its own ``ChatSession``.
+Turns go through the same ``Assistant`` as dairi_o_chatbot.py: retrieval
+(with ``--index``), the stable prompt layout, single-flight coalescing and
+the fair LLM scheduler, ending at the fake LLM backend with the latency
+profile given on the command line.
+
+For every session count it reports throughput, time-to-first-token and
+full-answer latency (p50/p95/p99), busy rejections, shared answers, and the
+memory of this process (all sessions live in one process, as in Streamlit).
+
+Usage:
+    python benchmarks/load_test.py --sessions 1 10 50 100 --duration 30
+    python benchmarks/load_test.py --sessions 20 --first-token 1.5 --tokens-per-second 15 \\
+        --concurrency 4 --index dairio_chatbot/menu_index --output load.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core.assistant import Assistant, ChatSession
+from rag_core.dairio import QUICK_QUESTIONS, SYSTEM_PROMPT
+from rag_core.llm_backends import create_backend
+from rag_core.scheduler import LLMScheduler, SchedulerBusy
+from rag_core.stats import percentile
+from shared_index_memory import read_memory_kb
+from synthetic_menu import generate_menu, golden_questions
+
+FREE_TEXT_OPENERS = [
+    "",
+    "Hi! ",
+    "Quick one - ",
+    "My kid has a sports game later, ",
+    "I'm trying to eat better this month. ",
+]
+
+
+class SyntheticMenu:
+    """Stands in for a ``KnowledgeBase``: random synthetic menu rows as hits."""
+
+    source = "synthetic menu"
+
+    def __init__(self, seed=0):
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.rows = [
+            " | ".join(f"{key}: {value}" for key, value in item.items())
+            for page in generate_menu(5, seed=seed) for item in page
+        ]
+
+    def count(self):
+        return len(self.rows)
+
+    def search(self, query, n_results=5):
+        with self._lock:
+            return self._rng.sample(self.rows, n_results)
+
+
+def load_knowledge(index_path, seed=0):
+    """A prebuilt menu index, or synthetic rows if there is none."""
+    if not index_path:
+        return SyntheticMenu(seed)
+    from rag_core.knowledge import KnowledgeBase
+    from rag_core.menu_index import MenuIndex
+
+    return KnowledgeBase.from_menu_index(MenuIndex.load(index_path))
+
+
+class LoadRun:
+    """Shared state for one session count: a fresh assistant plus results."""
+
+    def __init__(self, args, knowledge):
+        self.args = args
+        self.knowledge = knowledge
+        backend = create_backend(
+            "fake",
+            first_token=args.first_token,
+            tokens_per_second=args.tokens_per_second,
+            jitter=args.jitter,
+            answer_words=args.answer_words,
+            prefill_ms_per_token=args.prefill_ms_per_token,
+        )
+        self.assistant = Assistant(
+            backend,
+            SYSTEM_PROMPT,
+            scheduler=LLMScheduler(max_concurrency=args.concurrency,
+                                   max_queue_wait=args.max_wait),
+        )
+        self.free_text = [q["question"] for q in golden_questions(generate_menu(5), count=100)]
+        self.lock = threading.Lock()
+        self.first_token = []
+        self.total = []
+        self.output_tokens = 0
+        self.busy = 0
+        self.errors = 0
+
+    def ask(self, session, question, quick_question):
+        """One turn, as the app does it; returns the answer text."""
+        started = time.perf_counter()
+        first = None
+        pieces = []
+        for piece in self.assistant.chat(session, question, quick_question):
+            if first is None:
+                first = time.perf_counter() - started
+            pieces.append(piece)
+        total = time.perf_counter() - started
+        with self.lock:
+            self.first_token.append(first if first is not None else total)
+            self.total.append(total)
+            self.output_tokens += len(pieces)
+        return "".join(pieces)
+
+    def session(self, number, deadline):
+        rng = random.Random(self.args.seed * 100003 + number)
+        session = ChatSession(session_id=f"session-{number}", knowledge=self.knowledge)
+        time.sleep(rng.uniform(0, self.args.think_time))  # don't all start at once
+        while time.monotonic() < deadline:
+            quick = rng.random() < self.args.quick_ratio
+            if quick:
+                question = rng.choice(QUICK_QUESTIONS)
+            else:
+                question = rng.choice(FREE_TEXT_OPENERS) + rng.choice(self.free_text)
+            session.messages.append({"role": "user", "content": question})
+            try:
+                answer = self.ask(session, question, quick)
+                session.messages.append({"role": "assistant", "content": answer})
+            except SchedulerBusy:
+                session.messages.pop()
+                with self.lock:
+                    self.busy += 1
+            except Exception:
+                session.messages.pop()
+                with self.lock:
+                    self.errors += 1
+            time.sleep(rng.expovariate(1 / self.args.think_time) if self.args.think_time else 0)
+
+
+def run_level(args, knowledge, sessions):
+    """Drive `sessions` virtual sessions for args.duration seconds."""
+    run = LoadRun(args, knowledge)
+    memory_before = read_memory_kb()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=run.session, args=(number, deadline), daemon=True)
+        for number in range(sessions)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    peak = dict(memory_before)
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+        now = read_memory_kb()
+        peak = {key: max(peak[key], now[key]) for key in peak}
+    elapsed = time.perf_counter() - started
+
+    turns = len(run.total)
+    metrics = run.assistant.metrics()
+    usage = metrics["usage"]
+    return {
+        "sessions": sessions,
+        "seconds": elapsed,
+        "turns": turns,
+        "turns_per_second": turns / elapsed,
+        "output_tokens_per_second": run.output_tokens / elapsed,
+        "first_token_p50": percentile(run.first_token, 0.50),
+        "first_token_p95": percentile(run.first_token, 0.95),
+        "first_token_p99": percentile(run.first_token, 0.99),
+        "total_p50": percentile(run.total, 0.50),
+        "total_p95": percentile(run.total, 0.95),
+        "total_p99": percentile(run.total, 0.99),
+        "busy_rejections": run.busy,
+        "errors": run.errors,
+        "shared_answers": metrics["flights"]["coalesced"],
+        "model_calls": usage["calls"],
+        "prompt_cache_hit_rate": usage["cache_hit_rate"],
+        "memory_before_kb": memory_before,
+        "memory_peak_kb": peak,
+        "rss_growth_per_session_kb": (peak["rss_kb"] - memory_before["rss_kb"]) / sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the chat pipeline with virtual sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50, 100],
+                        help="Concurrent session counts to run, one after another")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per session count")
+    parser.add_argument("--think-time", type=float, default=5.0,
+                        help="Mean seconds a customer waits between questions")
+    parser.add_argument("--quick-ratio", type=float, default=0.4,
+                        help="Share of turns that are quick-question buttons")
+    parser.add_argument("--index", help="Prebuilt menu index for real retrieval "
+                                        "(default: synthetic menu rows as context)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Scheduler slots")
+    parser.add_argument("--max-wait", type=float, default=30.0, help="Scheduler queue deadline")
+    fake = parser.add_argument_group("fake LLM latency profile")
+    fake.add_argument("--first-token", type=float, default=0.5)
+    fake.add_argument("--tokens-per-second", type=float, default=30.0)
+    fake.add_argument("--jitter", type=float, default=0.2)
+    fake.add_argument("--answer-words", type=int, default=60)
+    fake.add_argument("--prefill-ms-per-token", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    knowledge = load_knowledge(args.index, seed=args.seed)
+
+    print(f"{'sessions':>8}{'turns/s':>9}{'tok/s':>8}{'TTFT p50':>10}{'p95':>7}{'p99':>7}"
+          f"{'total p95':>11}{'busy':>6}{'shared':>8}{'RSS MB':>8}{'KB/sess':>9}")
+    results = []
+    for sessions in args.sessions:
+        row = run_level(args, knowledge, sessions)
+        results.append(row)
+        print(f"{sessions:>8}{row['turns_per_second']:>9.2f}{row['output_tokens_per_second']:>8.0f}"
+              f"{row['first_token_p50']:>10.2f}{row['first_token_p95']:>7.2f}"
+              f"{row['first_token_p99']:>7.2f}{row['total_p95']:>11.2f}"
+              f"{row['busy_rejections']:>6}{row['shared_answers']:>8}"
+              f"{row['memory_peak_kb']['rss_kb'] / 1024:>8.1f}"
+              f"{row['rss_growth_per_session_kb']:>9.1f}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Recall vs. memory benchmark for compact embedding storage.
+
+Embeds the nutrition PDF once, then compares each storage mode of
+``QuantizedVectorStore`` against exact float32 search:
+
+- memory used by the vector arrays
+- recall@k (how many of the exact top-k hits the mode also returns)
+- average query latency
+
+Usage:
+    python benchmarks/quantization_benchmark.py --pdf dairi_o_nutrition.pdf
+    python benchmarks/quantization_benchmark.py --pdf menu.pdf -k 5 --output results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core.ingest import extract_text_from_pdf, chunk_text
+from rag_core.vector_store import QuantizedVectorStore, normalize_rows
+
+DEFAULT_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                           "AI_Chatbot_Workshop_Feb2026.pdf")
+
+# Questions customers actually ask (see DAIRI_O_README.md)
+NUTRITION_QUESTIONS = [
+    "What's the highest protein item?",
+    "What are the healthiest options?",
+    "Show me low-calorie choices",
+    "Compare burger vs. chicken",
+    "What vegetarian options exist?",
+    "What are the macros for the plain grilled chicken sandwich?",
+    "How much protein is in the veggie burger?",
+    "Which item has the least sodium?",
+    "Compare calories between hamburger and double burger",
+    "What's healthier: crispy or grilled chicken?",
+    "Show me all chicken options with their protein content",
+    "What's the best high-protein, low-calorie option?",
+    "I want something under 400 calories",
+    "Tell me about your salads",
+    "How many calories in a Dilly Bar?",
+    "How much sugar is in a medium Blizzard?",
+]
+
+MODES = [
+    ("float32", False),
+    ("float16", False),
+    ("int8", False),
+    ("int8", True),
+]
+
+
+def build_queries(chunks, extra=100, seed=0):
+    """Fixed questions plus the first line of a sample of chunks."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(chunks), size=min(extra, len(chunks)), replace=False)
+    sampled = [chunks[i].splitlines()[0][:200] for i in sorted(picks)]
+    return NUTRITION_QUESTIONS + sampled
+
+
+def recall_at_k(expected, found):
+    """Fraction of the expected hits that were found."""
+    return len(set(expected) & set(found)) / max(len(expected), 1)
+
+
+def run(pdf_path, k=5, model_name="all-MiniLM-L6-v2"):
+    """Run the benchmark and return one result dict per storage mode."""
+    from sentence_transformers import SentenceTransformer
+
+    chunks = chunk_text(extract_text_from_pdf(pdf_path))
+    model = SentenceTransformer(model_name)
+    chunk_vectors = normalize_rows(model.encode(chunks, batch_size=64))
+    queries = build_queries(chunks)
+    query_vectors = normalize_rows(model.encode(queries, batch_size=64))
+
+    # Ground truth: exact float32 top-k
+    exact_scores = query_vectors @ chunk_vectors.T
+    k = min(k, len(chunks))
+    expected = [list(np.argsort(-row)[:k]) for row in exact_scores]
+
+    ids = [f"chunk_{i}" for i in range(len(chunks))]
+    results = []
+    for dtype, rerank in MODES:
+        store = QuantizedVectorStore(dtype=dtype, keep_full_precision=rerank)
+        store.add(embeddings=chunk_vectors, documents=chunks, ids=ids)
+
+        recalls = []
+        start = time.perf_counter()
+        for query_vector, truth in zip(query_vectors, expected):
+            hits = store.search(query_vector, n_results=k)
+            recalls.append(recall_at_k(truth, [i for i, _ in hits]))
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            "mode": dtype + ("+rerank" if rerank else ""),
+            "chunks": len(chunks),
+            "dim": store.dim,
+            "memory_bytes": store.memory_bytes(),
+            "bytes_per_vector": store.memory_bytes() / max(len(chunks), 1),
+            f"recall@{k}": float(np.mean(recalls)),
+            "query_ms": 1000 * elapsed / len(queries),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="Nutrition PDF to index")
+    parser.add_argument("-k", type=int, default=5, help="Results per query")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.pdf, k=args.k)
+
+    print(f"{'mode':<14}{'memory (KB)':>12}{'bytes/vec':>11}{'recall':>9}{'query ms':>10}")
+    for row in results:
+        print(f"{row['mode']:<14}{row['memory_bytes'] / 1024:>12.1f}"
+              f"{row['bytes_per_vector']:>11.0f}{row[f'recall@{args.k}']:>9.3f}"
+              f"{row['query_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
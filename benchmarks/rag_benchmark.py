@@ -0,0 +1,347 @@
+"""
+Reproducible benchmark for the ingestion and query paths, without Streamlit.
+
+Runs on synthetic nutrition PDFs of several sizes (see synthetic_menu.py)
+plus the bundled workshop PDF, and measures for each:
+
+- extraction: PDF -> text + tables (pages/s)
+- chunking: text -> chunks
+- embedding: chunk encoding throughput (chunks/s)
+- index build: adding the vectors to a ``QuantizedVectorStore``
+- query latency: query encoding, vector search, cross-encoder re-ranking
+  (with ``--cross-encoder``) and a full answer through the fake LLM
+  backend (p50/p95, milliseconds)
+- recall@k on a golden question set: the share of questions whose
+  top-k chunks contain the right menu row ("hit") and the asked-for
+  value ("answer"), and precision@1: how often the first chunk is the
+  right row
+
+Results go to a JSON file. Pass ``--compare`` with an earlier result file
+to print the change of every timing.
+
+Usage:
+    python benchmarks/rag_benchmark.py --output before.json
+    python benchmarks/rag_benchmark.py --sizes 10 100 --output after.json --compare before.json
+    python benchmarks/rag_benchmark.py --until chunk   # no embedding model needed
+    python benchmarks/rag_benchmark.py -k 3 --cross-encoder cross-encoder/ms-marco-MiniLM-L-6-v2
+    python benchmarks/rag_benchmark.py --embedding-backend onnx-int8 --compare before.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core.embeddings import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, load_embedding_model
+from rag_core.ingest import extract_pdf_content, chunk_text
+from rag_core.llm_backends import create_backend
+from rag_core.menu_index import DEFAULT_EMBEDDING_MODEL
+from rag_core.prompts import build_turn_messages
+from rag_core.reranker import CrossEncoderReranker
+from rag_core.stats import percentile
+from rag_core.vector_store import QuantizedVectorStore
+from synthetic_menu import generate_menu, golden_questions, write_menu_pdf
+
+BUNDLED_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                           "AI_Chatbot_Workshop_Feb2026.pdf")
+
+# Golden set for the bundled workshop slides: question -> text the right
+# chunk contains
+BUNDLED_QUESTIONS = [
+    ("Where do I add my Anthropic API key?", "Add Secret: ANTHROPIC_API_KEY"),
+    ("Why does basic RAG fail on tables?", "Text chunking splits table rows from headers"),
+    ("What does PyPDF2 extract from the nutrition table?", "PyPDF2 extracts"),
+    ("How many calories are in the plain grilled chicken sandwich?", "Calories: 280"),
+    ("How do we fix table handling?", "Use pdfplumber instead of PyPDF2"),
+    ("What chunk size should I use?", "Increase chunk size (500 → 1000 characters)"),
+    ("What are the key learning points?", "Context is everything in RAG"),
+    ("How do I make the chatbot portfolio-ready?", "Custom branding (Dairi-O green color scheme)"),
+    ("What advanced improvements can I try?", "Hybrid search (keyword + semantic)"),
+    ("What is the mission of the workshop?", "Build a chatbot for Dairi-O restaurant"),
+]
+
+DEFAULT_SIZES = [10, 100, 1000]
+STAGES = ["extract", "chunk", "embed", "query"]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def timed(function, *args, **kwargs):
+    """Call `function` and return (result, seconds)."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency_summary(seconds):
+    """p50/p95/mean of a list of durations, in milliseconds."""
+    ms = [1000 * s for s in seconds]
+    return {
+        "p50_ms": percentile(ms, 0.50),
+        "p95_ms": percentile(ms, 0.95),
+        "mean_ms": float(np.mean(ms)) if ms else 0.0,
+    }
+
+
+def prepare_datasets(sizes, include_bundled, workdir, seed, questions):
+    """Write the synthetic PDFs (reused if already there) and their golden sets."""
+    os.makedirs(workdir, exist_ok=True)
+    datasets = []
+    for pages in sizes:
+        menu = generate_menu(pages, seed=seed)
+        path = os.path.join(workdir, f"synthetic_menu_{pages}p_seed{seed}.pdf")
+        if not os.path.exists(path):
+            write_menu_pdf(path, menu)
+        golden = [
+            {"question": q["question"], "hit": f"Item: {q['item']} |", "answer": q["answer"]}
+            for q in golden_questions(menu, count=questions, seed=seed)
+        ]
+        datasets.append({"name": f"synthetic-{pages}p", "path": path, "pages": pages,
+                         "golden": golden})
+    if include_bundled:
+        import PyPDF2
+
+        golden = [{"question": q, "hit": text, "answer": text} for q, text in BUNDLED_QUESTIONS]
+        datasets.append({"name": "workshop-pdf", "path": BUNDLED_PDF,
+                         "pages": len(PyPDF2.PdfReader(BUNDLED_PDF).pages), "golden": golden})
+    return datasets
+
+
+def run_dataset(dataset, until, model, k, storage, batch_size, reranker=None):
+    """Benchmark one PDF up to stage `until`; returns its result dict."""
+    stages = STAGES[:STAGES.index(until) + 1]
+    result = {
+        "dataset": dataset["name"],
+        "pdf_sha256": file_sha256(dataset["path"]),
+        "pdf_bytes": os.path.getsize(dataset["path"]),
+        "pages": dataset["pages"],
+    }
+
+    content, seconds = timed(extract_pdf_content, dataset["path"])
+    result["extract"] = {
+        "seconds": seconds,
+        "pages_per_second": dataset["pages"] / seconds,
+        "text_chars": len(content["text"]),
+        "tables": len(content["tables"]),
+    }
+    if "chunk" not in stages:
+        return result
+
+    chunks, seconds = timed(chunk_text, content["text"])
+    result["chunk"] = {"seconds": seconds, "chunks": len(chunks)}
+    if "embed" not in stages or not chunks:
+        return result
+
+    vectors, seconds = timed(model.encode, chunks, batch_size=batch_size)
+    result["embed"] = {
+        "seconds": seconds,
+        "chunks_per_second": len(chunks) / seconds,
+        "batch_size": batch_size,
+    }
+
+    store = QuantizedVectorStore(dtype=storage)
+    _, seconds = timed(store.add, embeddings=vectors, documents=chunks,
+                       ids=[f"chunk_{i}" for i in range(len(chunks))])
+    result["index_build"] = {
+        "seconds": seconds,
+        "storage": storage,
+        "memory_bytes": store.memory_bytes(),
+    }
+    if "query" not in stages:
+        return result
+
+    # Stub LLM: no delays, so "answer" measures our own per-turn overhead
+    llm = create_backend("fake", first_token=0.0, tokens_per_second=0, jitter=0.0)
+    encode_times, search_times, rerank_times, answer_times = [], [], [], []
+    hits = answers = first_hits = 0
+    fetch = max(k, reranker.candidates) if reranker else k
+    for golden in dataset["golden"]:
+        start = time.perf_counter()
+        query_vector = model.encode(golden["question"])
+        encoded = time.perf_counter()
+        found = store.search(query_vector, n_results=fetch)
+        searched = time.perf_counter()
+        top = [chunks[row] for row, _ in found]
+        if reranker:
+            ranked = reranker.rerank(golden["question"], [{"text": chunk} for chunk in top], k)
+            top = [hit["text"] for hit in ranked]
+        reranked = time.perf_counter()
+        context = "\n\n".join(top)
+        messages = build_turn_messages([], golden["question"], f"\n\nNUTRITIONAL DATA:\n{context}")
+        llm.complete("You are a helpful nutrition assistant.", messages)
+        answered = time.perf_counter()
+
+        encode_times.append(encoded - start)
+        search_times.append(searched - encoded)
+        rerank_times.append(reranked - searched)
+        answer_times.append(answered - start)
+        hits += any(golden["hit"] in chunk for chunk in top)
+        first_hits += bool(top) and golden["hit"] in top[0]
+        answers += any(golden["hit"] in chunk and golden["answer"] in chunk for chunk in top)
+
+    questions = len(dataset["golden"])
+    result["query"] = {
+        "questions": questions,
+        "k": k,
+        "encode": latency_summary(encode_times),
+        "search": latency_summary(search_times),
+        "answer": latency_summary(answer_times),
+        f"hit_recall@{k}": hits / questions,
+        f"answer_recall@{k}": answers / questions,
+        "hit_precision@1": first_hits / questions,
+    }
+    if reranker:
+        result["query"]["rerank"] = latency_summary(rerank_times)
+        result["query"]["rerank_candidates"] = fetch
+    return result
+
+
+def environment():
+    """What the numbers were measured on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "git_commit": commit,
+    }
+
+
+def compare(old, new):
+    """Print the relative change of every timing between two result files."""
+    old_by_name = {row["dataset"]: row for row in old["results"]}
+    print(f"\n{'dataset':<18}{'metric':<28}{'before':>12}{'after':>12}{'change':>9}")
+    for row in new["results"]:
+        before = old_by_name.get(row["dataset"])
+        if before is None:
+            continue
+        for metric, old_value, new_value in _timings(before, row):
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            print(f"{row['dataset']:<18}{metric:<28}{old_value:>12.3f}{new_value:>12.3f}"
+                  f"{change:>+9.1%}")
+
+
+def _timings(before, after):
+    for stage in ("extract", "chunk", "embed", "index_build"):
+        if stage in before and stage in after:
+            yield f"{stage} seconds", before[stage]["seconds"], after[stage]["seconds"]
+    if "query" in before and "query" in after:
+        for step in ("encode", "search", "rerank", "answer"):
+            if step not in before["query"] or step not in after["query"]:
+                continue
+            for stat in ("p50_ms", "p95_ms"):
+                yield (f"query {step} {stat}", before["query"][step][stat],
+                       after["query"][step][stat])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES,
+                        help="Synthetic PDF sizes in pages")
+    parser.add_argument("--no-bundled", action="store_true",
+                        help="Skip the bundled workshop PDF")
+    parser.add_argument("--until", choices=STAGES, default=STAGES[-1],
+                        help="Last stage to run (each needs the ones before it)")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--embedding-backend", default=EMBEDDING_BACKEND,
+                        choices=EMBEDDING_BACKENDS,
+                        help="Embedding inference backend (default: RAG_EMBEDDING_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size")
+    parser.add_argument("--storage", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per question")
+    parser.add_argument("--cross-encoder",
+                        help="Re-rank the retrieved chunks with this cross-encoder")
+    parser.add_argument("--rerank-candidates", type=int, default=20,
+                        help="Chunks fetched for the cross-encoder to re-score")
+    parser.add_argument("--rerank-budget-ms", type=float, default=150.0,
+                        help="Most time re-ranking may take per question")
+    parser.add_argument("--questions", type=int, default=50,
+                        help="Golden questions per synthetic PDF")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "rag_benchmark"),
+                        help="Where the synthetic PDFs are written")
+    parser.add_argument("--output", default="rag_benchmark.json", help="Result file")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    model = None
+    if STAGES.index(args.until) >= STAGES.index("embed"):
+        model = load_embedding_model(args.model, args.embedding_backend)
+    reranker = None
+    if args.cross_encoder and args.until == "query":
+        reranker = CrossEncoderReranker(args.cross_encoder, candidates=args.rerank_candidates,
+                                        budget_ms=args.rerank_budget_ms)
+        reranker.warm_up()
+
+    datasets = prepare_datasets(args.sizes, not args.no_bundled, args.workdir,
+                                args.seed, args.questions)
+    results = []
+    for dataset in datasets:
+        print(f"Benchmarking {dataset['name']} ...", file=sys.stderr)
+        row = run_dataset(dataset, args.until, model, args.k, args.storage, args.batch_size,
+                          reranker)
+        results.append(row)
+        summary = ", ".join(
+            f"{stage} {row[stage]['seconds']:.2f}s"
+            for stage in ("extract", "chunk", "embed", "index_build") if stage in row
+        )
+        if "query" in row:
+            summary += (f", answer p95 {row['query']['answer']['p95_ms']:.1f} ms"
+                        f", hit recall@{args.k} {row['query'][f'hit_recall@{args.k}']:.2f}"
+                        f", precision@1 {row['query']['hit_precision@1']:.2f}")
+        print(f"  {summary}", file=sys.stderr)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {
+            "sizes": args.sizes,
+            "bundled": not args.no_bundled,
+            "until": args.until,
+            "embedding_model": args.model if model is not None else None,
+            "embedding_backend": args.embedding_backend if model is not None else None,
+            "batch_size": args.batch_size,
+            "storage": args.storage,
+            "k": args.k,
+            "cross_encoder": reranker.model_name if reranker else None,
+            "rerank_candidates": args.rerank_candidates if reranker else None,
+            "rerank_budget_ms": args.rerank_budget_ms if reranker else None,
+            "questions": args.questions,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-worker memory when several processes share one prebuilt menu index.
+
+Starts N worker processes, each loading the same menu index and running
+queries that touch every embedding and every chunk text. Each worker then
+reports from /proc (Linux only):
+
+- RSS: resident pages, counting shared page-cache pages in full
+- PSS: proportional share, where shared pages are split between processes
+- private: pages only this process uses
+
+With the memory-mapped index, private memory per worker should stay flat as
+workers are added, and PSS per worker should drop.
+
+Usage:
+    python benchmarks/shared_index_memory.py dairio_chatbot/menu_index --workers 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core.menu_index import MenuIndex
+
+
+def read_memory_kb():
+    """RSS, PSS and private memory (KB) of this process from smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_kb": fields.get("Rss", 0), "pss_kb": fields.get("Pss", 0), "private_kb": private}
+
+
+def worker(index_path, queries, ready, done, results):
+    index = MenuIndex.load(index_path)
+    before = read_memory_kb()
+
+    rng = np.random.default_rng(os.getpid())
+    dim = index.manifest["embedding_dim"]
+    for _ in range(queries):
+        index.query([rng.normal(size=dim)], n_results=5)
+    # Touch every chunk text as well, not only the top hits
+    text_chars = sum(len(text) for text in index.documents)
+
+    ready.wait()  # measure once every worker has mapped the index
+    after = read_memory_kb()
+    results.put({"before": before, "after": after, "text_chars": text_chars})
+    done.wait()
+
+
+def measure(index_path, workers, queries=20):
+    """Run `workers` processes and return the average memory per worker."""
+    ready = multiprocessing.Barrier(workers)
+    done = multiprocessing.Barrier(workers + 1)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(index_path, queries, ready, done, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+
+    def average(key):
+        return sum(report["after"][key] for report in reports) / len(reports)
+
+    return {key: average(key) for key in ("rss_kb", "pss_kb", "private_kb")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory with a shared menu index.")
+    parser.add_argument("index", help="Menu index directory")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'RSS MB':>10}{'PSS MB':>10}{'private MB':>12}")
+    for workers in args.workers:
+        memory = measure(args.index, workers)
+        print(f"{workers:>8}{memory['rss_kb'] / 1024:>10.1f}"
+              f"{memory['pss_kb'] / 1024:>10.1f}{memory['private_kb'] / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
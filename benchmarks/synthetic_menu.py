@@ -0,0 +1,208 @@
+"""
+Synthetic nutrition-table PDFs for benchmarks.
+
+Generates a fake fast-food nutrition guide of any size (one ruled table
+per page, like the real Dairi-O PDF) together with the facts it contains,
+so benchmarks can ask golden questions whose answers are known.
+
+The PDF is written by a tiny built-in writer (standard Helvetica font,
+Flate-compressed page streams), so no PDF library is needed. Everything is
+derived from the seed: the same arguments always give the same bytes.
+
+Usage:
+    python benchmarks/synthetic_menu.py menu_100.pdf --pages 100
+"""
+
+import argparse
+import itertools
+import random
+import zlib
+
+ADJECTIVES = [
+    "Classic", "Smoky", "Spicy", "Crispy", "Grilled", "Loaded", "Double", "Mini",
+    "Deluxe", "Southern", "Garden", "Honey", "Rustic", "Golden", "Fiery", "Zesty",
+    "Hearty", "Tangy", "Savory", "Sweet", "Toasted", "Frosted", "Blazing", "Harvest",
+    "Coastal", "Prairie", "Midnight", "Sunrise", "Triple", "Junior",
+]
+FLAVORS = [
+    "Bacon", "Cheddar", "Ranch", "Barbecue", "Buffalo", "Mushroom", "Jalapeno",
+    "Pepper Jack", "Avocado", "Teriyaki", "Chipotle", "Pesto", "Maple", "Garlic",
+    "Onion Ring", "Swiss", "Caesar", "Pickle", "Sriracha", "Cajun", "Brisket",
+    "Hickory", "Parmesan", "Mustard", "Truffle", "Salsa", "Pineapple", "Bourbon",
+]
+BASES = [
+    "Burger", "Chicken Sandwich", "Wrap", "Salad", "Hot Dog", "Fish Sandwich",
+    "Melt", "Sub", "Flatbread", "Quesadilla", "Taco", "Bowl", "Sliders", "Tenders",
+    "Nuggets", "Fries", "Tots", "Onion Rings", "Shake", "Sundae", "Cone", "Blizzard",
+    "Parfait", "Cookie", "Pretzel",
+]
+
+# (column header, item key, low, high) - header text matches the real menu
+COLUMNS = [
+    ("Item", "item", None, None),
+    ("Serving (g)", "serving_g", 80, 450),
+    ("Calories", "calories", 90, 1400),
+    ("Total Fat (g)", "fat_g", 0, 80),
+    ("Sodium (mg)", "sodium_mg", 10, 2400),
+    ("Carbs (g)", "carbs_g", 2, 160),
+    ("Sugars (g)", "sugars_g", 0, 110),
+    ("Protein (g)", "protein_g", 0, 70),
+]
+COLUMN_WIDTHS = [198, 50, 48, 54, 54, 46, 50, 52]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, in points
+MARGIN = 30
+ROW_HEIGHT = 15
+FONT_SIZE = 7
+
+
+def generate_menu(pages, items_per_page=20, seed=0):
+    """
+    Menu items for a guide of `pages` pages.
+
+    Returns:
+        list: One list of item dicts per page (keys as in ``COLUMNS``)
+    """
+    names = [" ".join(parts) for parts in itertools.product(ADJECTIVES, FLAVORS, BASES)]
+    if pages * items_per_page > len(names):
+        raise ValueError(f"At most {len(names)} unique items ({len(names) // items_per_page} pages)")
+
+    rng = random.Random(seed)
+    rng.shuffle(names)
+    menu = []
+    for page in range(pages):
+        items = []
+        for name in names[page * items_per_page:(page + 1) * items_per_page]:
+            item = {"item": name}
+            for _, key, low, high in COLUMNS[1:]:
+                item[key] = rng.randint(low, high)
+            items.append(item)
+        menu.append(items)
+    return menu
+
+
+def golden_questions(menu, count=50, seed=0):
+    """
+    Questions with known answers about random items of the menu.
+
+    Returns:
+        list: Dicts with "question", "item", "column" and "answer", where
+        "answer" is the "Column: value" text a correct context contains
+    """
+    templates = {
+        "calories": "How many calories are in the {item}?",
+        "protein_g": "How much protein does the {item} have?",
+        "sodium_mg": "What is the sodium content of the {item}?",
+        "fat_g": "How much total fat is in the {item}?",
+        "sugars_g": "How much sugar is in the {item}?",
+    }
+    headers = {key: header for header, key, _, _ in COLUMNS}
+    rng = random.Random(seed)
+    items = [item for page in menu for item in page]
+    questions = []
+    for item in rng.sample(items, min(count, len(items))):
+        column = rng.choice(sorted(templates))
+        questions.append({
+            "question": templates[column].format(item=item["item"]),
+            "item": item["item"],
+            "column": column,
+            "answer": f"{headers[column]}: {item[column]}",
+        })
+    return questions
+
+
+# ----------------------------------------------------------------------
+# Minimal PDF writer
+# ----------------------------------------------------------------------
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text(x, y, text, size=FONT_SIZE):
+    return f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({_escape(text)}) Tj ET"
+
+
+def _page_content(page_number, items):
+    ops = [
+        _text(MARGIN, PAGE_HEIGHT - MARGIN - 14, "Nutrition Information (synthetic)", size=14),
+        _text(MARGIN, PAGE_HEIGHT - MARGIN - 30, f"Menu page {page_number}", size=9),
+    ]
+
+    top = PAGE_HEIGHT - MARGIN - 45
+    rows = [[header for header, _, _, _ in COLUMNS]]
+    rows += [[str(item[key]) for _, key, _, _ in COLUMNS] for item in items]
+    bottom = top - ROW_HEIGHT * len(rows)
+    right = MARGIN + sum(COLUMN_WIDTHS)
+
+    # Ruled grid, so table extractors see the cells
+    ops.append("0.5 w")
+    for r in range(len(rows) + 1):
+        y = top - r * ROW_HEIGHT
+        ops.append(f"{MARGIN} {y} m {right} {y} l S")
+    x = MARGIN
+    for width in [0] + COLUMN_WIDTHS:
+        x += width
+        ops.append(f"{x} {top} m {x} {bottom} l S")
+
+    for r, row in enumerate(rows):
+        y = top - (r + 1) * ROW_HEIGHT + 4.5
+        x = MARGIN
+        for cell, width in zip(row, COLUMN_WIDTHS):
+            ops.append(_text(x + 3, y, cell))
+            x += width
+
+    ops.append(_text(MARGIN, bottom - 20,
+                     "2,000 calories a day is used for general nutrition advice. "
+                     "Values are synthetic test data.", size=7))
+    return "\n".join(ops).encode("latin-1")
+
+
+def write_menu_pdf(path, menu):
+    """Write `menu` (see ``generate_menu``) as a PDF, one table per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for page_number, items in enumerate(menu, 1):
+        content = zlib.compress(_page_content(page_number, items))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content)
+                       + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, xref))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic nutrition-table PDF.")
+    parser.add_argument("output", help="PDF file to write")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_menu_pdf(args.output, generate_menu(args.pages, args.items_per_page, args.seed))
+
+
+if __name__ == "__main__":
+    main()
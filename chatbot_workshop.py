@@ -8,13 +8,22 @@ This chatbot can:
 Perfect for beginners! Every section is clearly commented.
 """
 
+from rag_core import profiling
+profiling.start_from_env()  # RAG_PROFILE_STARTUP=1 reports import costs
+
+from rag_core import tracing
+
 import streamlit as st
-from ollama import chat
-from sentence_transformers import SentenceTransformer
-import chromadb
-from duckduckgo_search import DDGS
-import PyPDF2
-import io
+from rag_core.chat_history import HistoryView
+from rag_core.embeddings import load_embedding_model
+from rag_core.llm_backends import backend_from_env
+from rag_core.prompts import build_turn_messages, conversation_history
+from rag_core.sessions import MessageHistory
+
+# The heavy libraries (sentence_transformers, chromadb, PyPDF2 and
+# duckduckgo_search) are imported inside the functions that use them.
+# That way the chat page shows up right away, and you only wait for them
+# the first time you upload a document or search the web.
 
 # ============================================================================
 # PART 1: SETUP AND CONFIGURATION
@@ -25,13 +34,42 @@ st.set_page_config(page_title="AI Chatbot Workshop", page_icon="🤖", layout="w
 st.title("🤖 AI Chatbot with RAG & Search")
 st.caption("Built from scratch in Python!")
 
+# Chat messages shown at once (older ones load with a button)
+HISTORY_WINDOW = 20
+
 # Initialize session state - this keeps data between page refreshes
 if "messages" not in st.session_state:
-    st.session_state.messages = []  # Stores chat history
+    st.session_state.messages = MessageHistory()  # Stores chat history (oldest dropped when very long)
 
 if "documents_loaded" not in st.session_state:
     st.session_state.documents_loaded = False  # Track if docs are uploaded
 
+# Which chat messages to show (each one is prepared for display only once)
+if "history_view" not in st.session_state:
+    st.session_state.history_view = HistoryView(window=HISTORY_WINDOW, page_size=HISTORY_WINDOW)
+
+
+@st.cache_resource
+def get_llm_backend():
+    """
+    Connect to the AI model once and reuse that connection for every message.
+    
+    We use Ollama with a local model by default (no API keys needed!).
+    To switch models or use the Anthropic API instead, set environment
+    variables - no code changes:  LLM_MODEL=llama3.1  or  LLM_BACKEND=anthropic
+    """
+    return backend_from_env(default_backend="ollama", default_model="llama3.2")
+
+
+@st.cache_resource
+def get_tracer():
+    """
+    Time each step of every answer (searching, the AI call, ...).
+    
+    Set RAG_TRACE_FILE=traces.jsonl to save the timings - one line per answer.
+    """
+    return tracing.tracer_from_env()
+
 
 # ============================================================================
 # PART 2: DOCUMENT PROCESSING (RAG - Retrieval Augmented Generation)
@@ -47,10 +85,12 @@ def extract_text_from_pdf(pdf_file):
     Returns:
         str: All text from the PDF
     """
+    import PyPDF2
+    
     pdf_reader = PyPDF2.PdfReader(pdf_file)
     text = ""
     for page in pdf_reader.pages:
-        text += page.extract_text()
+        text += page.extract_text() or ""  # None for scanned pages
     return text
 
 
@@ -84,17 +124,23 @@ def chunk_text(text, chunk_size=500, overlap=50):
     return chunks
 
 
-def setup_vector_database(text_chunks):
+def setup_vector_database(text_chunks, metadatas=None):
     """
     Create a vector database from text chunks.
     This converts text into numbers (embeddings) so we can search by meaning.
     
     Args:
         text_chunks: List of text chunks to store
+        metadatas: One dict per chunk (which file it came from and its
+            number in that file), stored with the chunk so search results
+            can say where they came from
     """
     # Load the embedding model - this converts text to numbers
     st.info("📊 Converting text to embeddings (this might take a moment)...")
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    import chromadb
+    
+    # One copy of the model is shared by everyone using the app
+    embedding_model = load_embedding_model('all-MiniLM-L6-v2')
     
     # Create a vector database
     client = chromadb.Client()
@@ -109,20 +155,24 @@ def setup_vector_database(text_chunks):
     collection = client.create_collection("documents")
     
     # Add each chunk to the database
-    for i, chunk in enumerate(text_chunks):
-        # Convert text to embedding (a list of numbers)
-        embedding = embedding_model.encode(chunk).tolist()
-        
-        # Store in database
-        collection.add(
-            embeddings=[embedding],
-            documents=[chunk],
-            ids=[f"chunk_{i}"]
-        )
+    # (encoding and storing happen together, so they are timed as one step)
+    with tracing.span("index_build", chunks=len(text_chunks)):
+        if metadatas is None:
+            metadatas = [{"chunk_index": i} for i in range(len(text_chunks))]
+        for i, (chunk, metadata) in enumerate(zip(text_chunks, metadatas)):
+            # Convert text to embedding (a list of numbers)
+            embedding = embedding_model.encode(chunk).tolist()
+            
+            # Store in database
+            collection.add(
+                embeddings=[embedding],
+                documents=[chunk],
+                ids=[f"chunk_{i}"],
+                metadatas=[metadata]
+            )
     
     # Save to session state so we can use it later
     st.session_state.collection = collection
-    st.session_state.embedding_model = embedding_model
     st.success(f"✅ Processed {len(text_chunks)} chunks!")
 
 
@@ -141,13 +191,15 @@ def search_documents(query, n_results=3):
         return None
     
     # Convert the query to an embedding
-    query_embedding = st.session_state.embedding_model.encode(query).tolist()
+    with tracing.span("embed_query"):
+        query_embedding = load_embedding_model('all-MiniLM-L6-v2').encode(query).tolist()
     
     # Search the database
-    results = st.session_state.collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
+    with tracing.span("vector_query"):
+        results = st.session_state.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results
+        )
     
     # Combine the results into one text
     relevant_text = "\n\n".join(results['documents'][0])
@@ -170,6 +222,8 @@ def google_search(query, max_results=3):
     Returns:
         str: Formatted search results
     """
+    from duckduckgo_search import DDGS
+    
     try:
         # Create a search instance
         with DDGS() as ddgs:
@@ -230,33 +284,22 @@ Be conversational and helpful!"""
     should_search = any(keyword in user_message.lower() for keyword in search_keywords)
     
     if should_search:
-        search_results = google_search(user_message)
+        with tracing.span("google_search"):
+            search_results = google_search(user_message)
         context += f"\n\n{search_results}"
     
-    # Add context to the system message if we have any
-    if context:
-        system_message += f"\n\nADDITIONAL CONTEXT:{context}"
-    
-    # Prepare the messages for the AI
-    messages = [
-        {"role": "system", "content": system_message}
-    ]
+    # Prepare the messages for the AI (the system message is sent separately).
+    # The system message stays the same every turn and the chat history only
+    # grows at the end, so the model can reuse the work it already did on
+    # them. This turn's context goes last, together with the new question.
+    history = conversation_history(st.session_state.messages, user_message)
+    messages = build_turn_messages(history, user_message, context, "ADDITIONAL CONTEXT")
     
-    # Add chat history
-    for msg in st.session_state.messages:
-        messages.append({"role": msg["role"], "content": msg["content"]})
+    # Call the AI model (see get_llm_backend above)
+    with tracing.span("llm"):
+        response = get_llm_backend().complete(system_message, messages)
     
-    # Add the new user message
-    messages.append({"role": "user", "content": user_message})
-    
-    # Call the AI model
-    # We're using Ollama with a local model (no API keys needed!)
-    response = chat(
-        model='llama3.2',  # You can change this to any model you have in Ollama
-        messages=messages
-    )
-    
-    return response['message']['content']
+    return response
 
 
 # ============================================================================
@@ -276,20 +319,30 @@ with st.sidebar:
     )
     
     if uploaded_files and st.button("Process Documents"):
-        all_text = ""
-        
-        # Process each uploaded file
-        for uploaded_file in uploaded_files:
-            if uploaded_file.type == "application/pdf":
-                text = extract_text_from_pdf(uploaded_file)
-            else:  # txt file
-                text = uploaded_file.read().decode()
+        with get_tracer().turn("ingest", files=len(uploaded_files)):
+            texts = []
             
-            all_text += text + "\n\n"
-        
-        # Break into chunks and create vector database
-        chunks = chunk_text(all_text)
-        setup_vector_database(chunks)
+            # Process each uploaded file
+            with tracing.span("extract_pdf"):
+                for uploaded_file in uploaded_files:
+                    if uploaded_file.type == "application/pdf":
+                        text = extract_text_from_pdf(uploaded_file)
+                    else:  # txt file
+                        text = uploaded_file.read().decode()
+                    
+                    texts.append((uploaded_file.name, text))
+            
+            # Break each file into chunks (so every chunk knows its file)
+            # and create vector database
+            chunks, metadatas = [], []
+            with tracing.span("chunk_text"):
+                for name, text in texts:
+                    file_chunks = chunk_text(text)
+                    chunks.extend(file_chunks)
+                    metadatas.extend(
+                        {"source": name, "chunk_index": i} for i in range(len(file_chunks))
+                    )
+            setup_vector_database(chunks, metadatas)
         st.session_state.documents_loaded = True
     
     # Show status
@@ -300,16 +353,22 @@ with st.sidebar:
     
     # Clear chat button
     if st.button("🗑️ Clear Chat"):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
         st.rerun()
 
 # Main chat interface
 st.write("### Chat")
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.write(message["content"])
+# Display chat history - only the latest messages, so long chats stay fast.
+# Older ones are behind a "show earlier" button.
+history_view = st.session_state.history_view
+hidden, shown = history_view.visible(st.session_state.messages)
+if hidden and st.button(history_view.earlier_label(hidden)):
+    history_view.show_earlier()
+    hidden, shown = history_view.visible(st.session_state.messages)
+for item in shown:
+    with st.chat_message(item["role"]):
+        st.markdown(item["body"])
 
 # Chat input
 if prompt := st.chat_input("Type your message here..."):
@@ -322,7 +381,8 @@ if prompt := st.chat_input("Type your message here..."):
     # Get AI response
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
-            response = chat_with_ai(prompt)
+            with get_tracer().turn("chat"):
+                response = chat_with_ai(prompt)
             st.write(response)
     
     # Add AI response to chat
@@ -349,3 +409,9 @@ with st.expander("ℹ️ How to use this chatbot"):
     - We can also search Google for current information
     - Everything is sent to a local AI model (Llama) that generates a response
     """)
+
+# Startup profile (only shown when RAG_PROFILE_STARTUP=1)
+if profiling.enabled():
+    profiling.mark_interactive()
+    with st.expander("⏱️ Startup profile"):
+        st.code(profiling.format_report())
@@ -6,11 +6,36 @@ DISCLAIMER: This is an unofficial educational demo, not affiliated with Dairi-O.
 Created for AI workshop demonstration purposes.
 """
 
+import os
+import sys
+
+# Shared helpers live in rag_core/ at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core import profiling
+profiling.start_from_env()  # RAG_PROFILE_STARTUP=1 reports import costs
+
 import streamlit as st
-from ollama import chat
-from sentence_transformers import SentenceTransformer
-import chromadb
-import PyPDF2
+from rag_core import dairio, tracing
+from rag_core.chat_history import HistoryView
+from rag_core.scheduler import SchedulerBusy
+
+# This script is only the UI. Extraction, retrieval, prompting and the model
+# call live in rag_core (rag_core/dairio.py has the Dairi-O prompt and
+# settings), so they can also run without Streamlit.
+#
+# Heavy libraries (sentence_transformers pulls in torch, plus chromadb and
+# numpy) are imported inside the functions that need them, so the page
+# renders right away and only sessions that upload a PDF pay for them.
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Model, storage and queue settings are environment variables, read in
+# rag_core/dairio.py (see DAIRI_O_README.md for the full list).
+
+# Turns listed in the latency debug panel (RAG_TRACE_PANEL=1)
+TRACE_PANEL_TURNS = 10
 
 # ============================================================================
 # CUSTOM STYLING - Dairi-O Brand Colors
@@ -140,189 +165,107 @@ st.markdown("""
 # SESSION STATE
 # ============================================================================
 
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {
-            "role": "assistant",
-            "content": "👋 Hi! I'm your Dairi-O Nutrition Assistant! I can help you:\n\n"
-                      "🔍 Find nutritional info for menu items\n"
-                      "⚖️ Compare different options\n"
-                      "🥗 Suggest items based on your dietary goals\n"
-                      "📊 Answer questions about calories, protein, carbs, and more!\n\n"
-                      "What would you like to know?"
-        }
-    ]
-
-if "documents_loaded" not in st.session_state:
-    st.session_state.documents_loaded = False
-
-if "menu_stats" not in st.session_state:
-    st.session_state.menu_stats = None
+@st.cache_resource(show_spinner=False)
+def get_assistant():
+    """
+    The assistant shared by every session of this server process: pooled
+    connection to the model server, request queue, and latency tracer.
+    """
+    return dairio.create_assistant()
 
-# ============================================================================
-# DOCUMENT PROCESSING (RAG)
-# ============================================================================
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF with special handling for tables."""
-    try:
-        import pdfplumber
-        
-        all_text = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                
-                if tables:
-                    for table in tables:
-                        if table and len(table) > 0:
-                            headers = table[0]
-                            
-                            for row in table[1:]:
-                                if row and any(row):
-                                    row_text = []
-                                    for i, cell in enumerate(row):
-                                        if cell and i < len(headers) and headers[i]:
-                                            row_text.append(f"{headers[i]}: {cell}")
-                                    
-                                    all_text += " | ".join(row_text) + "\n\n"
-                
-                page_text = page.extract_text()
-                if page_text:
-                    all_text += page_text + "\n\n"
-        
-        return all_text
-    
-    except ImportError:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n\n"
-        return text
-
-
-def chunk_text(text, chunk_size=1000, overlap=100):
-    """Split text into chunks while preserving context."""
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
-        
-        if end < len(text):
-            newline_pos = text.rfind('\n', end - 100, end)
-            if newline_pos != -1:
-                end = newline_pos + 1
-        
-        chunk = text[start:end].strip()
-        
-        if chunk:
-            chunks.append(chunk)
-        
-        start = end - overlap
-    
-    return chunks
-
-
-def setup_vector_database(text_chunks):
-    """Create vector database from text chunks."""
-    with st.spinner("🔍 Analyzing nutritional data..."):
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        client = chromadb.Client()
-        
-        try:
-            client.delete_collection("documents")
-        except:
-            pass
-        
-        collection = client.create_collection("documents")
-        
-        for i, chunk in enumerate(text_chunks):
-            embedding = embedding_model.encode(chunk).tolist()
-            collection.add(
-                embeddings=[embedding],
-                documents=[chunk],
-                ids=[f"chunk_{i}"]
-            )
-        
-        st.session_state.collection = collection
-        st.session_state.embedding_model = embedding_model
+# This session's conversation: chat history and loaded menu data. Every
+# session starts with the prebuilt menu index, if there is one. The
+# conversation id is kept in the URL (?c=...), so a page refresh picks the
+# saved conversation back up.
+if "chat" not in st.session_state:
+    st.session_state.chat = dairio.new_session(st.query_params.get("c"))
 
+if "busy_notice" not in st.session_state:
+    st.session_state.busy_notice = None
 
-def search_documents(query, n_results=5):
-    """Search documents for relevant information."""
-    if "collection" not in st.session_state:
-        return None
-    
-    query_embedding = st.session_state.embedding_model.encode(query).tolist()
-    
-    results = st.session_state.collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
-    
-    relevant_text = "\n\n".join(results['documents'][0])
-    return relevant_text
 
+def prepare_message(message):
+    """Display form of a chat message, prepared once per message."""
+    role = message["role"]
+    return {"role": role, "avatar": "🤖" if role == "assistant" else "👤",
+            "body": message["content"]}
 
-# ============================================================================
-# CHATBOT LOGIC
-# ============================================================================
 
-def chat_with_ai(user_message):
-    """Main chatbot function with nutrition-specific prompting."""
-    
-    system_message = """You are a helpful nutrition assistant for Dairi-O restaurant. 
-    
-Your role:
-- Help customers understand nutritional information about menu items
-- Compare different options when asked
-- Suggest items based on dietary goals (high protein, low carb, etc.)
-- Be accurate with numbers from the nutritional data
-- Be friendly and encouraging about healthy choices
-
-When answering about nutritional information:
-- Always cite specific numbers (calories, protein, carbs, fat, sodium, etc.)
-- If comparing items, present info in an easy-to-read format
-- Highlight key differences when comparing
-- Use emojis occasionally to be friendly (but don't overdo it)
-
-Important:
-- You have access to the official Dairi-O nutritional information
-- Look carefully at the data to match items to their exact nutritional values
-- If you're not sure, say so rather than guessing
-- Remind users this is for informational purposes
-
-Be helpful, accurate, and supportive!"""
-    
-    # Search documents if available
-    context = ""
-    if st.session_state.documents_loaded:
-        doc_context = search_documents(user_message)
-        if doc_context:
-            context += f"\n\nNUTRITIONAL DATA:\n{doc_context}"
-    
-    if context:
-        system_message += f"\n\nRELEVANT INFORMATION:{context}"
-    
-    # Prepare messages
-    messages = [
-        {"role": "system", "content": system_message}
-    ]
-    
-    for msg in st.session_state.messages:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    
-    messages.append({"role": "user", "content": user_message})
-    
-    # Call AI
-    response = chat(
-        model='llama3.2',
-        messages=messages
+# Long sessions only show the latest messages; older ones load a page at a time
+if "history_view" not in st.session_state:
+    st.session_state.history_view = HistoryView(
+        window=dairio.HISTORY_WINDOW, page_size=dairio.HISTORY_WINDOW, prepare=prepare_message
     )
-    
-    return response['message']['content']
+
+assistant = get_assistant()
+chat = st.session_state.chat
+assistant.sessions.touch(chat)  # sessions left idle are started over
+if st.query_params.get("c") != chat.session_id:
+    st.query_params["c"] = chat.session_id
+
+
+# A menu being indexed in the background (see rag_core/ingest_jobs.py)
+if "ingest_job" not in st.session_state:
+    st.session_state.ingest_job = None
+    st.session_state.ingest_notice = None
+    st.session_state.menu_before_upload = None
+
+
+@st.fragment(run_every=1.0)
+def ingest_progress():
+    """
+    Live progress of the uploaded menu being indexed, with a cancel button.
+    Questions are answered from the part indexed so far.
+    """
+    job = st.session_state.ingest_job
+    if job.done:
+        st.session_state.ingest_job = None
+        if job.state == "done":
+            chat.knowledge = job.knowledge
+            failed = job.progress()["ocr_failed_pages"]
+            st.session_state.ingest_notice = (
+                ("warning", f"✅ Menu data loaded, except scanned page(s) "
+                            f"{', '.join(map(str, failed))}: OCR could not read them.")
+                if failed else ("success", "✅ Menu data loaded!")
+            )
+        else:
+            chat.knowledge = st.session_state.menu_before_upload
+            st.session_state.ingest_notice = (
+                ("info", "Menu upload cancelled.") if job.state == "cancelled"
+                else ("error", f"⚠️ {job.error}")
+            )
+        st.session_state.menu_before_upload = None
+        st.rerun()  # the whole page: sidebar status and chat
+
+    progress = job.progress()
+    if progress["state"] == "embedding":
+        if job.knowledge is not None:
+            chat.knowledge = job.knowledge  # answer from what is indexed so far
+        text = (f"🧠 Indexing: {progress['documents_done']}/{progress['document_count']} "
+                "chunks (you can already ask questions)")
+    elif progress["page_count"]:
+        text = f"🔍 Reading pages: {progress['pages_done']}/{progress['page_count']}"
+    else:
+        text = "🔍 Analyzing nutritional data..."
+    st.progress(progress["fraction"], text=text)
+    if st.button("✖️ Cancel", use_container_width=True):
+        job.cancel()
+
+
+def format_prefill_usage(totals):
+    """One-line summary of how much prompt prefill the model server skipped."""
+    if not totals["calls"]:
+        return "Prompt prefill: no calls yet"
+    if totals["cache_hit_rate"] is None:
+        prefill = f"{totals['uncached_prompt_tokens']:,} tokens evaluated"
+    else:
+        prefill = (
+            f"{totals['cached_prompt_tokens']:,} cached / "
+            f"{totals['uncached_prompt_tokens']:,} uncached tokens "
+            f"({totals['cache_hit_rate']:.0%} hit rate)"
+        )
+    return f"Prompt prefill: {prefill} · avg first token {totals['avg_first_token_ms']:.0f} ms"
 
 
 # ============================================================================
@@ -341,15 +284,26 @@ with st.sidebar:
     )
     
     if uploaded_file and st.button("🔄 Process Menu Data", use_container_width=True):
-        text = extract_text_from_pdf(uploaded_file)
-        chunks = chunk_text(text)
-        setup_vector_database(chunks)
-        st.session_state.documents_loaded = True
-        st.success("✅ Menu data loaded!")
-        st.balloons()
-    
-    if st.session_state.documents_loaded:
+        if st.session_state.ingest_job is not None:
+            st.session_state.ingest_job.cancel()
+        else:
+            st.session_state.menu_before_upload = chat.knowledge
+        st.session_state.ingest_job = dairio.start_menu_ingest(
+            assistant, uploaded_file, uploaded_file.name
+        )
+    
+    if st.session_state.ingest_job is not None:
+        ingest_progress()
+    elif st.session_state.ingest_notice:
+        kind, text = st.session_state.ingest_notice
+        getattr(st, kind)(text)
+        if kind == "success":
+            st.balloons()
+        st.session_state.ingest_notice = None
+    
+    if chat.documents_loaded and st.session_state.ingest_job is None:
         st.success("✅ Nutritional data ready!")
+        st.caption(f"Source: {chat.knowledge.source}")
     
     st.divider()
     
@@ -357,21 +311,17 @@ with st.sidebar:
     st.markdown("#### ⚡ Quick Questions")
     st.caption("Click to ask:")
     
-    quick_questions = [
-        "🏋️ What's the highest protein item?",
-        "🥗 What are the healthiest options?",
-        "🔥 Show me low-calorie choices",
-        "🍔 Compare burger vs. chicken",
-        "🌱 What vegetarian options exist?"
-    ]
-    
-    for question in quick_questions:
+    for question in dairio.QUICK_QUESTIONS:
         if st.button(question, use_container_width=True):
             # Add to chat
-            st.session_state.messages.append({"role": "user", "content": question})
+            chat.messages.append({"role": "user", "content": question})
             with st.spinner("Thinking..."):
-                response = chat_with_ai(question)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                try:
+                    response = "".join(assistant.chat(chat, question, quick_question=True))
+                    chat.messages.append({"role": "assistant", "content": response})
+                except SchedulerBusy as busy:
+                    chat.messages.pop()  # let them ask again
+                    st.session_state.busy_notice = str(busy)
             st.rerun()
     
     st.divider()
@@ -388,11 +338,47 @@ with st.sidebar:
     
     # Clear chat
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.messages = [st.session_state.messages[0]]  # Keep welcome message
+        if st.session_state.ingest_job is not None:
+            st.session_state.ingest_job.cancel()
+            st.session_state.ingest_job = None
+        dairio.reset_session(chat)  # a new conversation; the old one stays saved
         st.rerun()
     
     st.divider()
     
+    # Model server load (queue depth and wait times across all sessions)
+    with st.expander("📈 Server load"):
+        metrics = assistant.metrics()
+        load, flights = metrics["scheduler"], metrics["flights"]
+        st.caption(
+            f"Running: {load['running']}/{load['max_concurrency']} · "
+            f"Queued: {load['queue_depth']}\n\n"
+            f"Wait p50/p95: {load['wait_p50']:.1f}s / {load['wait_p95']:.1f}s\n\n"
+            f"Completed: {load['completed']} · Busy rejections: "
+            f"{load['rejected'] + load['timed_out']} · Shared answers: {flights['coalesced']}"
+        )
+        st.caption(format_prefill_usage(metrics["usage"]))
+        sessions = metrics["sessions"]
+        st.caption(
+            f"Sessions: {sessions['sessions']} ({sessions['idle']} idle) · "
+            f"~{sessions['bytes_per_session'] / 1024:.0f} KB each · "
+            f"Uploaded menus: {sessions['knowledge_bases']}"
+        )
+        if "fast_path" in metrics:
+            fast = metrics["fast_path"]
+            st.caption(
+                f"Answered from the menu table without the model: {fast['answered']}"
+                f"/{fast['checked']} ({fast['rate']:.0%})"
+            )
+        if "prefetch" in metrics:
+            prefetch = metrics["prefetch"]
+            st.caption(
+                f"Follow-ups served from prefetched menu data: {prefetch['hits']}"
+                f"/{prefetch['hits'] + prefetch['misses']} ({prefetch['hit_rate']:.0%})"
+            )
+    
+    st.divider()
+    
     # Info
     st.markdown("""
         <div style="background-color: #E8F5E9; padding: 1rem; border-radius: 5px;">
@@ -408,25 +394,41 @@ with st.sidebar:
 # MAIN CHAT INTERFACE
 # ============================================================================
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"], avatar="🤖" if message["role"] == "assistant" else "👤"):
-        st.write(message["content"])
+# A quick question was turned away because the model server was busy
+if st.session_state.busy_notice:
+    st.warning(f"🚦 {st.session_state.busy_notice}")
+    st.session_state.busy_notice = None
+
+# Display chat history (the most recent window of it)
+history_view = st.session_state.history_view
+hidden, shown = history_view.visible(chat.messages)
+if hidden and st.button(history_view.earlier_label(hidden), use_container_width=True):
+    history_view.show_earlier()
+    hidden, shown = history_view.visible(chat.messages)
+for item in shown:
+    with st.chat_message(item["role"], avatar=item["avatar"]):
+        st.markdown(item["body"])
 
 # Chat input
 if prompt := st.chat_input("Ask about nutrition, compare items, or get recommendations..."):
     # Show user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    chat.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user", avatar="👤"):
         st.write(prompt)
     
     # Get AI response
     with st.chat_message("assistant", avatar="🤖"):
         with st.spinner("Thinking..."):
-            response = chat_with_ai(prompt)
-            st.write(response)
+            try:
+                response = st.write_stream(assistant.chat(chat, prompt))
+            except SchedulerBusy as busy:
+                response = None
+                st.warning(f"🚦 {busy}")
     
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    if response is None:
+        chat.messages.pop()  # let them ask again
+    else:
+        chat.messages.append({"role": "assistant", "content": response})
 
 # ============================================================================
 # FOOTER
@@ -469,3 +471,27 @@ st.markdown("""
         </p>
     </div>
 """, unsafe_allow_html=True)
+
+# Startup profile (only shown when RAG_PROFILE_STARTUP=1)
+if profiling.enabled():
+    profiling.mark_interactive()
+    with st.expander("⏱️ Startup profile"):
+        st.code(profiling.format_report())
+
+# Per-stage latency of recent turns (only shown when RAG_TRACE_PANEL=1)
+if tracing.debug_panel_enabled():
+    with st.expander("🔍 Latency traces"):
+        tracer = assistant.tracer
+        st.markdown("**Stage latency (ms), chat turns**")
+        st.table([
+            {"stage": stage, "turns": stats["count"],
+             "p50": round(stats["p50_ms"], 1), "p95": round(stats["p95_ms"], 1)}
+            for stage, stats in tracer.stage_percentiles(name="chat").items()
+        ])
+        st.markdown("**Recent turns (ms)**")
+        st.table([
+            {"turn": record["turn"], "total": round(record["duration_ms"], 1),
+             **{stage: round(ms, 1) for stage, ms in record["stages"].items()}}
+            for record in tracer.recent_turns(limit=TRACE_PANEL_TURNS)
+        ])
+
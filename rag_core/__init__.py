@@ -0,0 +1,10 @@
+"""
+rag_core - shared building blocks for the workshop chatbots.
+
+Everything in here is plain Python with no Streamlit calls, so the same
+code can be used by the Streamlit apps, command-line tools and benchmarks.
+
+Every app in the repository imports from this package, the workshop
+scripts (chatbot_workshop.py, pdf_update/, replit_app/) included: copy the
+rag_core/ folder along with any of them.
+"""
@@ -0,0 +1,370 @@
+"""
+Chat orchestration with explicit state, usable without Streamlit.
+
+Two kinds of state, kept apart on purpose:
+
+- ``ChatSession``: everything that belongs to one conversation (messages,
+  loaded documents). The Streamlit app keeps one in ``st.session_state``;
+  an API server or a load test keeps its own.
+- ``Assistant``: what is shared by every session in the process (the LLM
+  backend with its connection pool, the scheduler, the single-flight group
+  and the tracer). Create it once per process.
+
+Sessions stay small: the history is a ``MessageHistory`` within a byte
+budget, uploaded PDFs are indexed once per process and shared, and the
+assistant's ``SessionRegistry`` releases sessions that have gone idle (see
+rag_core/sessions.py).
+
+A turn is ``assistant.chat(session, question)``; it returns the streamed
+answer and leaves recording it in the history to the caller, so the UI
+decides what to do with an answer that was cut short.
+
+Example:
+    assistant = Assistant(backend_from_env(), SYSTEM_PROMPT)
+    session = ChatSession()
+    session.knowledge = assistant.ingest_pdf("menu.pdf")
+    session.messages.append({"role": "user", "content": question})
+    answer = "".join(assistant.chat(session, question))
+    session.messages.append({"role": "assistant", "content": answer})
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_core import tracing
+from rag_core.constraints import describe, parse_constraints
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL
+from rag_core.ingest_jobs import IngestJob
+from rag_core.prompts import build_turn_messages, conversation_history
+from rag_core.scheduler import LLMScheduler, classify_priority
+from rag_core.sessions import DEFAULT_HISTORY_BYTES, MessageHistory, SessionRegistry
+from rag_core.singleflight import SingleFlight, request_key
+
+
+class ChatSession:
+    """
+    One conversation.
+
+    Args:
+        messages: Chat history as role/content dicts (e.g. a welcome message),
+            or a ``MessageHistory`` to use as-is (e.g. a ``StoredHistory``)
+        session_id: Identifies the session to the scheduler (random if omitted)
+        knowledge: ``KnowledgeBase`` to answer from, or None
+        max_history_bytes: Budget for the history (see ``MessageHistory``)
+    """
+
+    __slots__ = ("session_id", "_messages", "knowledge", "last_active", "idle", "__weakref__")
+
+    def __init__(self, messages=None, session_id=None, knowledge=None,
+                 max_history_bytes=DEFAULT_HISTORY_BYTES):
+        self.session_id = session_id or uuid.uuid4().hex
+        if isinstance(messages, MessageHistory):
+            self._messages = messages
+        else:
+            self._messages = MessageHistory(messages or (), max_history_bytes)
+        self.knowledge = knowledge
+        self.last_active = None
+        self.idle = False
+
+    @property
+    def messages(self):
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        # Assigning a list (e.g. ``session.messages = session.messages[:1]``)
+        # keeps the byte budget
+        if not isinstance(messages, MessageHistory):
+            messages = MessageHistory(messages, self._messages.max_bytes)
+        self._messages = messages
+
+    @property
+    def documents_loaded(self):
+        return self.knowledge is not None
+
+    def history_bytes(self):
+        """Memory held by this session's chat history."""
+        return self._messages.nbytes
+
+    def release(self):
+        """Drop the history and loaded documents (an idle session)."""
+        self._messages.clear()
+        self.knowledge = None
+
+
+class Assistant:
+    """
+    Retrieval + generation pipeline shared by every session of a process.
+
+    Args:
+        backend: ``LLMBackend`` to answer with
+        system_prompt: Static system prompt (never changes between turns)
+        scheduler: ``LLMScheduler`` limiting concurrent generations
+        flights: ``SingleFlight`` sharing identical in-flight generations
+        tracer: ``Tracer`` for per-turn latency (in-memory only if omitted)
+        sessions: ``SessionRegistry`` tracking the sessions that use it
+        reranker: ``CrossEncoderReranker`` re-ordering retrieved chunks, or None
+        fast_path: ``FastPath`` answering single-fact lookups without the
+            model, or None
+        prefetcher: ``Prefetcher`` retrieving for likely follow-up questions
+            in the background, or None
+        ingest_workers: PDFs indexed at once by ``start_ingest``
+        context_label: Heading of the per-turn context block
+        data_heading: Heading placed above the retrieved chunks
+        n_results: Chunks retrieved per question
+        row_results: Most table rows given for a question with numeric
+            conditions ("under 500 calories")
+    """
+
+    def __init__(self, backend, system_prompt, scheduler=None, flights=None, tracer=None,
+                 sessions=None, reranker=None, fast_path=None, prefetcher=None, ingest_workers=2,
+                 context_label="RELEVANT INFORMATION",
+                 data_heading="NUTRITIONAL DATA", n_results=5, row_results=20):
+        self.backend = backend
+        self.system_prompt = system_prompt
+        self.scheduler = scheduler or LLMScheduler()
+        self.flights = flights or SingleFlight()
+        self.tracer = tracer or tracing.Tracer()
+        self.sessions = sessions or SessionRegistry()
+        self.reranker = reranker
+        self.fast_path = fast_path
+        self.prefetcher = prefetcher
+        self.context_label = context_label
+        self.data_heading = data_heading
+        self.n_results = n_results
+        self.row_results = row_results
+        # Indexed PDFs by content, shared by every session that loads the
+        # same file; an entry goes away when no session uses it any more
+        self._knowledge_lock = threading.Lock()
+        self._knowledge = weakref.WeakValueDictionary()
+        self.ingest_workers = ingest_workers
+        self._ingest_pool = None  # started on the first background ingestion
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def ingest_pdf(self, pdf_file, source=None, model_name=DEFAULT_EMBEDDING_MODEL,
+                   storage="chroma", rerank=False):
+        """
+        Extract, chunk and index a PDF.
+
+        A PDF that is already loaded in another session (same bytes, same
+        settings) is not indexed again; both sessions share one index.
+
+        Args:
+            pdf_file: Path or file-like object
+            source: Name to show for it (defaults to the file name)
+            model_name, storage, rerank: See ``KnowledgeBase.from_chunks``
+
+        Returns:
+            KnowledgeBase: Ready to put on a ``ChatSession``
+        """
+        job = self._ingest_job(pdf_file, source, model_name, storage, rerank)
+        job.run()
+        return job.result()
+
+    def start_ingest(self, pdf_file, source=None, model_name=DEFAULT_EMBEDDING_MODEL,
+                     storage="chroma", rerank=False):
+        """
+        Like ``ingest_pdf``, in the background.
+
+        The file is read right away; extracting and embedding run in the
+        ingestion worker pool.
+
+        Returns:
+            IngestJob: Progress, ``cancel()``, the partial ``knowledge`` while
+            it runs and ``result()`` (see rag_core/ingest_jobs.py)
+        """
+        job = self._ingest_job(pdf_file, source, model_name, storage, rerank)
+        if not job.done:
+            with self._knowledge_lock:
+                if self._ingest_pool is None:
+                    self._ingest_pool = ThreadPoolExecutor(max_workers=self.ingest_workers,
+                                                           thread_name_prefix="ingest")
+            self._ingest_pool.submit(job.run)
+        return job
+
+    def _ingest_job(self, pdf_file, source, model_name, storage, rerank):
+        if source is None:
+            source = os.path.basename(getattr(pdf_file, "name", None) or str(pdf_file))
+        if hasattr(pdf_file, "read"):
+            data = pdf_file.read()
+        else:
+            with open(pdf_file, "rb") as f:
+                data = f.read()
+        key = (hashlib.sha256(data).hexdigest(), model_name, storage, rerank)
+
+        with self._knowledge_lock:
+            knowledge = self._knowledge.get(key)
+        if knowledge is not None:
+            return IngestJob.completed(knowledge, source)
+
+        def store(knowledge):
+            with self._knowledge_lock:
+                return self._knowledge.setdefault(key, knowledge)
+
+        return IngestJob(data, source, model_name, storage, rerank, tracer=self.tracer,
+                         store=store)
+
+    # ------------------------------------------------------------------
+    # Chat
+    # ------------------------------------------------------------------
+
+    def retrieve(self, session, question):
+        """Context block for `question` from the session's documents ("" if none)."""
+        if session.knowledge is None:
+            return ""
+        if self.prefetcher is not None:
+            with tracing.span("prefetch_lookup") as span:
+                context = self.prefetcher.lookup(session.knowledge, question)
+                if span is not None:
+                    span.attributes["hit"] = context is not None
+            if context is not None:
+                return context
+        return self.retrieve_from(session.knowledge, question)
+
+    def retrieve_from(self, knowledge, question):
+        """Context block for `question` from `knowledge`, never from the prefetch cache."""
+        rows = self.constrained_rows(knowledge, question)
+        if rows is not None:
+            return self.format_context([hit["text"] for hit in rows])
+        if self.reranker is None:
+            return self.format_context(knowledge.search(question, self.n_results))
+        hits = self.rerank(question, knowledge.hits(question, self.reranker.candidates))
+        return self.format_context([hit["text"] for hit in hits])
+
+    def constrained_rows(self, knowledge, question):
+        """
+        The table rows meeting the numeric conditions in `question`.
+
+        The conditions are applied as a metadata filter before ranking, so
+        the model never sees a row that doesn't meet them. The first hit is
+        a note saying what was filtered on (or that nothing qualifies).
+
+        Returns:
+            list: Hits, or None if the question has no numeric conditions
+            or `knowledge` has no table rows indexed
+        """
+        constraints = parse_constraints(question)
+        if not constraints or not getattr(knowledge, "row_count", 0):
+            return None
+        rows = knowledge.rows_matching(question, constraints, self.row_results)
+        if rows:
+            note = f"Menu items with {describe(constraints)}:"
+        else:
+            note = f"No menu items have {describe(constraints)}."
+        return [{"id": None, "text": note, "metadata": {"kind": "note"}, "distance": None}] + rows
+
+    def rerank(self, question, hits):
+        """The best `n_results` of a wider set of hits (as-is without a reranker)."""
+        if self.reranker is None:
+            return hits[:self.n_results]
+        return self.reranker.rerank(question, hits, self.n_results)
+
+    def format_context(self, documents):
+        """Context block for retrieved chunk texts ("" if there are none)."""
+        if not documents:
+            return ""
+        return f"\n\n{self.data_heading}:\n" + "\n\n".join(documents)
+
+    def build_messages(self, session, question, context):
+        """Stable history first, this turn's context + question last."""
+        history = conversation_history(session.messages, question)
+        return build_turn_messages(history, question, context, self.context_label)
+
+    def chat(self, session, user_message, quick_question=False, context=None):
+        """
+        Answer one question.
+
+        Retrieval runs right away; the model call starts when the returned
+        iterator is first read. A single-fact lookup the fast path can answer
+        from a table row comes back as one piece, without a model call.
+
+        Args:
+            session: The ``ChatSession`` asking
+            user_message: The question (may already be the last history entry)
+            quick_question: True for pre-written quick-question buttons
+            context: Context block retrieved beforehand (e.g. for a whole
+                batch at once); retrieval is skipped when it is given
+
+        Returns:
+            iterator: The answer text as it streams in. Reading it raises
+            ``SchedulerBusy`` if the model server queue is too long.
+        """
+        self.sessions.touch(session)
+        priority = classify_priority(user_message, quick_question)
+        system_message = self.system_prompt
+
+        # Each turn is traced stage by stage; the turn ends when the answer
+        # stream has been read to the end
+        with self.tracer.turn("chat", priority=priority, quick_question=quick_question) as turn:
+            if context is None and self.fast_path is not None and session.knowledge is not None:
+                with tracing.span("fast_path"):
+                    answer = self.fast_path.answer(session.knowledge, user_message)
+                turn.root.attributes["fast_path"] = answer is not None
+                if answer is not None:
+                    return self._then_prefetch(session, user_message, iter([answer]))
+            if context is None:
+                stream_end = self._then_prefetch
+                context = self.retrieve(session, user_message)
+            else:
+                stream_end = None  # a batch: no follow-up coming
+            messages = self.build_messages(session, user_message, context)
+
+            # Identical prompts that arrive together (the same quick question
+            # from several kiosks) share one model generation, and that
+            # generation waits for a free slot in the scheduler like any other.
+            backend = self.backend
+            scheduler = self.scheduler
+            session_id = session.session_id
+
+            def generate():
+                return scheduler.stream(
+                    session_id, priority, lambda: backend.stream(system_message, messages)
+                )
+
+            key = request_key(f"{backend.name}:{backend.model}", [system_message] + messages)
+            # "llm" covers queueing for a slot, prefill and generation
+            stream = tracing.traced_stream(
+                "llm", self.flights.stream(key, generate), model=backend.model
+            )
+            return stream_end(session, user_message, stream) if stream_end else stream
+
+    def _then_prefetch(self, session, question, pieces):
+        """Pass the answer through; once it is complete, prefetch likely follow-ups."""
+        if self.prefetcher is None:
+            yield from pieces
+            return
+        answer = []
+        for piece in pieces:
+            answer.append(piece)
+            yield piece
+        # Only when the model server has no one waiting: prefetching is for idle time
+        if session.knowledge is not None and not self.scheduler.metrics()["queue_depth"]:
+            self.prefetcher.schedule(session.knowledge, question, "".join(answer),
+                                     self.retrieve_from)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def metrics(self):
+        """Scheduler load, single-flight counters, LLM usage, sessions and the optional stages."""
+        metrics = {
+            "scheduler": self.scheduler.metrics(),
+            "flights": self.flights.stats(),
+            "usage": self.backend.usage_totals(),
+            "sessions": self.sessions.stats(),
+        }
+        if self.reranker is not None:
+            metrics["reranker"] = self.reranker.stats()
+        if self.fast_path is not None:
+            metrics["fast_path"] = self.fast_path.stats()
+        if self.prefetcher is not None:
+            metrics["prefetch"] = self.prefetcher.stats()
+        return metrics
@@ -0,0 +1,236 @@
+"""
+Batch question answering: a file of questions in, answers as JSONL out.
+
+For menu-board FAQs and QA regression sets, instead of typing every
+question into the chat:
+
+    python -m rag_core.batch_qa questions.txt --output answers.jsonl
+    python -m rag_core.batch_qa regression.jsonl --pdf dairi_o_nutrition.pdf --workers 4
+    python -m rag_core.batch_qa questions.txt --retrieve-only --output contexts.jsonl
+
+The input is either plain text (one question per line, "#" comments and
+blank lines skipped) or JSONL with a "question" field; any other fields
+(an id, the expected answer) are copied to the output unchanged.
+
+Retrieval runs a block of questions at a time: one batched encode of all
+their query embeddings and one vector query scoring them together. The
+answers are then generated by a bounded pool of workers through the same
+``Assistant`` as the chat app (prompt layout, single-flight sharing of
+identical questions, the LLM scheduler), one fresh conversation per
+question. Each output line has the answer, the retrieved chunks and
+timings in milliseconds; lines are written in input order as soon as they
+are ready.
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_core import dairio
+from rag_core.assistant import ChatSession
+from rag_core.scheduler import LLMScheduler
+from rag_core.stats import percentile
+
+# Questions retrieved together (one encode call and one vector query)
+DEFAULT_RETRIEVAL_BATCH = 256
+
+
+def read_questions(path):
+    """
+    Questions from a text or JSONL file.
+
+    Returns:
+        list: Dicts with at least a "question" key
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                if not isinstance(record.get("question"), str):
+                    raise ValueError(f"{path}:{line_number}: no \"question\" field")
+                records.append(record)
+            else:
+                records.append({"question": line})
+    return records
+
+
+def _context_hits(hits):
+    return [
+        {"id": hit["id"], "text": hit["text"], "distance": hit["distance"],
+         "metadata": hit["metadata"], "citation": hit.get("citation", "")}
+        for hit in hits
+    ]
+
+
+def _answer(assistant, knowledge, number, record, hits, retrieval_ms):
+    """Generate one answer; never raises, errors go into the result."""
+    question = record["question"]
+    session = ChatSession(session_id=f"batch-{number}", knowledge=knowledge)
+    session.messages.append({"role": "user", "content": question})
+    context = assistant.format_context([hit["text"] for hit in hits])
+
+    result = dict(record)
+    timings = {"retrieval_ms": retrieval_ms}
+    started = time.perf_counter()
+    pieces = []
+    try:
+        # Single-fact lookups are answered from the table row, as in the chat
+        fast = assistant.fast_path.answer(knowledge, question) if assistant.fast_path else None
+        if fast is not None:
+            result["fast_path"] = True
+            stream = [fast]
+        else:
+            stream = assistant.chat(session, question, context=context)
+        for piece in stream:
+            if not pieces:
+                timings["first_token_ms"] = (time.perf_counter() - started) * 1000
+            pieces.append(piece)
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    timings["llm_ms"] = (time.perf_counter() - started) * 1000
+    result["answer"] = "".join(pieces)
+    result["context"] = _context_hits(hits)
+    result["timings"] = timings
+    return result
+
+
+def answer_batch(assistant, knowledge, records, workers=2, n_results=None,
+                 retrieval_batch=DEFAULT_RETRIEVAL_BATCH, encode_batch=64,
+                 retrieve_only=False):
+    """
+    Answer many questions.
+
+    Args:
+        assistant: ``Assistant`` to answer with; its scheduler should allow
+            `workers` concurrent generations
+        knowledge: ``KnowledgeBase`` to retrieve from
+        records: Dicts with a "question" key (see ``read_questions``)
+        workers: Generations running at once
+        n_results: Chunks per question (default: the assistant's)
+        retrieval_batch: Questions retrieved together
+        encode_batch: Questions per forward pass of the embedding model
+        retrieve_only: Skip generation, only return the retrieved chunks
+
+    Yields:
+        dict: One result per record, in input order
+    """
+    n_results = n_results or assistant.n_results
+    # With a reranker, fetch its wider candidate set and keep the best
+    fetch = max(n_results, assistant.reranker.candidates) if assistant.reranker else n_results
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for start in range(0, len(records), retrieval_batch):
+            block = records[start:start + retrieval_batch]
+            started = time.perf_counter()
+            block_hits = knowledge.hits_batch(
+                [record["question"] for record in block], fetch, batch_size=encode_batch
+            )
+            for i, record in enumerate(block):
+                # Questions with numeric conditions get the rows that meet them
+                rows = assistant.constrained_rows(knowledge, record["question"])
+                if rows is not None:
+                    block_hits[i] = rows
+                elif assistant.reranker:
+                    block_hits[i] = assistant.reranker.rerank(record["question"], block_hits[i],
+                                                              n_results)
+            # Encoding and search are shared by the block, so each question
+            # gets its share of the time
+            retrieval_ms = (time.perf_counter() - started) * 1000 / len(block)
+
+            for number, (record, hits) in enumerate(zip(block, block_hits), start):
+                if retrieve_only:
+                    result = dict(record)
+                    result["context"] = _context_hits(hits)
+                    result["timings"] = {"retrieval_ms": retrieval_ms}
+                    yield result
+                else:
+                    pending.append(pool.submit(
+                        _answer, assistant, knowledge, number, record, hits, retrieval_ms
+                    ))
+
+            # Hand back what is done while the next block is retrieved
+            while pending and pending[0].done():
+                yield pending.pop(0).result()
+
+        for future in pending:
+            yield future.result()
+
+
+def load_knowledge(assistant, pdf=None, index=None):
+    """The knowledge base to answer from: a PDF, an index directory or the prebuilt menu."""
+    if pdf:
+        return dairio.ingest_menu_pdf(assistant, pdf)
+    knowledge = dairio.load_menu_knowledge(index)
+    if knowledge is None:
+        path = index or dairio.MENU_INDEX_PATH
+        raise SystemExit(
+            f"No menu index at {path}: pass --pdf or build one with "
+            f"python -m rag_core.menu_index menu.pdf --output {path}"
+        )
+    return knowledge
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions, writing JSONL.")
+    parser.add_argument("questions", help="Text file (one question per line) or JSONL")
+    parser.add_argument("--output", default="-", help="JSONL file to write (default: stdout)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--pdf", help="Menu PDF to index and answer from")
+    source.add_argument("--index", help="Prebuilt menu index directory "
+                                        "(default: DAIRIO_MENU_INDEX)")
+    parser.add_argument("--workers", type=int, default=dairio.LLM_MAX_CONCURRENCY,
+                        help="Answers generated at once")
+    parser.add_argument("-k", "--n-results", type=int,
+                        help="Chunks per question (default: DAIRIO_RETRIEVAL_K)")
+    parser.add_argument("--retrieval-batch", type=int, default=DEFAULT_RETRIEVAL_BATCH,
+                        help="Questions retrieved together")
+    parser.add_argument("--encode-batch", type=int, default=64,
+                        help="Questions per embedding forward pass")
+    parser.add_argument("--retrieve-only", action="store_true",
+                        help="Only retrieve context, don't call the model")
+    args = parser.parse_args()
+
+    records = read_questions(args.questions)
+    # A batch waits its turn instead of being told the server is busy
+    assistant = dairio.create_assistant(
+        scheduler=LLMScheduler(max_concurrency=args.workers, max_queue_wait=24 * 3600)
+    )
+    assistant.n_results = args.n_results or assistant.n_results
+    knowledge = load_knowledge(assistant, args.pdf, args.index)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    llm_ms = []
+    errors = 0
+    try:
+        for result in answer_batch(assistant, knowledge, records, args.workers,
+                                   retrieval_batch=args.retrieval_batch,
+                                   encode_batch=args.encode_batch,
+                                   retrieve_only=args.retrieve_only):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            errors += "error" in result
+            if "llm_ms" in result["timings"]:
+                llm_ms.append(result["timings"]["llm_ms"])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    summary = f"{len(records)} questions in {elapsed:.1f}s ({len(records) / elapsed:.1f}/s)"
+    if llm_ms:
+        summary += (f", answer p50 {percentile(llm_ms, 0.50):.0f} ms"
+                    f" p95 {percentile(llm_ms, 0.95):.0f} ms")
+    if errors:
+        summary += f", {errors} failed"
+    print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Windowed chat history display for long sessions.
+
+Streamlit runs the whole script again on every interaction, and the apps
+used to write every message of the conversation each time. A kiosk that has
+been chatting all afternoon re-renders hundreds of messages per rerun.
+
+``HistoryView`` decides what to show instead: the most recent `window`
+messages, plus older ones a page at a time when the user asks for them.
+Each message is prepared for display once (``prepare``) and the result is
+kept, so a rerun only prepares the messages added since the last one and
+writes a bounded number of elements, however long the conversation gets.
+
+It does not import Streamlit; the app does the writing:
+
+    view = st.session_state.history_view
+    hidden, shown = view.visible(st.session_state.messages)
+    if hidden and st.button(view.earlier_label(hidden)):
+        view.show_earlier()
+        hidden, shown = view.visible(st.session_state.messages)
+    for item in shown:
+        with st.chat_message(item["role"], avatar=item["avatar"]):
+            st.markdown(item["body"])
+"""
+
+
+def prepare_message(message):
+    """Default display form of a role/content message."""
+    return {"role": message["role"], "avatar": None, "body": str(message["content"])}
+
+
+class HistoryView:
+    """
+    Which messages of one conversation to show, prepared for display.
+
+    Works on a plain list, a ``MessageHistory`` or a ``StoredHistory``; for
+    the last, pages beyond what is in memory are read from the store.
+
+    Args:
+        window: Most recent messages always shown
+        page_size: Older messages added per "show earlier" click
+        prepare: Function turning a message dict into a display dict with
+            "role", "avatar" and "body" (see ``prepare_message``)
+    """
+
+    def __init__(self, window=20, page_size=20, prepare=prepare_message):
+        self.window = window
+        self.page_size = page_size
+        self.prepare = prepare
+        self.extra = 0
+        self._messages = []  # the message objects the prepared entries belong to
+        self._prepared = []
+        self._older = []  # messages read back from a store, oldest first
+        self._older_prepared = []
+        self._history = None  # the history object of the last sync
+        self._dropped = 0  # messages.dropped at the last sync (MessageHistory)
+        self.prepared_count = 0  # total prepare() calls, to check the cache works
+
+    def _sync(self, messages):
+        """Bring the prepared entries in line with `messages`."""
+        if messages is not self._history:
+            # A different history (cleared, or a new conversation)
+            self.reset()
+            self._history = messages
+        # A MessageHistory over its byte budget drops its oldest messages
+        dropped = getattr(messages, "dropped", 0)
+        if dropped > self._dropped:
+            del self._messages[:dropped - self._dropped]
+            del self._prepared[:dropped - self._dropped]
+            self._older, self._older_prepared = [], []
+        self._dropped = dropped
+        # The history only grows at the end, loses its last entry (a question
+        # turned away) or is cut back (cleared), so find the longest still
+        # valid prefix from the end and prepare only what comes after it.
+        valid = min(len(self._prepared), len(messages))
+        while valid and self._messages[valid - 1] is not messages[valid - 1]:
+            valid -= 1
+        del self._messages[valid:]
+        del self._prepared[valid:]
+        for message in messages[valid:]:
+            self._messages.append(message)
+            self._prepared.append(self.prepare(message))
+            self.prepared_count += 1
+
+    def _load_older(self, messages, count):
+        """Read stored messages until `count` older ones are prepared."""
+        while len(self._older) < count:
+            first = self._older[0] if self._older else (
+                self._messages[0] if self._messages else None
+            )
+            page = messages.older(first.seq if first else None,
+                                  max(count - len(self._older), self.page_size))
+            if not page:
+                break
+            self._older[:0] = page
+            self._older_prepared[:0] = [self.prepare(message) for message in page]
+            self.prepared_count += len(page)
+
+    def visible(self, messages):
+        """
+        The messages to show.
+
+        Returns:
+            tuple: (number of older messages hidden, list of display dicts
+            oldest first)
+        """
+        self._sync(messages)
+        wanted = self.window + self.extra
+        shown = min(len(messages), wanted)
+        hidden = len(messages) - shown
+        earlier = getattr(messages, "earlier_count", 0)
+        older = []
+        if wanted > shown and earlier:
+            self._load_older(messages, min(wanted - shown, earlier))
+            older = self._older_prepared[-(wanted - shown):]
+        return hidden + max(0, earlier - len(older)), older + self._prepared[hidden:]
+
+    def show_earlier(self):
+        """Show one more page of older messages."""
+        self.extra += self.page_size
+
+    def earlier_label(self, hidden):
+        """Button text for loading the next page of `hidden` older messages."""
+        return f"⬆️ Show {min(self.page_size, hidden)} earlier messages ({hidden} hidden)"
+
+    def reset(self):
+        """Forget the prepared messages and collapse back to the window."""
+        self.extra = 0
+        self._messages = []
+        self._prepared = []
+        self._older = []
+        self._older_prepared = []
+        self._history = None
+        self._dropped = 0
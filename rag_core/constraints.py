@@ -0,0 +1,210 @@
+"""
+Numeric nutrient constraints: parsed from questions, stored on table rows.
+
+"Items under 500 calories with at least 20g protein" is a filter, not a
+similarity question: vector search finds rows that *talk about* calories
+and protein, not rows whose numbers fit. So the two halves are handled
+where they belong:
+
+- at ingestion, ``nutrient_values`` reads each menu table row's numbers
+  into metadata (``{"calories": 280.0, "protein": 24.0, ...}``), and every
+  row is indexed as its own document next to the text chunks;
+- at query time, ``parse_constraints`` pulls the numeric conditions out of
+  the question and ``row_filter`` turns them into a Chroma-style ``where``
+  filter, which the vector store applies before ranking. The model only
+  sees rows that actually satisfy the question.
+
+Nutrient names are normalized to a small vocabulary (see ``NUTRIENTS``);
+amounts are in grams, except sodium and cholesterol in milligrams.
+"""
+
+import re
+
+# Canonical nutrient -> pattern for its names in questions and table headers.
+# Order matters: the specific fats come before plain "fat".
+NUTRIENTS = [
+    ("calories", r"calories|calorie|kcals?|cals?"),
+    ("saturated_fat", r"sat(?:urated)?\.?\s+fat"),
+    ("trans_fat", r"trans\s+fat"),
+    ("fat", r"(?:total\s+)?fat"),
+    ("carbs", r"(?:total\s+)?carb(?:ohydrate)?s?"),
+    ("sugar", r"(?:total\s+)?sugars?"),
+    ("fiber", r"(?:dietary\s+)?fib(?:er|re)"),
+    ("protein", r"protein"),
+    ("sodium", r"sodium"),
+    ("cholesterol", r"cholesterol"),
+]
+
+# Nutrients whose tables list milligrams (everything else is grams)
+MILLIGRAM_NUTRIENTS = ("sodium", "cholesterol")
+
+_OPERATORS = {
+    "under": "$lt", "below": "$lt", "less than": "$lt", "fewer than": "$lt",
+    "lower than": "$lt", "<": "$lt",
+    "at most": "$lte", "no more than": "$lte", "not more than": "$lte", "up to": "$lte",
+    "max": "$lte", "maximum": "$lte", "<=": "$lte", "≤": "$lte",
+    "or less": "$lte", "or fewer": "$lte", "or under": "$lte",
+    "over": "$gt", "above": "$gt", "more than": "$gt", "greater than": "$gt",
+    "higher than": "$gt", ">": "$gt",
+    "at least": "$gte", "no less than": "$gte", "not less than": "$gte",
+    "min": "$gte", "minimum": "$gte", ">=": "$gte", "≥": "$gte",
+    "or more": "$gte", "or over": "$gte", "+": "$gte",
+}
+
+_SYMBOLS = {"$lt": "<", "$lte": "<=", "$gt": ">", "$gte": ">="}
+
+_NUTRIENT = "|".join(f"(?P<n_{key}>{pattern})" for key, pattern in NUTRIENTS)
+_NUMBER = r"(?P<{}>\d+(?:,\d{{3}})*(?:\.\d+)?)"
+_UNIT = r"(?:\s*(?P<{}>mg|milligrams?|g|grams?)\b)?"
+_BEFORE = r"(?P<op>under|below|less than|fewer than|lower than|at most|no more than|" \
+          r"not more than|up to|max(?:imum)?(?: of)?|min(?:imum)?(?: of)?|over|above|" \
+          r"more than|greater than|higher than|at least|no less than|not less than|" \
+          r"<=|>=|≤|≥|<|>)"
+_AFTER = r"(?P<op>\+|or less|or fewer|or under|or more|or over)"
+
+_PATTERNS = [
+    # "between 300 and 500 calories"
+    re.compile(rf"\bbetween\s+{_NUMBER.format('low')}{_UNIT.format('low_unit')}\s+and\s+"
+               rf"{_NUMBER.format('value')}{_UNIT.format('unit')}\s+(?:of\s+)?(?:{_NUTRIENT})\b"),
+    # "calories between 300 and 500"
+    re.compile(rf"\b(?:{_NUTRIENT})\s+(?:of\s+|is\s+|are\s+)?between\s+"
+               rf"{_NUMBER.format('low')}{_UNIT.format('low_unit')}\s+and\s+"
+               rf"{_NUMBER.format('value')}{_UNIT.format('unit')}"),
+    # "500 calories or less", "20g+ protein", "20+ g of protein"
+    re.compile(rf"(?<![\w.]){_NUMBER.format('value')}{_UNIT.format('unit')}\s*{_AFTER}"
+               rf"\s*{_UNIT.format('unit2')}\s*(?:of\s+)?(?:{_NUTRIENT})\b"),
+    re.compile(rf"(?<![\w.]){_NUMBER.format('value')}{_UNIT.format('unit')}\s+(?:of\s+)?"
+               rf"(?:{_NUTRIENT})\s+{_AFTER}"),
+    # "under 500 calories", "at least 20g of protein"
+    re.compile(rf"{_BEFORE}\s*{_NUMBER.format('value')}{_UNIT.format('unit')}\s*(?:of\s+)?"
+               rf"(?:{_NUTRIENT})\b"),
+    # "calories under 500", "protein of at least 20g", "sodium < 800mg"
+    re.compile(rf"\b(?:{_NUTRIENT})\s*(?:of\s+|is\s+|are\s+|at\s+)?{_BEFORE}\s*"
+               rf"{_NUMBER.format('value')}{_UNIT.format('unit')}"),
+]
+
+
+class Constraint:
+    """One numeric condition, e.g. calories < 500."""
+
+    __slots__ = ("nutrient", "op", "value")
+
+    def __init__(self, nutrient, op, value):
+        self.nutrient = nutrient
+        self.op = op
+        self.value = value
+
+    def where(self):
+        """This condition as a Chroma-style ``where`` clause."""
+        return {self.nutrient: {self.op: self.value}}
+
+    def describe(self):
+        unit = "mg" if self.nutrient in MILLIGRAM_NUTRIENTS else (
+            "" if self.nutrient == "calories" else "g")
+        return f"{self.nutrient.replace('_', ' ')} {_SYMBOLS[self.op]} {self.value:g}{unit}"
+
+    def __repr__(self):
+        return f"Constraint({self.nutrient!r}, {self.op!r}, {self.value!r})"
+
+
+def _nutrient(match):
+    for key, _ in NUTRIENTS:
+        if match.group(f"n_{key}"):
+            return key
+    return None
+
+
+def _amount(number, unit, nutrient):
+    value = float(number.replace(",", ""))
+    if unit and nutrient in MILLIGRAM_NUTRIENTS and not unit.startswith("m"):
+        value *= 1000  # "2g of sodium"
+    elif unit and unit.startswith("m") and nutrient not in MILLIGRAM_NUTRIENTS:
+        value /= 1000
+    return value
+
+
+def parse_constraints(question):
+    """
+    The numeric nutrient conditions in a question.
+
+    Example:
+        >>> parse_constraints("items under 500 calories with at least 20g protein")
+        [Constraint('calories', '$lt', 500.0), Constraint('protein', '$gte', 20.0)]
+
+    Returns:
+        list: ``Constraint`` objects in the order they appear (empty if none)
+    """
+    text = question.lower()
+    found = []
+    taken = []
+    for pattern in _PATTERNS:
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if any(start < other_end and other_start < end for other_start, other_end in taken):
+                continue
+            nutrient = _nutrient(match)
+            groups = match.groupdict()
+            unit = groups.get("unit") or groups.get("unit2")
+            value = _amount(groups["value"], unit, nutrient)
+            if groups.get("low"):
+                low = _amount(groups["low"], groups.get("low_unit") or unit, nutrient)
+                found.append((start, Constraint(nutrient, "$gte", min(low, value))))
+                found.append((start, Constraint(nutrient, "$lte", max(low, value))))
+            else:
+                op = " ".join(groups["op"].split())
+                op = _OPERATORS[re.sub(r" of$", "", op)]
+                found.append((start, Constraint(nutrient, op, value)))
+            taken.append((start, end))
+    return [constraint for _, constraint in sorted(found, key=lambda item: item[0])]
+
+
+def mentioned_nutrients(text):
+    """The distinct nutrients a text names, in order ("calories and fat" -> both)."""
+    found = []
+    for match in re.finditer(rf"\b(?:{_NUTRIENT})\b", text.lower()):
+        nutrient = _nutrient(match)
+        if nutrient not in found:
+            found.append(nutrient)
+    return found
+
+
+def header_nutrient(header):
+    """Canonical nutrient a table column holds ("Protein (g)" -> "protein"), or None."""
+    if not header:
+        return None
+    header = " ".join(header.lower().split())
+    if "from fat" in header or "% " in header or "dv" in header.split():
+        return None  # "Calories from Fat", "% Daily Value"
+    for key, pattern in NUTRIENTS:
+        if re.search(rf"\b(?:{pattern})\b", header):
+            return key
+    return None
+
+
+def nutrient_values(headers, row):
+    """
+    The numbers of one table row, by nutrient.
+
+    Returns:
+        dict: e.g. {"calories": 280.0, "protein": 24.0}; cells without a
+        number (or columns that are not nutrients) are left out
+    """
+    values = {}
+    for header, cell in zip(headers, row):
+        nutrient = header_nutrient(header)
+        if nutrient is None or nutrient in values or not cell:
+            continue
+        number = re.search(r"\d+(?:,\d{3})*(?:\.\d+)?", cell)
+        if number:
+            values[nutrient] = float(number.group().replace(",", ""))
+    return values
+
+
+def row_filter(constraints):
+    """``where`` filter selecting the menu-row documents that meet every constraint."""
+    return {"$and": [{"kind": "row"}] + [constraint.where() for constraint in constraints]}
+
+
+def describe(constraints):
+    """Constraints as text, e.g. "calories < 500 and protein >= 20g"."""
+    return " and ".join(constraint.describe() for constraint in constraints)
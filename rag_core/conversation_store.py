@@ -0,0 +1,154 @@
+"""
+Durable conversations in an embedded SQLite database.
+
+Chat history used to live only in the Streamlit session, so refreshing the
+page or restarting the server lost it - and every conversation stayed in
+memory for as long as its session did. ``ConversationStore`` writes each
+message to a SQLite file as it is added, and ``StoredHistory`` is the
+session-side view of one conversation: it loads only the most recent
+messages and pages older ones in from disk when someone scrolls back.
+
+The database runs in WAL mode, so readers never block the writer and
+several server processes can share one file. Writes are appends (one row
+per message); the only other write removes a question that was turned away
+before it was answered.
+"""
+
+import sqlite3
+import threading
+import time
+
+from rag_core.sessions import DEFAULT_HISTORY_BYTES, Message, MessageHistory
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID
+"""
+
+
+class ConversationStore:
+    """
+    Messages of every conversation, in one SQLite file.
+
+    Safe to share between threads (each thread gets its own connection)
+    and between processes (WAL mode).
+
+    Args:
+        path: Database file (created if missing)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only risks the last commits on power loss,
+            # never corruption, and skips an fsync per message
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def append(self, conversation_id, role, content):
+        """Add a message at the end of a conversation; returns its sequence number."""
+        with self._connection() as connection:
+            row = connection.execute(
+                "INSERT INTO messages (conversation_id, seq, role, content, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM messages "
+                "WHERE conversation_id = ? RETURNING seq",
+                (conversation_id, role, content, time.time(), conversation_id),
+            ).fetchone()
+        return row[0]
+
+    def remove(self, conversation_id, seq):
+        """Remove one message (a question that was never answered)."""
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM messages WHERE conversation_id = ? AND seq = ?",
+                (conversation_id, seq),
+            )
+
+    def recent(self, conversation_id, limit):
+        """The last `limit` messages of a conversation, oldest first."""
+        return self.before(conversation_id, None, limit)
+
+    def before(self, conversation_id, seq, limit):
+        """
+        Up to `limit` messages older than `seq` (or the newest ones if
+        `seq` is None), oldest first, as ``Message`` objects.
+        """
+        rows = self._connection().execute(
+            "SELECT seq, role, content FROM messages "
+            "WHERE conversation_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (conversation_id, seq if seq is not None else 2 ** 62, limit),
+        ).fetchall()
+        return [Message(role, content, seq) for seq, role, content in reversed(rows)]
+
+    def count(self, conversation_id, before=None):
+        """Messages in a conversation (only those older than `before`, if given)."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ? AND seq < ?",
+            (conversation_id, before if before is not None else 2 ** 62),
+        ).fetchone()[0]
+
+
+class StoredHistory(MessageHistory):
+    """
+    A ``MessageHistory`` that writes through to a ``ConversationStore``.
+
+    Only the most recent `window` messages are read when it is opened, and
+    the byte budget still applies to what is held in memory; everything
+    older stays on disk and is available through ``older``.
+
+    Args:
+        store: ``ConversationStore``
+        conversation_id: Conversation to open (or start)
+        window: Messages to load when opening an existing conversation
+        max_bytes: In-memory budget (see ``MessageHistory``)
+    """
+
+    def __init__(self, store, conversation_id, window=50, max_bytes=DEFAULT_HISTORY_BYTES):
+        super().__init__((), max_bytes)
+        self.store = store
+        self.conversation_id = conversation_id
+        self.earlier_count = 0  # messages on disk that come before the ones in memory
+        for message in store.recent(conversation_id, window):
+            MessageHistory.append(self, message)
+        if len(self):
+            self.earlier_count = store.count(conversation_id, self[0].seq)
+
+    def append(self, message):
+        message = Message.coerce(message)
+        if message.seq is None:
+            message.seq = self.store.append(self.conversation_id, message.role, message.content)
+        super().append(message)
+
+    def pop(self, index=-1):
+        message = super().pop(index)
+        self.store.remove(self.conversation_id, message.seq)
+        return message
+
+    def clear(self):
+        """Forget the messages in memory (they stay on disk)."""
+        self.earlier_count += len(self)
+        super().clear()
+
+    def _trim(self):
+        dropped = self.dropped
+        super()._trim()
+        self.earlier_count += self.dropped - dropped
+
+    def older(self, before_seq, limit):
+        """Up to `limit` stored messages older than `before_seq`, oldest first."""
+        return self.store.before(self.conversation_id, before_seq, limit)
@@ -0,0 +1,286 @@
+"""
+The Dairi-O nutrition assistant, without a UI.
+
+Holds the Dairi-O prompt, welcome message, quick questions and settings,
+and builds the ``Assistant`` and ``ChatSession`` objects the Streamlit app
+(dairio_chatbot/dairi_o_chatbot.py) is a thin shell around. Anything else
+that wants the same answers - an API server, a batch job, a benchmark -
+uses these functions too.
+
+Settings are environment variables (see DAIRI_O_README.md):
+
+    DAIRIO_EMBEDDING_STORAGE  chroma (default), float16 or int8
+    DAIRIO_EMBEDDING_RERANK   1 to re-rank compact-store hits with float32
+    DAIRIO_MENU_INDEX         prebuilt menu index directory
+    DAIRIO_INGEST_WORKERS     uploaded menus indexed at once in the background (default 2)
+    DAIRIO_LLM_CONCURRENCY    generations running at once (default 2)
+    DAIRIO_LLM_MAX_WAIT       longest wait for a slot in seconds (default 30)
+    DAIRIO_CROSS_ENCODER      cross-encoder to re-rank retrieved chunks with ("" for none)
+    DAIRIO_RERANK_CANDIDATES  chunks fetched for the cross-encoder to re-score (default 20)
+    DAIRIO_RERANK_BUDGET_MS   most time re-ranking may take per question (default 150)
+    DAIRIO_FAST_PATH          0 to send single-fact lookups to the model too (default 1)
+    DAIRIO_PREFETCH           0 to not prefetch retrieval for likely follow-ups (default 1)
+    DAIRIO_RETRIEVAL_K        chunks put in the prompt (default 3 with re-ranking, else 5)
+    DAIRIO_HISTORY_WINDOW     chat messages shown before "show earlier" (default 20)
+    DAIRIO_CONVERSATION_DB    SQLite file conversations are saved to ("" for none)
+    RAG_SESSION_HISTORY_KB    chat history kept per session (default 256)
+    RAG_SESSION_IDLE_SECONDS  idle time before a session starts over (default 1800)
+    RAG_EMBEDDING_BACKEND     torch (default), onnx or onnx-int8; see rag_core/embeddings.py
+    RAG_OCR / RAG_OCR_*       OCR of scanned pages; see rag_core/ocr.py
+    LLM_BACKEND / LLM_MODEL   see rag_core/llm_backends.py
+"""
+
+import os
+import threading
+import uuid
+
+from rag_core import tracing
+from rag_core.assistant import Assistant, ChatSession
+from rag_core.conversation_store import ConversationStore, StoredHistory
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL
+from rag_core.fast_path import FastPath
+from rag_core.knowledge import KnowledgeBase
+from rag_core.llm_backends import backend_from_env
+from rag_core.prefetch import Prefetcher
+from rag_core.reranker import CrossEncoderReranker
+from rag_core.scheduler import LLMScheduler
+from rag_core.sessions import SessionRegistry
+
+# How chunk embeddings are stored:
+#   "chroma"  - ChromaDB collection (default)
+#   "float16" - compact half-precision array (half the memory)
+#   "int8"    - scalar-quantized array (about a quarter of the memory)
+EMBEDDING_STORAGE = os.environ.get("DAIRIO_EMBEDDING_STORAGE", "chroma")
+
+# For "float16"/"int8": also keep float32 vectors to re-rank the top hits
+EMBEDDING_RERANK = os.environ.get("DAIRIO_EMBEDDING_RERANK", "0") == "1"
+
+# Uploaded menus indexed at once in the background (the rest wait their turn)
+INGEST_WORKERS = int(os.environ.get("DAIRIO_INGEST_WORKERS", "2"))
+
+# Prebuilt menu index, built with:
+#   python -m rag_core.menu_index menu.pdf --output dairio_chatbot/menu_index
+# When it exists, every session starts with the menu already loaded.
+MENU_INDEX_PATH = os.environ.get(
+    "DAIRIO_MENU_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dairio_chatbot", "menu_index")
+)
+
+EMBEDDING_MODEL_NAME = DEFAULT_EMBEDDING_MODEL
+
+# Optional second retrieval step: fetch RERANK_CANDIDATES chunks with the
+# vector index, re-score them with a small cross-encoder on the CPU (within
+# RERANK_BUDGET_MS) and keep the best. It tells near-identical menu rows
+# (small vs. medium) apart, so fewer chunks need to go into the prompt.
+# E.g. DAIRIO_CROSS_ENCODER=cross-encoder/ms-marco-MiniLM-L-6-v2
+CROSS_ENCODER = os.environ.get("DAIRIO_CROSS_ENCODER", "")
+RERANK_CANDIDATES = int(os.environ.get("DAIRIO_RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = float(os.environ.get("DAIRIO_RERANK_BUDGET_MS", "150"))
+RETRIEVAL_K = int(os.environ.get("DAIRIO_RETRIEVAL_K", "3" if CROSS_ENCODER else "5"))
+
+# "How many calories in a Dilly Bar?" is answered straight from the menu
+# row when the question clearly asks for one number of one item; anything
+# less certain goes to the model
+FAST_PATH = os.environ.get("DAIRIO_FAST_PATH", "1") == "1"
+
+# After each answer, retrieve for the likely follow-ups (other sizes of the
+# item, comparisons, the quick questions) in the background
+PREFETCH = os.environ.get("DAIRIO_PREFETCH", "1") == "1"
+
+# The model is configured with LLM_BACKEND / LLM_MODEL (see rag_core/llm_backends.py);
+# by default it is llama3.2 on the local Ollama server.
+LLM_MODEL = "llama3.2"
+
+# How many generations may run at once, and the longest a question may
+# wait in line before we tell the user we're busy (seconds)
+LLM_MAX_CONCURRENCY = int(os.environ.get("DAIRIO_LLM_CONCURRENCY", "2"))
+LLM_MAX_QUEUE_WAIT = float(os.environ.get("DAIRIO_LLM_MAX_WAIT", "30"))
+
+# Messages the chat shows before older ones are collapsed behind a
+# "show earlier" button (and how many each click adds)
+HISTORY_WINDOW = int(os.environ.get("DAIRIO_HISTORY_WINDOW", "20"))
+
+# Conversations are saved here, so refreshing the page or restarting the
+# server doesn't lose them ("" keeps them in memory only). A session reads
+# back only its last HISTORY_WINDOW messages; older ones load on demand.
+CONVERSATION_DB = os.environ.get(
+    "DAIRIO_CONVERSATION_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dairio_chatbot",
+                 "conversations.db")
+)
+
+# The system prompt never changes between turns, so the model server can
+# reuse its cached prefill for it (retrieved data goes in the last message)
+SYSTEM_PROMPT = """You are a helpful nutrition assistant for Dairi-O restaurant.
+
+Your role:
+- Help customers understand nutritional information about menu items
+- Compare different options when asked
+- Suggest items based on dietary goals (high protein, low carb, etc.)
+- Be accurate with numbers from the nutritional data
+- Be friendly and encouraging about healthy choices
+
+When answering about nutritional information:
+- Always cite specific numbers (calories, protein, carbs, fat, sodium, etc.)
+- If comparing items, present info in an easy-to-read format
+- Highlight key differences when comparing
+- Use emojis occasionally to be friendly (but don't overdo it)
+
+Important:
+- You have access to the official Dairi-O nutritional information
+- Look carefully at the data to match items to their exact nutritional values
+- If you're not sure, say so rather than guessing
+- Remind users this is for informational purposes
+
+Be helpful, accurate, and supportive!"""
+
+WELCOME_MESSAGE = (
+    "👋 Hi! I'm your Dairi-O Nutrition Assistant! I can help you:\n\n"
+    "🔍 Find nutritional info for menu items\n"
+    "⚖️ Compare different options\n"
+    "🥗 Suggest items based on your dietary goals\n"
+    "📊 Answer questions about calories, protein, carbs, and more!\n\n"
+    "What would you like to know?"
+)
+
+QUICK_QUESTIONS = [
+    "🏋️ What's the highest protein item?",
+    "🥗 What are the healthiest options?",
+    "🔥 Show me low-calorie choices",
+    "🍔 Compare burger vs. chicken",
+    "🌱 What vegetarian options exist?"
+]
+
+_menu_lock = threading.Lock()
+_menu_knowledge = None
+_store_lock = threading.Lock()
+_conversation_store = None
+
+
+def menu_index_available(path=None):
+    """True when a prebuilt menu index has been built."""
+    return os.path.exists(os.path.join(path or MENU_INDEX_PATH, "manifest.json"))
+
+
+def load_menu_knowledge(path=None):
+    """
+    The prebuilt menu index as a ``KnowledgeBase``, opened once per process.
+
+    Returns:
+        KnowledgeBase: Shared by every session, or None if there is no index
+    """
+    global _menu_knowledge
+    if _menu_knowledge is None:
+        with _menu_lock:
+            if _menu_knowledge is None and menu_index_available(path):
+                from rag_core.menu_index import MenuIndex
+
+                _menu_knowledge = KnowledgeBase.from_menu_index(
+                    MenuIndex.load(path or MENU_INDEX_PATH)
+                )
+    return _menu_knowledge
+
+
+def conversation_store():
+    """The conversation database, opened once per process (None if disabled)."""
+    global _conversation_store
+    if _conversation_store is None and CONVERSATION_DB:
+        with _store_lock:
+            if _conversation_store is None:
+                _conversation_store = ConversationStore(CONVERSATION_DB)
+    return _conversation_store
+
+
+def _open_history(conversation_id):
+    """The saved history of a conversation, or a fresh list if nothing is saved."""
+    store = conversation_store()
+    if store is None:
+        return []
+    return StoredHistory(store, conversation_id, window=HISTORY_WINDOW)
+
+
+def create_assistant(backend=None, tracer=None, scheduler=None):
+    """
+    The Dairi-O assistant. Create one per process and share it.
+
+    Args:
+        backend: ``LLMBackend`` (default: from LLM_BACKEND / LLM_MODEL)
+        tracer: ``Tracer`` (default: from the RAG_TRACE_* variables)
+        scheduler: ``LLMScheduler`` (default: DAIRIO_LLM_CONCURRENCY /
+            DAIRIO_LLM_MAX_WAIT)
+    """
+    return Assistant(
+        backend or backend_from_env(default_backend="ollama", default_model=LLM_MODEL),
+        SYSTEM_PROMPT,
+        scheduler=scheduler or LLMScheduler(
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            max_queue_wait=LLM_MAX_QUEUE_WAIT
+        ),
+        tracer=tracer or tracing.tracer_from_env(),
+        # A kiosk left alone goes back to the welcome screen and lets go of
+        # any menu a customer uploaded
+        sessions=SessionRegistry(on_idle=reset_session),
+        reranker=create_reranker(),
+        fast_path=FastPath() if FAST_PATH else None,
+        prefetcher=Prefetcher(QUICK_QUESTIONS) if PREFETCH else None,
+        ingest_workers=INGEST_WORKERS,
+        context_label="RELEVANT INFORMATION",
+        data_heading="NUTRITIONAL DATA",
+        n_results=RETRIEVAL_K,
+    )
+
+
+def create_reranker():
+    """The configured cross-encoder reranker, or None (DAIRIO_CROSS_ENCODER unset)."""
+    if not CROSS_ENCODER:
+        return None
+    return CrossEncoderReranker(CROSS_ENCODER, candidates=RERANK_CANDIDATES,
+                                budget_ms=RERANK_BUDGET_MS)
+
+
+def new_session(session_id=None):
+    """
+    A conversation with the prebuilt menu (if any) loaded.
+
+    With the id of a saved conversation, its recent messages are read back;
+    otherwise it is a new conversation starting with the welcome message.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    session = ChatSession(
+        messages=_open_history(session_id),
+        session_id=session_id,
+        knowledge=load_menu_knowledge(),
+    )
+    if not len(session.messages) and not getattr(session.messages, "earlier_count", 0):
+        session.messages.append({"role": "assistant", "content": WELCOME_MESSAGE})
+    return session
+
+
+def reset_session(session):
+    """Start `session` over as a new conversation (the old one stays saved)."""
+    session.session_id = uuid.uuid4().hex
+    session.messages = _open_history(session.session_id)
+    session.messages.append({"role": "assistant", "content": WELCOME_MESSAGE})
+    session.knowledge = load_menu_knowledge()
+
+
+def ingest_menu_pdf(assistant, pdf_file, source=None):
+    """Index an uploaded menu PDF with the configured storage settings."""
+    return assistant.ingest_pdf(
+        pdf_file,
+        source=source,
+        model_name=EMBEDDING_MODEL_NAME,
+        storage=EMBEDDING_STORAGE,
+        rerank=EMBEDDING_RERANK,
+    )
+
+
+def start_menu_ingest(assistant, pdf_file, source=None):
+    """Start indexing an uploaded menu PDF in the background; returns the ``IngestJob``."""
+    return assistant.start_ingest(
+        pdf_file,
+        source=source,
+        model_name=EMBEDDING_MODEL_NAME,
+        storage=EMBEDDING_STORAGE,
+        rerank=EMBEDDING_RERANK,
+    )
@@ -0,0 +1,129 @@
+"""
+Process-wide embedding models.
+
+Loading a sentence-transformers model takes seconds and hundreds of MB, so
+each model is loaded once per process and shared by every session, request
+and worker thread. The cache lives in this module, which Python imports only
+once, so it also survives Streamlit reruns.
+
+The same model can run on one of several inference backends
+(``RAG_EMBEDDING_BACKEND``):
+
+    torch       PyTorch eager inference (default)
+    onnx        ONNX Runtime, same float32 weights: same vectors, less overhead
+    onnx-int8   ONNX Runtime with dynamically quantized int8 weights: fastest
+                on CPU, vectors very close to the float32 ones
+
+All of them go through ``SentenceTransformer.encode``, which sorts each
+call's texts by length and pads every batch only to its longest text, so
+a batch of short questions is not padded to the length of a long chunk.
+The ONNX backends need ``pip install "sentence-transformers[onnx]"``; the
+model is exported (and quantized) on first use if the model repository
+doesn't ship the ONNX file. Compare the backends with
+benchmarks/embedding_backend_benchmark.py.
+
+Vectors of different backends are close but not identical, so a knowledge
+base is always queried with the backend it was embedded with: a prebuilt
+index records its backend in the manifest, and that one is used whatever
+``RAG_EMBEDDING_BACKEND`` is set to now.
+
+Query embeddings are also kept in a small LRU cache (``encode_query``), so
+a question asked again - a quick-question button, or a follow-up the
+prefetcher saw coming (rag_core/prefetch.py) - is not encoded twice.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", "torch")
+
+# Quantized weights to load for "onnx-int8" (the sentence-transformers
+# repositories ship several; AVX2 runs on nearly every x86 CPU)
+ONNX_INT8_FILE = os.environ.get("RAG_EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+# Where quantized exports go when the repository has no int8 file
+ONNX_EXPORT_DIR = os.environ.get(
+    "RAG_EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "rag_core", "onnx")
+)
+
+# Query embeddings remembered by ``encode_query``
+QUERY_CACHE_SIZE = int(os.environ.get("RAG_QUERY_CACHE_SIZE", "1024"))
+
+_lock = threading.Lock()
+_models = {}
+_query_lock = threading.Lock()
+_queries = OrderedDict()
+
+
+def _load(model_name, backend):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+
+    try:
+        return SentenceTransformer(model_name, backend="onnx",
+                                   model_kwargs={"file_name": ONNX_INT8_FILE})
+    except (OSError, ValueError):
+        pass  # not in the repository: quantize the float32 export ourselves
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dir = os.path.join(ONNX_EXPORT_DIR, model_name.replace("/", "__"))
+    quantized = os.path.join(export_dir, "onnx", "model_qint8_avx2.onnx")
+    if not os.path.exists(quantized):
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save(export_dir)
+        export_dynamic_quantized_onnx_model(model, "avx2", export_dir)
+    return SentenceTransformer(export_dir, backend="onnx",
+                               model_kwargs={"file_name": "onnx/model_qint8_avx2.onnx"})
+
+
+def load_embedding_model(model_name=DEFAULT_EMBEDDING_MODEL, backend=None):
+    """
+    Return the shared model for `model_name`, loading it on first use.
+
+    Args:
+        model_name: sentence-transformers model
+        backend: "torch", "onnx" or "onnx-int8" (default: RAG_EMBEDDING_BACKEND)
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"backend must be one of {EMBEDDING_BACKENDS}, not {backend!r}")
+    key = model_name if backend == "torch" else f"{model_name}@{backend}"
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        if key not in _models:
+            _models[key] = _load(model_name, backend)
+        return _models[key]
+
+
+def encode_query(query, model_name=DEFAULT_EMBEDDING_MODEL, backend=None):
+    """
+    Embedding of one query text, from the LRU cache if it was encoded before.
+
+    Returns:
+        numpy.ndarray: The vector (read-only: it is shared)
+    """
+    key = (model_name, backend or EMBEDDING_BACKEND, query)
+    with _query_lock:
+        vector = _queries.get(key)
+        if vector is not None:
+            _queries.move_to_end(key)
+            return vector
+    vector = load_embedding_model(model_name, backend).encode(query)
+    vector.setflags(write=False)
+    with _query_lock:
+        _queries[key] = vector
+        _queries.move_to_end(key)
+        while len(_queries) > QUERY_CACHE_SIZE:
+            _queries.popitem(last=False)
+    return vector
@@ -0,0 +1,136 @@
+"""
+Extractive answers for single-fact lookups, without calling the model.
+
+"How many calories in a Dilly Bar?" is answered by one table row: the
+model only reads the number back. ``FastPath`` recognises that kind of
+question and answers it from the row directly, in milliseconds instead of
+a full generation. It is deliberately cautious - every check has to pass,
+otherwise the question goes to the model as before:
+
+1. the question names exactly one nutrient, asks for an amount ("how
+   many", "what is") and is not a comparison, a recommendation or a
+   numeric filter ("under 500 calories");
+2. among the top-ranked table rows (a vector search over the row
+   documents, see rag_core/ingest.py) exactly one menu item's name appears
+   in the question - "vanilla cone" does not pick "Small Vanilla Cone";
+3. that row is close to the question and has a number for the nutrient.
+
+How often it answers, and why it didn't, is counted (``stats``).
+"""
+
+import re
+import threading
+
+from rag_core.constraints import MILLIGRAM_NUTRIENTS, mentioned_nutrients, parse_constraints
+
+# Questions asking for an amount
+_LOOKUP = re.compile(r"\b(?:how (?:many|much)|what(?:'s| is| are|s)?|amount of|number of)\b")
+
+# ...unless they compare, rank, recommend or list
+_NOT_LOOKUP = re.compile(
+    r"\b(?:vs|versus|compare[sd]?|comparison|than|which|highest|lowest|most|least|best|worst|"
+    r"healthiest|healthier|options?|recommend|suggest|should|every|list|each)\b"
+)
+
+DEFAULT_TEMPLATE = "📊 The **{item}** has **{amount}**.{source}"
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _amount(nutrient, value):
+    if nutrient == "calories":
+        return f"{value:g} calories"
+    unit = "mg" if nutrient in MILLIGRAM_NUTRIENTS else "g"
+    return f"{value:g}{unit} of {nutrient.replace('_', ' ')}"
+
+
+class FastPath:
+    """
+    Confidence-gated extractive answers from table rows.
+
+    Args:
+        candidates: Table rows fetched to look for the named item
+        max_distance: Largest cosine distance between question and row
+        template: Answer text; gets ``item``, ``amount`` and ``source`` (a
+            line citing the row, or "")
+    """
+
+    def __init__(self, candidates=5, max_distance=0.7, template=DEFAULT_TEMPLATE):
+        self.candidates = candidates
+        self.max_distance = max_distance
+        self.template = template
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.answered = 0
+        self.fallbacks = {}  # reason -> questions that went to the model
+
+    def answer(self, knowledge, question):
+        """
+        The templated answer to `question`, or None to use the model.
+
+        Args:
+            knowledge: ``KnowledgeBase`` with table rows indexed
+            question: The user's question
+        """
+        answer, reason = self._answer(knowledge, question)
+        with self._lock:
+            self.checked += 1
+            if answer is None:
+                self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+            else:
+                self.answered += 1
+        return answer
+
+    def _answer(self, knowledge, question):
+        if knowledge is None or not getattr(knowledge, "row_count", 0):
+            return None, "no_rows"
+        text = question.lower()
+        nutrients = mentioned_nutrients(text)
+        if (len(nutrients) != 1 or not _LOOKUP.search(text) or _NOT_LOOKUP.search(text)
+                or parse_constraints(text)):
+            return None, "not_a_lookup"
+        nutrient = nutrients[0]
+
+        hits = knowledge.hits(question, self.candidates, where={"kind": "row"})
+        words = _normalize(question)
+        named = [
+            (_normalize(hit["metadata"]["item"]), hit) for hit in hits
+            if hit["metadata"].get("item")
+            and re.search(rf"\b{re.escape(_normalize(hit['metadata']['item']))}s?\b", words)
+        ]
+        if not named:
+            return None, "no_item"
+
+        # The longest name wins ("double burger" over "burger"); any other
+        # item named in the question, or the same item with another number
+        # (two sizes, two tables), makes it ambiguous
+        name, best = max(named, key=lambda pair: len(pair[0]))
+        for other_name, hit in named:
+            if other_name == name:
+                if hit["metadata"].get(nutrient) != best["metadata"].get(nutrient):
+                    return None, "ambiguous"
+            elif f" {other_name} " not in f" {name} ":
+                return None, "ambiguous"
+
+        if best["distance"] is not None and best["distance"] > self.max_distance:
+            return None, "weak_match"
+        value = best["metadata"].get(nutrient)
+        if value is None:
+            return None, "no_value"
+        return self.template.format(
+            item=best["metadata"]["item"],
+            amount=_amount(nutrient, value),
+            source=f"\n\n_Source: {best['citation']}_" if best.get("citation") else "",
+        ), None
+
+    def stats(self):
+        """Questions checked, answered without the model, and fallbacks by reason."""
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "answered": self.answered,
+                "rate": self.answered / self.checked if self.checked else 0.0,
+                "fallbacks": dict(self.fallbacks),
+            }
@@ -0,0 +1,296 @@
+"""
+Document ingestion: turning a nutrition PDF into text chunks.
+
+These are the Dairi-O versions of ``extract_text_from_pdf`` and
+``chunk_text``. They live here (instead of inside the Streamlit script) so
+command-line tools and benchmarks can run them without starting a UI.
+
+Every document gets structured metadata when it is made, so filtering,
+citations and lookups never have to parse the text again:
+
+- ``chunk_documents``: the text chunks, each with its source file, the
+  page(s) it comes from, and the table rows (and item names) it contains;
+- ``row_documents``: one document per nutrition table row, with the item
+  name and the row's nutrient numbers, so questions with numeric
+  conditions can be answered by filtering rows (see rag_core/constraints.py).
+"""
+
+import bisect
+import re
+
+from rag_core.constraints import nutrient_values
+
+# Column headers that name the menu item
+_ITEM_HEADER = re.compile(r"\b(?:item|name|product|menu)\b", re.IGNORECASE)
+
+
+def row_text(headers, row):
+    """A table row as "Header: value | ..." text (empty cells left out)."""
+    return " | ".join(
+        f"{headers[i]}: {cell}"
+        for i, cell in enumerate(row)
+        if cell and i < len(headers) and headers[i]
+    )
+
+
+def item_name(headers, row):
+    """
+    The menu item a table row is about: the "Item"/"Name" column, else the
+    first cell if it is not a number. None if there is neither.
+    """
+    for header, cell in zip(headers, row):
+        if header and cell and _ITEM_HEADER.search(header):
+            return " ".join(cell.split())
+    if row and row[0] and not re.fullmatch(r"[\d.,\s%<>gm]+", row[0]):
+        return " ".join(row[0].split())
+    return None
+
+
+def _scanned_text(pdf_file, page_numbers, ocr, errors):
+    """OCR text of pages without a text layer, by page number."""
+    if ocr is None:
+        from rag_core.ocr import default_ocr
+
+        ocr = default_ocr()
+    if not ocr or not page_numbers:
+        return {}
+    return ocr.ocr(pdf_file, page_numbers, errors=errors)
+
+
+def extract_pdf_content(pdf_file, ocr=None, on_page=None):
+    """
+    Read a PDF once and return both its text and its tables.
+
+    Table rows are written into the text as "Header: value | ..." lines so
+    each row keeps its column names. The tables are also returned as-is
+    (the "table store") for code that wants structured rows.
+
+    Pages with neither text nor tables (scanned images) are read with OCR
+    instead, see rag_core/ocr.py.
+
+    Args:
+        pdf_file: Path or file-like object
+        ocr: ``PageOCR`` for scanned pages (default: the RAG_OCR_* one,
+            False: leave them empty)
+        on_page: Called as ``on_page(page_number, page_count)`` after each
+            page is read, e.g. to report progress (may raise to stop)
+
+    Returns:
+        dict: "text" (str), "tables" (list of dicts with "page",
+        "table_index", "headers" and "rows"), "page_starts" (offset in
+        the text where each page begins), "row_spans" (where each
+        table row's line is in the text: dicts with "start", "end",
+        "page", "table_index" and "row_index"), "scanned_pages" (numbers
+        of the pages without a text layer), "ocr_pages" (those whose
+        text came from OCR) and "ocr_errors" (page number -> why OCR
+        failed, for scanned pages that are left empty)
+    """
+    try:
+        import pdfplumber
+
+        all_tables = []
+        pages = []  # per page: (row lines as (table_index, row_index, text), page text)
+        with pdfplumber.open(pdf_file) as pdf:
+            for page_number, page in enumerate(pdf.pages, 1):
+                rows = []
+                tables = page.extract_tables()
+
+                if tables:
+                    for table_index, table in enumerate(tables):
+                        if table and len(table) > 0:
+                            headers = table[0]
+                            all_tables.append({
+                                "page": page_number,
+                                "table_index": table_index,
+                                "headers": headers,
+                                "rows": table[1:],
+                            })
+
+                            for row_index, row in enumerate(table[1:]):
+                                if row and any(row):
+                                    rows.append((table_index, row_index, row_text(headers, row)))
+
+                pages.append((rows, page.extract_text() or ""))
+                if on_page:
+                    on_page(page_number, len(pdf.pages))
+
+    except ImportError:
+        import PyPDF2
+
+        all_tables = []
+        pages = []
+        reader = PyPDF2.PdfReader(pdf_file)
+        for page_number, page in enumerate(reader.pages, 1):
+            # extract_text() gives None for pages without a text layer
+            pages.append(([], page.extract_text() or ""))
+            if on_page:
+                on_page(page_number, len(reader.pages))
+
+    # OCR runs once for all scanned pages, so they are read in parallel
+    scanned = [number for number, (rows, page_text) in enumerate(pages, 1)
+               if not rows and not page_text.strip()]
+    ocr_errors = {}
+    ocr_text = _scanned_text(pdf_file, scanned, ocr, ocr_errors)
+
+    all_text = ""
+    page_starts = []
+    row_spans = []
+    for page_number, (rows, page_text) in enumerate(pages, 1):
+        page_starts.append(len(all_text))
+        for table_index, row_index, line in rows:
+            start = len(all_text)
+            all_text += line
+            row_spans.append({
+                "start": start, "end": len(all_text),
+                "page": page_number, "table_index": table_index,
+                "row_index": row_index,
+            })
+            all_text += "\n\n"
+
+        page_text = page_text if page_text.strip() else ocr_text.get(page_number, "").strip()
+        if page_text:
+            all_text += page_text + "\n\n"
+
+    return {"text": all_text, "tables": all_tables, "page_starts": page_starts,
+            "row_spans": row_spans, "scanned_pages": scanned,
+            "ocr_pages": [number for number in scanned if ocr_text.get(number, "").strip()],
+            "ocr_errors": ocr_errors}
+
+
+def no_text_error(content, source):
+    """The ``ValueError`` for a PDF that gave no text, saying why if it was scanned."""
+    message = f"No text found in {source}"
+    errors = content.get("ocr_errors")
+    if errors:
+        number, reason = min(errors.items())
+        message += (f" ({len(errors)} scanned page(s) could not be read with OCR;"
+                    f" page {number}: {reason})")
+    elif content.get("scanned_pages") and not content.get("ocr_pages"):
+        message += (f" ({len(content['scanned_pages'])} scanned page(s) need OCR: install "
+                    "Tesseract and pytesseract, and check RAG_OCR is not 0)")
+    return ValueError(message)
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract text from PDF with special handling for tables."""
+    return extract_pdf_content(pdf_file)["text"]
+
+
+def row_documents(tables, source=None):
+    """
+    One document per table row, for filtering on its numbers.
+
+    Args:
+        tables: Tables from ``extract_pdf_content``
+        source: File the tables came from
+
+    Returns:
+        tuple: (row texts, metadata dicts) - each metadata has "kind":
+        "row", where the row is, and one number per nutrient column
+        (see ``rag_core.constraints.nutrient_values``). Rows without any
+        nutrient number are left out.
+    """
+    texts, metadatas = [], []
+    for table in tables:
+        headers = table["headers"] or []
+        for row_index, row in enumerate(table["rows"]):
+            if not row or not any(row):
+                continue
+            values = nutrient_values(headers, row)
+            if not values:
+                continue  # not a nutrition row, nothing to filter on
+            metadata = {"kind": "row", "page": table["page"],
+                        "table_index": table["table_index"], "row_index": row_index}
+            if source:
+                metadata["source"] = source
+            item = item_name(headers, row)
+            if item:
+                metadata["item"] = item
+            metadata.update(values)
+            text = row_text(headers, row)
+            texts.append(text)
+            metadatas.append(metadata)
+    return texts, metadatas
+
+
+def chunk_spans(text, chunk_size=1000, overlap=100):
+    """(start, end) offsets in `text` of the chunks ``chunk_text`` makes."""
+    spans = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+
+        if end < len(text):
+            newline_pos = text.rfind('\n', end - 100, end)
+            if newline_pos != -1:
+                end = newline_pos + 1
+
+        if text[start:end].strip():
+            spans.append((start, end))
+
+        start = end - overlap
+
+    return spans
+
+
+def chunk_text(text, chunk_size=1000, overlap=100):
+    """Split text into chunks while preserving context."""
+    return [text[start:end].strip() for start, end in chunk_spans(text, chunk_size, overlap)]
+
+
+def chunk_documents(content, source=None, chunk_size=1000, overlap=100):
+    """
+    Chunk extracted PDF content, with metadata for every chunk.
+
+    Args:
+        content: Result of ``extract_pdf_content``
+        source: File the content came from
+
+    Returns:
+        tuple: (chunk texts, metadata dicts). Each metadata has "kind":
+        "chunk", "chunk_index", "source", "page" and "page_end" (the pages
+        the chunk spans). Chunks holding table rows also have the
+        "table_index" and "row_index" of the first one, "row_count" and
+        "items" (item names joined with "; "); a chunk with exactly one
+        row has its "item" and nutrient numbers too.
+    """
+    text = content["text"]
+    page_starts = content.get("page_starts") or []
+    row_spans = content.get("row_spans") or []
+    tables = {(table["page"], table["table_index"]): table for table in content["tables"]}
+    row_starts = [span["start"] for span in row_spans]
+
+    chunks, metadatas = [], []
+    for start, end in chunk_spans(text, chunk_size, overlap):
+        metadata = {"kind": "chunk", "chunk_index": len(chunks)}
+        if source:
+            metadata["source"] = source
+        if page_starts:
+            metadata["page"] = bisect.bisect_right(page_starts, start)
+            metadata["page_end"] = bisect.bisect_right(page_starts, end - 1)
+
+        # Table rows whose line starts inside the chunk (a row cut off at the
+        # start only has its tail here; it belongs to the previous chunk)
+        rows = []
+        first = bisect.bisect_left(row_starts, start)
+        for span in row_spans[first:bisect.bisect_left(row_starts, end)]:
+            table = tables.get((span["page"], span["table_index"]))
+            if table is not None:
+                rows.append((span, table["headers"] or [], table["rows"][span["row_index"]]))
+        if rows:
+            span = rows[0][0]
+            metadata.update(table_index=span["table_index"], row_index=span["row_index"],
+                            row_count=len(rows))
+            items = [item_name(headers, row) for _, headers, row in rows]
+            items = [item for item in items if item]
+            if items:
+                metadata["items"] = "; ".join(items)
+            if len(rows) == 1:
+                if items:
+                    metadata["item"] = items[0]
+                metadata.update(nutrient_values(rows[0][1], rows[0][2]))
+
+        chunks.append(text[start:end].strip())
+        metadatas.append(metadata)
+    return chunks, metadatas
@@ -0,0 +1,212 @@
+"""
+Background PDF ingestion with progress, cancellation and partial results.
+
+Indexing an uploaded menu (extract, chunk, embed) takes from seconds to
+minutes, and used to block the session under one spinner.
+``Assistant.start_ingest`` runs it as an ``IngestJob`` in a small worker
+pool instead, and the job can be watched and steered while it runs:
+
+- progress: pages extracted and documents embedded so far (``progress``);
+- cancellation: ``cancel`` stops the job at the next page or embedding
+  batch;
+- partial results: ``knowledge`` is set as soon as the first batch of
+  chunks is embedded and grows one batch at a time, so questions can be
+  answered from the part of the menu indexed so far.
+
+``Assistant.ingest_pdf`` runs the same job in the calling thread.
+"""
+
+import io
+import threading
+import time
+import uuid
+
+from rag_core import tracing
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL
+from rag_core.ingest import chunk_documents, extract_pdf_content, no_text_error
+from rag_core.knowledge import KnowledgeBase, index_documents
+
+# Job states, in the order a job goes through them
+QUEUED = "queued"
+EXTRACTING = "extracting"
+EMBEDDING = "embedding"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class IngestCancelled(Exception):
+    """The ingestion job was cancelled before it finished."""
+
+
+class IngestJob:
+    """
+    One PDF being indexed.
+
+    Args:
+        data: The PDF's bytes
+        source: Name to show and cite for it
+        model_name, storage, rerank: See ``KnowledgeBase.from_chunks``
+        tracer: ``Tracer`` to record the "ingest" turn with
+        batch_size: Documents embedded (and made searchable) at a time
+        store: Called with the finished ``KnowledgeBase``; returns the one
+            to keep (e.g. the same PDF indexed meanwhile by another session)
+    """
+
+    def __init__(self, data, source, model_name=DEFAULT_EMBEDDING_MODEL, storage="chroma",
+                 rerank=False, tracer=None, batch_size=32, store=None):
+        self.job_id = uuid.uuid4().hex
+        self.data = data
+        self.source = source
+        self.model_name = model_name
+        self.storage = storage
+        self.rerank = rerank
+        self.tracer = tracer or tracing.Tracer()
+        self.batch_size = batch_size
+        self._store = store
+        self.state = QUEUED
+        self.pages_done = 0
+        self.page_count = 0
+        self.documents_done = 0
+        self.document_count = 0
+        self.knowledge = None
+        self.ocr_errors = {}  # scanned page number -> why OCR failed
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @classmethod
+    def completed(cls, knowledge, source):
+        """A job that has nothing to do: `knowledge` is already indexed."""
+        job = cls(None, source)
+        job.knowledge = knowledge
+        job.state = DONE
+        job.document_count = job.documents_done = knowledge.count()
+        job.started = job.finished = time.time()
+        job._done.set()
+        return job
+
+    @property
+    def done(self):
+        """True once the job has finished, been cancelled or failed."""
+        return self._done.is_set()
+
+    def cancel(self):
+        """Stop the job at the next page or batch; the partial index is dropped."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done; False if `timeout` seconds passed first."""
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        The finished ``KnowledgeBase``, waiting for it if needed.
+
+        Raises:
+            IngestCancelled: The job was cancelled
+            ValueError: The PDF has no text (see ``no_text_error``), or
+                whatever else made the job fail
+            TimeoutError: Still running after `timeout` seconds
+        """
+        if not self.wait(timeout):
+            raise TimeoutError(f"{self.source} is still being indexed")
+        if self.error is not None:
+            raise self.error
+        return self.knowledge
+
+    def progress(self):
+        """
+        Where the job is, e.g. for a progress bar.
+
+        Returns:
+            dict: "state", "pages_done"/"page_count", "documents_done"/
+            "document_count", "fraction" (0-1: extraction counts as the
+            first 20%), "elapsed_s", "ocr_failed_pages" (scanned pages
+            left empty because OCR failed) and "error" (message or None)
+        """
+        if self.state == DONE:
+            fraction = 1.0
+        elif self.document_count:
+            fraction = 0.2 + 0.8 * self.documents_done / self.document_count
+        elif self.page_count:
+            fraction = 0.2 * self.pages_done / self.page_count
+        else:
+            fraction = 0.0
+        end = self.finished or time.time()
+        return {
+            "job_id": self.job_id,
+            "source": self.source,
+            "state": self.state,
+            "pages_done": self.pages_done,
+            "page_count": self.page_count,
+            "documents_done": self.documents_done,
+            "document_count": self.document_count,
+            "fraction": fraction,
+            "elapsed_s": end - self.started if self.started else 0.0,
+            "ocr_failed_pages": sorted(self.ocr_errors),
+            "error": str(self.error) if self.error is not None else None,
+        }
+
+    def _check(self):
+        if self._cancel.is_set():
+            raise IngestCancelled(f"Indexing {self.source} was cancelled")
+
+    def _on_page(self, page_number, page_count):
+        self.pages_done, self.page_count = page_number, page_count
+        self._check()
+
+    def run(self):
+        """
+        Do the work (in the calling thread). Errors are not raised here but
+        kept for ``result``, so a worker pool never loses them.
+        """
+        if self.done:
+            return
+        self.started = time.time()
+        try:
+            knowledge = self._ingest()
+            self.knowledge = self._store(knowledge) if self._store else knowledge
+            self.state = DONE
+        except Exception as exc:
+            self.error = exc
+            self.knowledge = None  # a partial index must not outlive the job
+            self.state = CANCELLED if isinstance(exc, IngestCancelled) else FAILED
+        finally:
+            self.data = None
+            self.finished = time.time()
+            self._done.set()
+
+    def _ingest(self):
+        self._check()
+        with self.tracer.turn("ingest", source=self.source) as turn:
+            self.state = EXTRACTING
+            with tracing.span("extract_pdf") as span:
+                content = extract_pdf_content(io.BytesIO(self.data), on_page=self._on_page)
+                self.ocr_errors = content["ocr_errors"]
+                if span is not None and content["scanned_pages"]:
+                    span.attributes.update(scanned_pages=len(content["scanned_pages"]),
+                                           ocr_pages=len(content["ocr_pages"]),
+                                           ocr_failed=len(content["ocr_errors"]))
+            with tracing.span("chunk_text"):
+                chunks, metadatas = chunk_documents(content, self.source)
+            if not chunks:
+                raise no_text_error(content, self.source)
+
+            documents, ids, metadatas = index_documents(chunks, self.source, content["tables"],
+                                                        metadatas)
+            self.document_count = len(documents)
+            self.state = EMBEDDING
+            knowledge = KnowledgeBase.empty(self.source, self.model_name, self.storage,
+                                            self.rerank, tables=content["tables"])
+            for start in range(0, len(documents), self.batch_size):
+                self._check()
+                stop = start + self.batch_size
+                knowledge.add(documents[start:stop], ids[start:stop], metadatas[start:stop])
+                self.documents_done = min(stop, len(documents))
+                # Searchable from the first batch on
+                self.knowledge = knowledge
+            turn.root.attributes["documents"] = len(documents)
+        return knowledge
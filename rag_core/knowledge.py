@@ -0,0 +1,331 @@
+"""
+A searchable set of document chunks, independent of any UI.
+
+``KnowledgeBase`` bundles what retrieval needs: the collection (ChromaDB, a
+``QuantizedVectorStore`` or a prebuilt ``MenuIndex`` - they share the same
+``query``/``count`` methods), the name of the model that embedded it,
+where the chunks came from, and the PDF's tables as structured rows.
+
+Every document carries the metadata made at ingestion (source file, page,
+table, row, item, nutrient numbers; see rag_core/ingest.py), and every hit
+comes with a ``citation`` built from it.
+
+Next to the text chunks, the collection holds one document per nutrition
+table row (metadata "kind": "row", with the row's numbers). Plain searches
+leave those out; ``rows_matching`` searches only the rows that meet a
+question's numeric constraints.
+"""
+
+import uuid
+import weakref
+
+from rag_core import tracing
+from rag_core.constraints import row_filter
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL, encode_query, load_embedding_model
+from rag_core.ingest import row_documents
+
+STORAGE_MODES = ("chroma", "float16", "int8")
+
+
+class KnowledgeBase:
+    """
+    Chunks plus the vectors to search them.
+
+    Args:
+        collection: Object with Chroma-style ``query`` and ``count``
+        embedding_model_name: Model the collection was embedded with
+        embedding_backend: Backend it ran on (default: RAG_EMBEDDING_BACKEND);
+            queries are encoded with the same one
+        source: Human-readable origin (file name, "Prebuilt index", ...)
+        tables: Tables from the PDF (see ``rag_core.ingest.extract_pdf_content``)
+        row_count: Table-row documents in the collection
+    """
+
+    def __init__(self, collection, embedding_model_name, source=None, tables=None, row_count=0,
+                 embedding_backend=None):
+        self.collection = collection
+        self.embedding_model_name = embedding_model_name
+        self.embedding_backend = embedding_backend
+        self.source = source
+        self.tables = tables or []
+        self.row_count = row_count
+        self.storage = None  # set by ``empty``; only needed to ``add``
+
+    @classmethod
+    def empty(cls, source=None, model_name=DEFAULT_EMBEDDING_MODEL, storage="chroma",
+              rerank=False, tables=None):
+        """
+        A knowledge base with nothing indexed yet, to ``add`` documents to.
+
+        Args: see ``from_chunks``
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"storage must be one of {STORAGE_MODES}, not {storage!r}")
+        if storage in ("float16", "int8"):
+            from rag_core.vector_store import QuantizedVectorStore
+
+            # Compact store: one contiguous array instead of Python float lists
+            collection = QuantizedVectorStore(dtype=storage, keep_full_precision=rerank)
+        else:
+            import chromadb
+
+            # Every in-process ``chromadb.Client()`` shares one set of
+            # collections, and the Assistant (with its background ingestion
+            # jobs) is shared by all sessions: each knowledge base gets a
+            # collection of its own, dropped when the knowledge base is
+            # garbage-collected (see ``_drop_collection``)
+            client = chromadb.Client()
+            name = f"documents_{uuid.uuid4().hex}"
+            # Cosine distance, like the other stores (Chroma's default is
+            # squared L2): ``FastPath.max_distance`` is tuned for it
+            collection = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+        knowledge = cls(collection, model_name, source, tables)
+        knowledge.storage = storage
+        if storage == "chroma":
+            weakref.finalize(knowledge, _drop_collection, client, name)
+        return knowledge
+
+    @classmethod
+    def from_chunks(cls, chunks, source=None, model_name=DEFAULT_EMBEDDING_MODEL,
+                    storage="chroma", rerank=False, tables=None, metadatas=None):
+        """
+        Embed `chunks` (and the nutrition rows of `tables`) and index them.
+
+        Args:
+            chunks: Text chunks (see ``rag_core.ingest.chunk_text``)
+            source: Where they came from
+            model_name: sentence-transformers model to embed with
+            storage: "chroma", or "float16"/"int8" for a compact in-memory store
+            rerank: With "float16"/"int8", keep float32 copies to re-rank hits
+            tables: Structured tables from the same PDF
+            metadatas: One metadata dict per chunk (see
+                ``rag_core.ingest.chunk_documents``); default: kind and index
+        """
+        knowledge = cls.empty(source, model_name, storage, rerank, tables)
+        knowledge.add(*index_documents(chunks, source, tables, metadatas))
+        return knowledge
+
+    def add(self, documents, ids, metadatas):
+        """
+        Embed and index more documents; they are searchable once this returns.
+
+        Args:
+            documents, ids, metadatas: Parallel lists, as from ``index_documents``
+        """
+        if not documents:
+            return
+        embedding_model = load_embedding_model(self.embedding_model_name, self.embedding_backend)
+        chunks = sum(metadata.get("kind") != "row" for metadata in metadatas)
+        rows = len(documents) - chunks
+
+        if self.storage in ("float16", "int8"):
+            with tracing.span("embed_chunks", chunks=chunks, rows=rows):
+                embeddings = embedding_model.encode(documents)
+            with tracing.span("index_build", storage=self.storage):
+                self.collection.add(
+                    embeddings=embeddings,
+                    documents=documents,
+                    ids=ids,
+                    metadatas=metadatas
+                )
+        else:
+            # Encoding and inserting are interleaved here, so both are timed
+            # as one "index_build" stage
+            with tracing.span("index_build", storage="chroma", chunks=chunks, rows=rows):
+                for document, document_id, metadata in zip(documents, ids, metadatas):
+                    embedding = embedding_model.encode(document).tolist()
+                    self.collection.add(
+                        embeddings=[embedding],
+                        documents=[document],
+                        ids=[document_id],
+                        metadatas=[metadata]
+                    )
+        self.row_count += rows
+
+    @classmethod
+    def from_menu_index(cls, index):
+        """Wrap a loaded ``MenuIndex`` (no embedding work needed)."""
+        return cls(index, index.embedding_model_name,
+                   f"Prebuilt index ({index.manifest['chunk_count']} chunks)", index.tables,
+                   row_count=index.manifest.get("row_count", 0),
+                   embedding_backend=index.embedding_backend)
+
+    def count(self):
+        """Number of chunks."""
+        return self.collection.count()
+
+    def memory_bytes(self):
+        """
+        Bytes of vectors this knowledge base holds in process memory.
+
+        0 for collections that don't report it (ChromaDB) or don't own
+        their vectors (a memory-mapped ``MenuIndex``).
+        """
+        memory_bytes = getattr(self.collection, "memory_bytes", None)
+        return memory_bytes() if memory_bytes else 0
+
+    def _filter(self, where):
+        """Query arguments for `where`; without one, table rows are left out."""
+        if where is None and self.row_count:
+            where = {"kind": {"$ne": "row"}}
+        return {"where": where} if where is not None else {}
+
+    def search(self, query, n_results=5, where=None):
+        """
+        The chunks most similar to `query`.
+
+        Args:
+            where: Chroma-style metadata filter (default: text chunks only)
+
+        Returns:
+            list: Chunk texts, best match first
+        """
+        return [hit["text"] for hit in self.hits(query, n_results, where)]
+
+    def hits(self, query, n_results=5, where=None):
+        """
+        Like ``search``, with ids, metadata and cosine distances.
+
+        Returns:
+            list: Dicts with "id", "text", "metadata", "distance" and
+            "citation" (see ``citation``)
+        """
+        with tracing.span("embed_query"):
+            query_embedding = encode_query(query, self.embedding_model_name, self.embedding_backend).tolist()
+
+        with tracing.span("vector_query", n_results=n_results, filtered=where is not None):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                **self._filter(where)
+            )
+        return _hits(results, 0)
+
+    def rows_matching(self, query, constraints, n_results=20):
+        """
+        Table rows meeting every constraint, most similar to `query` first.
+
+        Args:
+            constraints: ``Constraint`` objects (see ``rag_core.constraints``)
+
+        Returns:
+            list: Hits as from ``hits``; empty if no row qualifies or no rows
+            are indexed
+        """
+        if not self.row_count:
+            return []
+        return self.hits(query, n_results, where=row_filter(constraints))
+
+    def hits_batch(self, queries, n_results=5, batch_size=64):
+        """
+        ``hits`` for many queries: one batched encode and one vector query.
+
+        Args:
+            queries: Query texts
+            batch_size: Queries per forward pass of the embedding model
+
+        Returns:
+            list: One list of hits per query, in order
+        """
+        if not queries:
+            return []
+        with tracing.span("embed_query", queries=len(queries)):
+            embedding_model = load_embedding_model(self.embedding_model_name, self.embedding_backend)
+            query_embeddings = embedding_model.encode(list(queries), batch_size=batch_size)
+
+        with tracing.span("vector_query", n_results=n_results, queries=len(queries)):
+            results = self.collection.query(
+                query_embeddings=query_embeddings.tolist(),
+                n_results=n_results,
+                **self._filter(None)
+            )
+        return [_hits(results, i) for i in range(len(queries))]
+
+    def menu_items(self, query=None, limit=50):
+        """
+        Table rows as {header: value} dicts, e.g. one per menu item.
+
+        Args:
+            query: Only rows where some cell contains this text (any case)
+            limit: Most rows to return
+        """
+        needle = query.lower() if query else None
+        items = []
+        for table in self.tables:
+            headers = table["headers"]
+            for row in table["rows"]:
+                if not row or not any(row):
+                    continue
+                if needle and not any(cell and needle in cell.lower() for cell in row):
+                    continue
+                items.append({
+                    header: cell
+                    for header, cell in zip(headers, row) if header and cell
+                })
+                if len(items) >= limit:
+                    return items
+        return items
+
+
+def index_documents(chunks, source=None, tables=None, metadatas=None):
+    """
+    Everything a PDF's knowledge base indexes: its text chunks, then one
+    document per nutrition table row.
+
+    Args: see ``KnowledgeBase.from_chunks``
+
+    Returns:
+        tuple: (documents, ids, metadatas), parallel lists
+    """
+    row_texts, row_metadatas = row_documents(tables or [], source)
+    documents = list(chunks) + row_texts
+    ids = ([f"chunk_{i}" for i in range(len(chunks))]
+           + [f"row_{i}" for i in range(len(row_texts))])
+    if metadatas is None:
+        metadatas = [{"kind": "chunk", "chunk_index": i} for i in range(len(chunks))]
+    return documents, ids, list(metadatas) + row_metadatas
+
+
+def citation(metadata):
+    """
+    Where a document came from, for showing next to an answer.
+
+    Example: "menu.pdf, p. 3, table 1 row 4 (Grilled Chicken Sandwich)".
+    Empty if the metadata doesn't say (e.g. an index built before
+    per-chunk metadata).
+    """
+    if not metadata:
+        return ""
+    parts = [metadata["source"]] if metadata.get("source") else []
+    if "page" in metadata:
+        page_end = metadata.get("page_end", metadata["page"])
+        parts.append(f"p. {metadata['page']}" if page_end == metadata["page"]
+                     else f"pp. {metadata['page']}-{page_end}")
+    if "row_index" in metadata and metadata.get("row_count", 1) == 1:
+        parts.append(f"table {metadata['table_index'] + 1} row {metadata['row_index'] + 1}")
+    text = ", ".join(parts)
+    if metadata.get("item") and metadata.get("row_count", 1) == 1:
+        text += f" ({metadata['item']})"
+    return text
+
+
+def _drop_collection(client, name):
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass  # already gone, or the interpreter is shutting down
+
+
+def _hits(results, query_number):
+    """Hit dicts for one query of a Chroma-style result."""
+    ids = results["ids"][query_number]
+    metadatas = (results.get("metadatas") or [None] * (query_number + 1))[query_number]
+    distances = (results.get("distances") or [None] * (query_number + 1))[query_number]
+    return [
+        {"id": chunk_id, "text": text, "metadata": metadata or {}, "distance": distance,
+         "citation": citation(metadata)}
+        for chunk_id, text, metadata, distance in zip(
+            ids, results["documents"][query_number],
+            metadatas or [None] * len(ids), distances or [None] * len(ids)
+        )
+    ]
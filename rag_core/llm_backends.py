@@ -0,0 +1,437 @@
+"""
+LLM backends: one interface for local Ollama, the Anthropic API and a fake.
+
+Every app talks to the model through a backend object:
+
+    backend = backend_from_env()
+    for piece in backend.stream(system_message, messages):
+        print(piece, end="")
+
+- ``stream(system, messages)`` yields the answer text as it arrives
+- ``complete(system, messages)`` returns the whole answer as one string
+
+Pass ``usage={}`` to either to get the call's token counts back, including
+how much of the prompt prefill came from the server's prefix cache.
+``usage_totals()`` adds these up over the life of the backend.
+
+``messages`` is the usual list of {"role": "user"/"assistant", "content": ...}
+dicts; the system prompt is passed separately and each backend puts it where
+its API expects it.
+
+Backends keep one HTTP client for the life of the process (create them once,
+e.g. with ``st.cache_resource``), so connections are pooled and kept alive
+between questions. Failed calls are retried with jittered exponential backoff,
+but only if no text has been streamed yet.
+
+Which backend to use is configuration, not code:
+
+    LLM_BACKEND          ollama | anthropic | fake
+    LLM_MODEL            model name (default depends on the backend)
+    LLM_TIMEOUT          seconds to wait for the model to respond
+    LLM_MAX_RETRIES      retries for connection errors, 429s and 5xx
+    LLM_MAX_CONNECTIONS  size of the HTTP connection pool
+    LLM_KEEPALIVE        seconds an idle pooled connection stays open
+    OLLAMA_HOST          Ollama server URL (default http://localhost:11434)
+    ANTHROPIC_API_KEY    API key for the anthropic backend
+    FAKE_LLM_FIRST_TOKEN, FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_JITTER,
+    FAKE_LLM_PREFILL_MS_PER_TOKEN
+                         latency profile of the fake backend
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+DEFAULT_MODELS = {
+    "ollama": "llama3.2",
+    "anthropic": "claude-3-5-sonnet-20241022",
+    "fake": "fake-llm",
+}
+
+# Per-backend time limits (seconds): a CPU-only Ollama box can take a while
+# to finish a long answer, the hosted API should not.
+DEFAULT_TIMEOUTS = {
+    "ollama": 180.0,
+    "anthropic": 60.0,
+    "fake": 30.0,
+}
+
+CONNECT_TIMEOUT = 5.0
+
+# Keys of a usage dict (None when the backend does not report a value):
+#   prompt_tokens           whole prompt
+#   cached_prompt_tokens    prompt tokens served from the prefix cache
+#   uncached_prompt_tokens  prompt tokens the model had to prefill
+#   cache_write_tokens      prompt tokens written to the cache (Anthropic)
+#   output_tokens           generated tokens
+#   prefill_ms              server-reported prefill time (Ollama)
+#   first_token_ms          measured time until the first text arrived
+#   total_ms                measured time for the whole call
+USAGE_KEYS = (
+    "prompt_tokens", "cached_prompt_tokens", "uncached_prompt_tokens",
+    "cache_write_tokens", "output_tokens", "prefill_ms",
+)
+
+
+class LLMBackend:
+    """Base class: subclasses implement ``_stream_once``."""
+
+    name = "base"
+
+    def __init__(self, model, max_retries=2, backoff_base=0.5, backoff_cap=8.0):
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._usage_lock = threading.Lock()
+        self._usage_totals = {"calls": 0, "first_token_ms": 0.0}
+        self._usage_totals.update({key: 0 for key in USAGE_KEYS})
+
+    def _stream_once(self, system, messages, max_tokens, usage):
+        """Yield answer text; fill `usage` with whatever the server reports."""
+        raise NotImplementedError
+
+    def _is_retryable(self, error):
+        return False
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def stream(self, system, messages, max_tokens=1024, usage=None):
+        """
+        Stream the model's answer.
+
+        Args:
+            system: System prompt (keep it the same every turn - see prompts.py)
+            messages: Conversation as role/content dicts
+            max_tokens: Longest answer to generate
+            usage: Optional dict, filled with this call's token counts and
+                timings once the stream has finished
+
+        Yields:
+            str: Pieces of the answer text
+        """
+        call_usage = dict.fromkeys(USAGE_KEYS)
+        call_started = time.perf_counter()
+        attempt = 0
+        while True:
+            started = False
+            try:
+                for piece in self._stream_once(system, messages, max_tokens, call_usage):
+                    if not started:
+                        call_usage["first_token_ms"] = 1000 * (time.perf_counter() - call_started)
+                        started = True
+                    yield piece
+                break
+            except Exception as error:
+                if started or attempt >= self.max_retries or not self._is_retryable(error):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+
+        call_usage["total_ms"] = 1000 * (time.perf_counter() - call_started)
+        self._record_usage(call_usage)
+        if usage is not None:
+            usage.update(call_usage)
+
+    def complete(self, system, messages, max_tokens=1024, usage=None):
+        """Return the whole answer as one string."""
+        return "".join(self.stream(system, messages, max_tokens, usage))
+
+    def _record_usage(self, usage):
+        with self._usage_lock:
+            self._usage_totals["calls"] += 1
+            self._usage_totals["first_token_ms"] += usage.get("first_token_ms") or 0.0
+            for key in USAGE_KEYS:
+                self._usage_totals[key] += usage[key] or 0
+
+    def usage_totals(self):
+        """
+        Usage summed over every call so far.
+
+        Includes "cache_hit_rate": the share of prompt tokens served from
+        the prefix cache (None if the backend does not report it).
+        """
+        with self._usage_lock:
+            totals = dict(self._usage_totals)
+        # Ollama only reports the tokens it had to evaluate, not the total
+        prompt = totals["prompt_tokens"]
+        totals["cache_hit_rate"] = totals["cached_prompt_tokens"] / prompt if prompt else None
+        totals["avg_first_token_ms"] = (
+            totals["first_token_ms"] / totals["calls"] if totals["calls"] else None
+        )
+        return totals
+
+    def close(self):
+        """Close pooled connections."""
+
+
+class OllamaBackend(LLMBackend):
+    """Local models served by Ollama."""
+
+    name = "ollama"
+
+    def __init__(self, model=DEFAULT_MODELS["ollama"], host=None,
+                 timeout=DEFAULT_TIMEOUTS["ollama"], max_connections=10,
+                 keepalive=60.0, model_keep_alive="30m", **kwargs):
+        super().__init__(model, **kwargs)
+        import httpx
+        import ollama
+
+        self._ollama = ollama
+        self._httpx = httpx
+        self.model_keep_alive = model_keep_alive
+        # ollama.Client builds its own httpx.Client; the connection pool is
+        # in this transport, which we own and close
+        self._transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive,
+            ),
+        )
+        self._client = ollama.Client(
+            host=host,
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            transport=self._transport,
+        )
+
+    def _stream_once(self, system, messages, max_tokens, usage):
+        chunks = self._client.chat(
+            model=self.model,
+            messages=[{"role": "system", "content": system}] + list(messages),
+            stream=True,
+            options={"num_predict": max_tokens},
+            keep_alive=self.model_keep_alive,
+        )
+        for chunk in chunks:
+            yield chunk["message"]["content"]
+            if chunk.get("done"):
+                # Ollama reuses the KV cache for a matching prompt prefix and
+                # only counts (and times) the tokens it had to evaluate
+                usage["uncached_prompt_tokens"] = chunk.get("prompt_eval_count")
+                usage["output_tokens"] = chunk.get("eval_count")
+                if chunk.get("prompt_eval_duration") is not None:
+                    usage["prefill_ms"] = chunk.get("prompt_eval_duration") / 1e6
+
+    def _is_retryable(self, error):
+        if isinstance(error, self._ollama.ResponseError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, (ConnectionError, self._httpx.TransportError))
+
+    def close(self):
+        self._transport.close()
+
+
+class AnthropicBackend(LLMBackend):
+    """Claude models through the Anthropic API."""
+
+    name = "anthropic"
+
+    def __init__(self, model=DEFAULT_MODELS["anthropic"], api_key=None,
+                 timeout=DEFAULT_TIMEOUTS["anthropic"], max_connections=10,
+                 keepalive=60.0, **kwargs):
+        super().__init__(model, **kwargs)
+        import anthropic
+        import httpx
+
+        self._anthropic = anthropic
+        self._client = anthropic.Anthropic(
+            api_key=api_key or os.environ.get("ANTHROPIC_API_KEY"),
+            timeout=anthropic.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            max_retries=0,  # we retry ourselves, with jitter
+            http_client=anthropic.DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=keepalive,
+                ),
+            ),
+        )
+
+    def _stream_once(self, system, messages, max_tokens, usage):
+        # The API wants the conversation to start with the user, so drop
+        # leading assistant messages such as a welcome greeting
+        messages = list(messages)
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+
+        # Prompt caching: one breakpoint after the static system prompt and
+        # one after the history, so both prefixes are reused next turn
+        cached = {"type": "ephemeral"}
+        system_blocks = [{"type": "text", "text": system, "cache_control": cached}]
+        if len(messages) > 1:
+            last_history = messages[-2]
+            messages[-2] = {
+                "role": last_history["role"],
+                "content": [{"type": "text", "text": last_history["content"], "cache_control": cached}],
+            }
+
+        with self._client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system_blocks,
+            messages=messages,
+        ) as stream:
+            yield from stream.text_stream
+            final = stream.get_final_message().usage
+
+        cache_read = final.cache_read_input_tokens or 0
+        cache_write = final.cache_creation_input_tokens or 0
+        usage["cached_prompt_tokens"] = cache_read
+        usage["uncached_prompt_tokens"] = final.input_tokens + cache_write
+        usage["cache_write_tokens"] = cache_write
+        usage["prompt_tokens"] = final.input_tokens + cache_read + cache_write
+        usage["output_tokens"] = final.output_tokens
+
+    def _is_retryable(self, error):
+        if isinstance(error, self._anthropic.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, self._anthropic.APIConnectionError)
+
+    def close(self):
+        self._client.close()
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local stand-in for load tests and benchmarks - no model server needed.
+
+    The answer echoes the question and the last few "label: value" lines of
+    the final user message (the retrieved context), streamed word by word
+    with a configurable latency profile.
+
+    Prefix caching is simulated too: the fake remembers prompt prefixes at
+    message boundaries, and only the words after the longest remembered
+    prefix count as uncached prefill (one word = one token).
+
+    Args:
+        first_token: Seconds before the first word, on top of prefill
+        tokens_per_second: Generation speed after that (0 = instant)
+        jitter: Random +/- fraction applied to every delay
+        answer_words: Length of the generated answer in words
+        prefill_ms_per_token: Extra delay per uncached prompt token
+    """
+
+    name = "fake"
+
+    PREFIX_CACHE_SIZE = 10000
+
+    def __init__(self, model=DEFAULT_MODELS["fake"], first_token=0.3,
+                 tokens_per_second=20.0, jitter=0.2, answer_words=60,
+                 prefill_ms_per_token=0.0, **kwargs):
+        super().__init__(model, **kwargs)
+        self.first_token = first_token
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.answer_words = answer_words
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self._prefix_lock = threading.Lock()
+        self._prefixes = {}  # prefix hash -> None, oldest first
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _prefill(self, parts):
+        """Return (cached, total) prompt tokens, remembering every prefix."""
+        digest = hashlib.sha256()
+        cached = total = 0
+        hit = True
+        with self._prefix_lock:
+            for part in parts:
+                digest.update(part.encode("utf-8") + b"\0")
+                key = digest.hexdigest()
+                tokens = len(part.split())
+                total += tokens
+                hit = hit and key in self._prefixes
+                if hit:
+                    cached += tokens
+                self._prefixes.pop(key, None)
+                self._prefixes[key] = None
+            while len(self._prefixes) > self.PREFIX_CACHE_SIZE:
+                del self._prefixes[next(iter(self._prefixes))]
+        return cached, total
+
+    def _stream_once(self, system, messages, max_tokens, usage):
+        question = messages[-1]["content"] if messages else ""
+        context_lines = [line for line in question.splitlines() if ":" in line][-3:]
+        words = (f"(fake answer) You asked: {question.splitlines()[-1] if question else ''} "
+                 f"From the data: {' '.join(context_lines)}").split()
+        words = (words * (self.answer_words // max(len(words), 1) + 1))[:min(self.answer_words, max_tokens)]
+
+        cached, total = self._prefill([system] + [msg["content"] for msg in messages])
+        usage["prompt_tokens"] = total
+        usage["cached_prompt_tokens"] = cached
+        usage["uncached_prompt_tokens"] = total - cached
+        usage["output_tokens"] = len(words)
+
+        self._sleep(self.first_token + (total - cached) * self.prefill_ms_per_token / 1000)
+        for i, word in enumerate(words):
+            if i and self.tokens_per_second:
+                self._sleep(1.0 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "anthropic": AnthropicBackend,
+    "fake": FakeBackend,
+}
+
+
+def create_backend(name, **options):
+    """
+    Create a backend by name.
+
+    Args:
+        name: "ollama", "anthropic" or "fake"
+        **options: Passed to the backend class
+
+    Raises:
+        ValueError: For an unknown backend name
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {sorted(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+def backend_from_env(default_backend="ollama", default_model=None):
+    """
+    Create the backend selected by the LLM_* environment variables.
+
+    Args:
+        default_backend: Backend when LLM_BACKEND is not set
+        default_model: Model when LLM_MODEL is not set (and the backend is
+            the default one); otherwise the backend's usual model
+
+    Raises:
+        ValueError: For an unknown LLM_BACKEND
+    """
+    env = os.environ
+    name = env.get("LLM_BACKEND", default_backend)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {sorted(BACKENDS)}")
+    model = env.get("LLM_MODEL")
+    if model is None:
+        model = default_model if (default_model and name == default_backend) else DEFAULT_MODELS[name]
+
+    options = {
+        "model": model,
+        "max_retries": int(env.get("LLM_MAX_RETRIES", "2")),
+    }
+    if name in ("ollama", "anthropic"):
+        options["timeout"] = float(env.get("LLM_TIMEOUT", DEFAULT_TIMEOUTS[name]))
+        options["max_connections"] = int(env.get("LLM_MAX_CONNECTIONS", "10"))
+        options["keepalive"] = float(env.get("LLM_KEEPALIVE", "60"))
+    if name == "ollama":
+        options["host"] = env.get("OLLAMA_HOST")
+    if name == "fake":
+        options["first_token"] = float(env.get("FAKE_LLM_FIRST_TOKEN", "0.3"))
+        options["tokens_per_second"] = float(env.get("FAKE_LLM_TOKENS_PER_SECOND", "20"))
+        options["jitter"] = float(env.get("FAKE_LLM_JITTER", "0.2"))
+        options["prefill_ms_per_token"] = float(env.get("FAKE_LLM_PREFILL_MS_PER_TOKEN", "0"))
+    return create_backend(name, **options)
@@ -0,0 +1,312 @@
+"""
+Prebuilt menu index: build once offline, load instantly in every session.
+
+The Dairi-O menu PDF is the same for everybody, so instead of having each
+session upload it and click "Process Menu Data", build the index once:
+
+    python -m rag_core.menu_index dairi_o_nutrition.pdf --output dairio_chatbot/menu_index
+
+That runs extraction, chunking, embedding and the table parse, and writes a
+versioned directory:
+
+    manifest.json      format version, source PDF hash, model, counts
+    embeddings.npy     float32 matrix, one unit-length row per chunk
+    chunks.bin         all chunk texts, UTF-8, back to back
+    chunk_offsets.npy  int64 offsets: chunk i is chunks.bin[off[i]:off[i+1]]
+    metadata.json      one metadata dict per chunk: source, pages, table
+                       rows and items (rows also carry their nutrient
+                       numbers, for where filters)
+    tables.json        structured tables (page, headers, rows)
+
+The embeddings, offsets and text blob are memory-mapped read-only, never
+copied into Python objects. When several Streamlit server processes load the
+same index they all map the same files, so the OS page cache holds a single
+physical copy and each extra worker adds almost nothing to memory.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from rag_core.embeddings import DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKEND, load_embedding_model
+from rag_core.ingest import extract_pdf_content, chunk_documents, no_text_error, row_documents
+
+FORMAT_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.bin"
+CHUNK_OFFSETS_FILE = "chunk_offsets.npy"
+METADATA_FILE = "metadata.json"
+TABLES_FILE = "tables.json"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_texts(blob_path, offsets_path, texts):
+    """Write texts as one UTF-8 blob plus an int64 offsets array."""
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    with open(blob_path, "wb") as f:
+        for i, text in enumerate(texts):
+            encoded = text.encode("utf-8")
+            f.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(offsets_path, offsets)
+
+
+class MappedTexts:
+    """
+    Read-only list of strings backed by a memory-mapped UTF-8 blob.
+
+    Supports ``len()``, indexing (including slices) and iteration. Each
+    access decodes just the bytes of the requested chunk.
+    """
+
+    def __init__(self, blob_path, offsets_path):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        if os.path.getsize(blob_path):
+            self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def build_menu_index(pdf_path, output_dir, model_name=DEFAULT_EMBEDDING_MODEL,
+                     chunk_size=1000, overlap=100, batch_size=64):
+    """
+    Build a menu index directory from a nutrition PDF.
+
+    Besides the text chunks, every nutrition table row is indexed as a
+    document of its own (after the chunks), with its numbers as metadata.
+
+    The index is written to a temporary directory first and then moved into
+    place, so a running app never sees a half-written index.
+
+    Args:
+        pdf_path: The menu PDF
+        output_dir: Directory to create (replaced if it exists)
+        model_name: sentence-transformers model used for embeddings
+        chunk_size: Characters per chunk
+        overlap: Characters shared between neighbouring chunks
+        batch_size: Chunks encoded per model call
+
+    Returns:
+        dict: The manifest that was written
+    """
+    from rag_core.vector_store import normalize_rows
+
+    source = os.path.basename(pdf_path)
+    content = extract_pdf_content(pdf_path)
+    chunks, chunk_metadatas = chunk_documents(content, source, chunk_size=chunk_size,
+                                              overlap=overlap)
+    if not chunks:
+        raise no_text_error(content, pdf_path)
+
+    row_texts, row_metadatas = row_documents(content["tables"], source)
+    documents = chunks + row_texts
+    metadatas = chunk_metadatas + row_metadatas
+
+    model = load_embedding_model(model_name)
+    embeddings = normalize_rows(model.encode(documents, batch_size=batch_size))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": {"file": source, "sha256": _sha256(pdf_path)},
+        "embedding_model": model_name,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "embedding_dim": int(embeddings.shape[1]),
+        "embedding_dtype": "float32",
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "chunk_count": len(chunks),
+        "row_count": len(row_texts),
+        "table_count": len(content["tables"]),
+    }
+
+    staging_dir = output_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    np.save(os.path.join(staging_dir, EMBEDDINGS_FILE), embeddings.astype(np.float32))
+    write_texts(os.path.join(staging_dir, CHUNKS_FILE),
+                os.path.join(staging_dir, CHUNK_OFFSETS_FILE), documents)
+    _write_json(os.path.join(staging_dir, METADATA_FILE), metadatas)
+    _write_json(os.path.join(staging_dir, TABLES_FILE), content["tables"])
+    # The manifest goes last: a directory without one is not a valid index
+    _write_json(os.path.join(staging_dir, MANIFEST_FILE), manifest)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(staging_dir, output_dir)
+    return manifest
+
+
+class MenuIndex:
+    """
+    A loaded menu index.
+
+    Has the same ``query`` / ``count`` methods as a Chroma collection, so it
+    can back a ``KnowledgeBase`` directly.
+    """
+
+    def __init__(self, path, manifest, embeddings, chunks, metadatas, tables):
+        self.path = path
+        self.manifest = manifest
+        self.embeddings = embeddings
+        self.documents = chunks
+        self.metadatas = metadatas
+        self.tables = tables
+        self._columns = {}  # metadata fields as arrays, for where filters
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open an index directory written by ``build_menu_index``.
+
+        Raises:
+            FileNotFoundError: If the directory has no manifest
+            ValueError: If the index was built by an incompatible version
+        """
+        manifest = _read_json(os.path.join(path, MANIFEST_FILE))
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"{path} has index format {manifest.get('format_version')}, "
+                f"expected {FORMAT_VERSION}; rebuild it with python -m rag_core.menu_index"
+            )
+
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        chunks = MappedTexts(os.path.join(path, CHUNKS_FILE),
+                             os.path.join(path, CHUNK_OFFSETS_FILE))
+        metadatas = _read_json(os.path.join(path, METADATA_FILE))
+        tables = _read_json(os.path.join(path, TABLES_FILE))
+        return cls(path, manifest, embeddings, chunks, metadatas, tables)
+
+    @property
+    def embedding_model_name(self):
+        return self.manifest["embedding_model"]
+
+    @property
+    def embedding_backend(self):
+        """Backend the index was embedded with; queries must use the same one."""
+        return self.manifest.get("embedding_backend", "torch")
+
+    def count(self):
+        """Number of documents (chunks and table rows) in the index."""
+        return len(self.documents)
+
+    def document_id(self, i):
+        """
+        Id of document `i`, the same as an uploaded PDF's knowledge base
+        gives it (see ``rag_core.knowledge.index_documents``): the chunks
+        come first, then the table rows.
+        """
+        chunk_count = self.manifest["chunk_count"]
+        return f"chunk_{i}" if i < chunk_count else f"row_{i - chunk_count}"
+
+    def query(self, query_embeddings, n_results=5, where=None):
+        """
+        Chroma-style query over the prebuilt embeddings.
+
+        Args:
+            query_embeddings: List of query vectors
+            n_results: How many hits per query
+            where: Metadata filter (see ``rag_core.vector_store.where_mask``);
+                only the rows passing it are scored
+
+        Returns:
+            dict: "ids", "documents", "metadatas" and "distances" (cosine
+            distance), each a list with one inner list per query
+        """
+        from rag_core.vector_store import normalize_rows, where_mask
+
+        queries = normalize_rows(query_embeddings)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if where is None:
+            rows = np.arange(self.count())
+            scores = queries @ self.embeddings.T
+        else:
+            rows = np.flatnonzero(where_mask(self.metadatas, where, self._columns))
+            if 2 * len(rows) > self.count():
+                # Most rows pass: scoring all beats copying them out of the map
+                scores = (queries @ self.embeddings.T)[:, rows]
+            else:
+                scores = queries @ self.embeddings[rows].T
+        n_results = min(n_results, len(rows))
+        if n_results == 0:
+            for key in results:
+                results[key] = [[] for _ in queries]
+            return results
+
+        for row in scores:
+            top = np.argpartition(-row, n_results - 1)[:n_results]
+            top = top[np.argsort(-row[top])]
+            distances = [1.0 - float(row[i]) for i in top]
+            top = rows[top]
+            results["ids"].append([self.document_id(i) for i in top])
+            results["documents"].append([self.documents[i] for i in top])
+            results["metadatas"].append([self.metadatas[i] for i in top])
+            results["distances"].append(distances)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a prebuilt menu index from a nutrition PDF.")
+    parser.add_argument("pdf", help="Menu nutrition PDF")
+    parser.add_argument("--output", default="menu_index", help="Index directory to write")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    manifest = build_menu_index(
+        args.pdf, args.output,
+        model_name=args.model,
+        chunk_size=args.chunk_size,
+        overlap=args.overlap,
+        batch_size=args.batch_size,
+    )
+    print(f"✅ Wrote {args.output}: {manifest['chunk_count']} chunks, "
+          f"{manifest['table_count']} tables ({manifest['row_count']} menu rows), "
+          f"model {manifest['embedding_model']}")
+
+
+if __name__ == "__main__":
+    main()
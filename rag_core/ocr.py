@@ -0,0 +1,251 @@
+"""
+OCR for scanned PDF pages, cached on disk by page image.
+
+A scanned franchise menu has no text layer: ``page.extract_text()`` comes
+back empty and the PDF used to be indexed as nothing at all. ``PageOCR``
+reads those pages - and only those - with Tesseract:
+
+- the OCR text is stored in the cache directory under two keys: the
+  hash of the PDF file and page number, looked up first so a file seen
+  before is not even rendered again; and the hash of the rendered page
+  image (pypdfium2, which pdfplumber already uses), so the same page is
+  OCR'd at most once, whichever file, session or process it comes from;
+- pages not in the cache are OCR'd in a pool of worker threads.
+  Tesseract runs as a separate process per page, so they really do
+  run in parallel.
+
+OCR is optional. Without the ``pytesseract`` package and the ``tesseract``
+program, scanned pages are counted as skipped (see ``stats``) and the
+rest of the PDF is indexed as usual. A page that fails to render or to be
+read is skipped the same way, without stopping the other pages.
+
+Settings (environment variables):
+
+    RAG_OCR            0 to never OCR (default 1)
+    RAG_OCR_CACHE      cache directory (default ~/.cache/rag_core/ocr)
+    RAG_OCR_WORKERS    pages OCR'd at once (default: CPU count)
+    RAG_OCR_LANG       Tesseract language(s) (default eng)
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_core import tracing
+
+OCR_ENABLED = os.environ.get("RAG_OCR", "1") == "1"
+OCR_CACHE_DIR = os.environ.get(
+    "RAG_OCR_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "rag_core", "ocr")
+)
+OCR_WORKERS = int(os.environ.get("RAG_OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_LANG = os.environ.get("RAG_OCR_LANG", "eng")
+
+# Rendering resolution: Tesseract reads small table print best at ~300 dpi
+DEFAULT_DPI = 300
+
+
+def ocr_available():
+    """True if pytesseract and the tesseract program are installed."""
+    try:
+        import pytesseract  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which("tesseract") is not None
+
+
+def _read_pdf(pdf_file):
+    if hasattr(pdf_file, "read"):
+        pdf_file.seek(0)
+        return pdf_file.read()
+    with open(pdf_file, "rb") as f:
+        return f.read()
+
+
+class PageOCR:
+    """
+    Tesseract OCR of PDF pages with an on-disk cache.
+
+    Args:
+        cache_dir: Where OCR text is kept, one file per page image hash
+            (None: no cache)
+        workers: Pages OCR'd at once
+        lang: Tesseract language(s), e.g. "eng" or "eng+spa"
+        dpi: Resolution pages are rendered at
+    """
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, workers=OCR_WORKERS, lang=OCR_LANG,
+                 dpi=DEFAULT_DPI):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.lang = lang
+        self.dpi = dpi
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.cache_hits = 0
+        self.skipped = 0
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _cached(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remember(self, key, text):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def _key(self, data):
+        return hashlib.sha256(f"{self.lang}:{self.dpi}:".encode("utf-8") + data).hexdigest()
+
+    def _recognize(self, png):
+        import pytesseract
+        from PIL import Image
+
+        return pytesseract.image_to_string(Image.open(io.BytesIO(png)), lang=self.lang)
+
+    def _render(self, document, number):
+        bitmap = document[number - 1].render(scale=self.dpi / 72)
+        buffer = io.BytesIO()
+        bitmap.to_pil().convert("L").save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def _render_missing(self, data, file_digest, numbers, texts, failed):
+        """
+        Render pages not found by file, and look them up by page image.
+
+        Fills `texts` with the cached ones and `failed` with the pages that
+        could not be rendered. Returns the rest as (number, cache keys, png).
+        """
+        if not numbers:
+            return []
+        import pypdfium2
+
+        try:
+            document = pypdfium2.PdfDocument(data)
+        except Exception as exc:
+            failed.update((number, f"could not open the PDF: {exc}") for number in numbers)
+            return []
+        # pypdfium2 is not thread-safe, so pages are rendered here one at a
+        # time; only the OCR itself runs in the pool
+        todo = []
+        try:
+            for number in numbers:
+                page_key = self._key(f"{file_digest}:{number}".encode("utf-8"))
+                try:
+                    png = self._render(document, number)
+                except Exception as exc:
+                    failed[number] = f"could not render the page: {exc}"
+                    continue
+                image_key = self._key(png)
+                text = self._cached(image_key)
+                if text is not None:
+                    self._remember(page_key, text)  # next time, no rendering
+                    texts[number] = text
+                else:
+                    todo.append((number, (page_key, image_key), png))
+        finally:
+            document.close()
+        return todo
+
+    def ocr(self, pdf_file, page_numbers, errors=None):
+        """
+        Text of the given pages.
+
+        Args:
+            pdf_file: Path or file-like object (read again from the start)
+            page_numbers: 1-based numbers of the pages to read
+            errors: Optional dict, filled with page number -> error message
+                for the pages that could not be rendered or read
+
+        Returns:
+            dict: page number -> text; "" for a page that could not be
+            read, and empty if OCR is not installed
+        """
+        page_numbers = list(page_numbers)
+        if not page_numbers:
+            return {}
+        if not ocr_available():
+            with self._lock:
+                self.skipped += len(page_numbers)
+            return {}
+        failed = {}
+
+        with tracing.span("ocr", pages=len(page_numbers)) as span:
+            data = _read_pdf(pdf_file)
+            file_digest = hashlib.sha256(data).hexdigest()
+            texts, missing = {}, []
+            for number in page_numbers:
+                text = self._cached(self._key(f"{file_digest}:{number}".encode("utf-8")))
+                if text is not None:
+                    texts[number] = text
+                else:
+                    missing.append(number)
+
+            todo = self._render_missing(data, file_digest, missing, texts, failed)
+
+            cached = len(texts)
+
+            def recognize(page):
+                try:
+                    return self._recognize(page[2])
+                except Exception as exc:
+                    failed[page[0]] = f"OCR failed: {exc}"
+                    return None
+
+            if todo:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(todo))) as pool:
+                    for (number, keys, _), text in zip(todo, pool.map(recognize, todo)):
+                        if text is None:
+                            continue
+                        for key in keys:
+                            self._remember(key, text)
+                        texts[number] = text
+
+            for number in failed:
+                texts[number] = ""
+            with self._lock:
+                self.pages += len(page_numbers) - len(failed)
+                self.cache_hits += cached
+                self.skipped += len(failed)
+            if span is not None:
+                span.attributes.update(cached=cached, failed=len(failed),
+                                       recognized=len(page_numbers) - cached - len(failed))
+        if errors is not None:
+            errors.update(failed)
+        return texts
+
+    def stats(self):
+        """Pages OCR'd or read from the cache, and scanned pages skipped (no OCR, or it failed)."""
+        with self._lock:
+            return {"pages": self.pages, "cache_hits": self.cache_hits, "skipped": self.skipped}
+
+
+_default_lock = threading.Lock()
+_default = None
+
+
+def default_ocr():
+    """The process-wide ``PageOCR`` from the RAG_OCR_* settings, or None if RAG_OCR=0."""
+    global _default
+    if not OCR_ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = PageOCR()
+        return _default
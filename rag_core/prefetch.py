@@ -0,0 +1,273 @@
+"""
+Speculative prefetch of the retrieval for likely follow-up questions.
+
+After an answer about one menu item, the next question is nearly always
+about the same item in another size ("and the large?") or a comparison
+with a similar item. ``Prefetcher`` guesses those follow-ups once a turn
+has been answered and, in a background thread, runs their retrieval
+ahead of time:
+
+- the question embedding goes into the query cache (``encode_query``);
+- the retrieved context (vector search, numeric filters, cross-encoder
+  re-ranking - whose scores are cached too) is kept, per knowledge base.
+
+When the real follow-up comes, ``lookup`` hands back a prefetched context
+if one fits it: the question must name the same menu items and nutrients
+as a prefetched one and its embedding must be nearly the same, so "the
+medium cone" never gets the context fetched for "the large cone". The
+quick-question buttons are prefetched once per knowledge base, too.
+
+Answers themselves are not generated ahead of time: a speculative model
+call would take a scheduler slot away from a customer who is actually
+waiting. Prefetching is skipped while questions are queued for the model.
+"""
+
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_core.constraints import mentioned_nutrients, parse_constraints
+from rag_core.embeddings import encode_query
+from rag_core.ingest import item_name
+
+# Words that name a size or portion of an item rather than the item itself
+_SIZES = re.compile(
+    r"\b(?:small|medium|large|regular|mini|kids?|junior|jr|snack|single|double|triple|"
+    r"extra large|xl|\d+ ?(?:oz|pc|piece))\b"
+)
+
+# Follow-up phrasing; "{nutrient}" is the one just asked about, or calories
+_AMOUNT = "How much {nutrient} is in the {item}?"
+_CALORIES = "How many calories are in the {item}?"
+_COMPARE = "Compare the {item} vs. the {other}"
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _unit_vector(query, model_name, backend=None):
+    import numpy as np  # only once there is something to prefetch
+
+    vector = np.asarray(encode_query(query, model_name, backend), dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class _Item:
+    __slots__ = ("name", "key", "base", "table", "row")
+
+    def __init__(self, name, table, row):
+        self.name = name
+        self.key = _normalize(name)
+        self.base = " ".join(_SIZES.sub(" ", self.key).split())
+        self.table = table
+        self.row = row
+
+
+class Prefetcher:
+    """
+    Predicts follow-up questions and retrieves for them in the background.
+
+    Args:
+        quick_questions: Questions offered as buttons, prefetched once per
+            knowledge base
+        max_queries: Follow-ups prefetched after a turn
+        similarity: Least cosine similarity between a question and a
+            prefetched one for its context to be used
+        cache_size: Prefetched contexts kept per knowledge base
+    """
+
+    def __init__(self, quick_questions=(), max_queries=6, similarity=0.9, cache_size=64):
+        self.quick_questions = list(quick_questions)
+        self.max_queries = max_queries
+        self.similarity = similarity
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._items = weakref.WeakKeyDictionary()  # knowledge -> menu items
+        self._entries = weakref.WeakKeyDictionary()  # knowledge -> question -> entry
+        self._pending = weakref.WeakKeyDictionary()  # knowledge -> newest scheduled turn
+        self.scheduled = 0
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Predicting
+    # ------------------------------------------------------------------
+
+    def _menu_items(self, knowledge):
+        with self._lock:
+            items = self._items.get(knowledge)
+        if items is None:
+            items = []
+            for table_number, table in enumerate(knowledge.tables):
+                headers = table["headers"] or []
+                for row_index, row in enumerate(table["rows"]):
+                    name = item_name(headers, row) if row and any(row) else None
+                    if name and re.search(r"[a-z]", name.lower()):
+                        items.append(_Item(name, table_number, row_index))
+            items.sort(key=lambda item: -len(item.key))  # for ``_mentioned``
+            with self._lock:
+                self._items[knowledge] = items
+        return items
+
+    def _mentioned(self, knowledge, text):
+        """Menu items named in `text`, longest names first, none inside another."""
+        words = f" {_normalize(text)} "
+        found = []
+        for item in self._menu_items(knowledge):
+            if (f" {item.key} " in words or f" {item.key}s " in words) and not any(
+                    f" {item.key} " in f" {other.key} " for other in found):
+                found.append(item)
+        return found
+
+    def predict(self, knowledge, question, answer=""):
+        """
+        Likely next questions after `question` was answered with `answer`.
+
+        For the item asked about (else the first one the answer names):
+        the same nutrient for its other sizes, and comparisons with those
+        sizes and with similar items (same kind of item, nearby in the same
+        table).
+
+        Returns:
+            list: Up to ``max_queries`` questions
+        """
+        items = self._mentioned(knowledge, question) or self._mentioned(knowledge, answer)[:1]
+        if not items:
+            return []
+        nutrients = mentioned_nutrients(question.lower())
+        nutrient = nutrients[0].replace("_", " ") if nutrients else "calories"
+        template = _CALORIES if nutrient == "calories" else _AMOUNT
+
+        queries = []
+        menu = self._menu_items(knowledge)
+        for item in items[:2]:
+            sizes = [other for other in menu
+                     if other.base == item.base and other.key != item.key]
+            for other in sizes:
+                queries.append(template.format(nutrient=nutrient, item=other.name))
+            for other in sizes:
+                queries.append(_COMPARE.format(item=item.name, other=other.name))
+            # Same kind of item ("... Cone"), nearest rows of the same table first
+            kind = item.base.split()[-1] if item.base else None
+            similar = sorted(
+                (other for other in menu if other.base != item.base and kind
+                 and other.base.split()[-1:] == [kind]),
+                key=lambda other: (other.table != item.table, abs(other.row - item.row)),
+            )
+            for other in similar[:2]:
+                queries.append(_COMPARE.format(item=item.name, other=other.name))
+        if len(items) > 1:
+            queries.insert(0, _COMPARE.format(item=items[0].name, other=items[1].name))
+        return list(dict.fromkeys(queries))[:self.max_queries]
+
+    # ------------------------------------------------------------------
+    # Prefetching
+    # ------------------------------------------------------------------
+
+    def _signature(self, knowledge, question):
+        """What a context depends on besides wording: the items and nutrients named."""
+        return (frozenset(item.key for item in self._mentioned(knowledge, question)),
+                tuple(sorted(mentioned_nutrients(question.lower()))))
+
+    def schedule(self, knowledge, question, answer, retrieve):
+        """
+        Prefetch the follow-ups of a finished turn in the background.
+
+        Args:
+            knowledge: ``KnowledgeBase`` the session answers from
+            question, answer: The turn just finished
+            retrieve: ``retrieve(knowledge, question)`` -> context block
+        """
+        if knowledge is None:
+            return
+        turn = object()
+        with self._lock:
+            self._pending[knowledge] = turn
+            self.scheduled += 1
+        self._pool.submit(self._prefetch, knowledge, question, answer, retrieve, turn)
+
+    def _prefetch(self, knowledge, question, answer, retrieve, turn):
+        with self._lock:
+            first = knowledge not in self._entries
+        queries = self.predict(knowledge, question, answer)
+        if first:
+            queries += self.quick_questions
+        for query in queries:
+            with self._lock:
+                if self._pending.get(knowledge) is not turn:
+                    return  # a newer turn came in; its follow-ups matter now
+                entries = self._entries.setdefault(knowledge, OrderedDict())
+                if query in entries and entries[query]["count"] == knowledge.count():
+                    entries.move_to_end(query)
+                    continue
+            if parse_constraints(query):
+                continue  # numeric filters are cheap and exact; nothing to gain
+            entry = {
+                "vector": _unit_vector(query, knowledge.embedding_model_name,
+                                       knowledge.embedding_backend),
+                "signature": self._signature(knowledge, query),
+                "context": retrieve(knowledge, query),
+                "count": knowledge.count(),
+            }
+            with self._lock:
+                entries[query] = entry
+                entries.move_to_end(query)
+                while len(entries) > self.cache_size:
+                    entries.popitem(last=False)
+                self.prefetched += 1
+
+    def lookup(self, knowledge, question):
+        """
+        A prefetched context that fits `question`, or None.
+
+        Contexts fetched before the knowledge base grew (a menu still being
+        indexed) are not used, and neither are contexts for a question with
+        numeric conditions ("under 400 calories"): nothing is prefetched
+        for those, and an unfiltered context would leave out the rows that
+        meet them.
+        """
+        with self._lock:
+            entries = list(self._entries.get(knowledge, {}).items())
+        if not entries or parse_constraints(question):
+            return None
+        count = knowledge.count()
+        exact = dict(entries).get(question)
+        if exact is not None and exact["count"] == count:
+            with self._lock:
+                self.hits += 1
+            return exact["context"]
+
+        signature = self._signature(knowledge, question)
+        candidates = [entry for _, entry in entries
+                      if entry["signature"] == signature and entry["count"] == count]
+        best = None
+        if candidates:
+            vector = _unit_vector(question, knowledge.embedding_model_name,
+                                  knowledge.embedding_backend)
+            similarity, best = max(((float(entry["vector"] @ vector), entry)
+                                    for entry in candidates), key=lambda pair: pair[0])
+            if similarity < self.similarity:
+                best = None
+        with self._lock:
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best["context"] if best is not None else None
+
+    def stats(self):
+        """Turns scheduled, questions prefetched, and lookups that hit or missed."""
+        with self._lock:
+            looked_up = self.hits + self.misses
+            return {
+                "scheduled": self.scheduled,
+                "prefetched": self.prefetched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / looked_up if looked_up else 0.0,
+            }
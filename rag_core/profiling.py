@@ -0,0 +1,100 @@
+"""
+Startup profiling: how long each import takes and when the UI is ready.
+
+Turn it on with an environment variable:
+
+    RAG_PROFILE_STARTUP=1 streamlit run dairi_o_chatbot.py
+
+While enabled, every import that is not already loaded is timed. Only the
+outermost import is recorded, so each entry is the full (inclusive) cost of
+one ``import`` statement in our code, including everything it pulled in.
+Imports that happen after ``mark_interactive()`` are reported as "first use"
+- that is where deferred heavy libraries (torch, chromadb, ...) should show up.
+"""
+
+import builtins
+import os
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_local = threading.local()
+_original_import = None
+_started_at = None
+_interactive_at = None
+_records = []  # (module name, seconds, phase)
+
+
+def enabled():
+    """True when import profiling is running."""
+    return _original_import is not None
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules or getattr(_local, "depth", 0):
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _local.depth = 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.depth = 0
+        phase = "startup" if _interactive_at is None else "first use"
+        with _lock:
+            _records.append((name, elapsed, phase))
+
+
+def start():
+    """Start timing imports (safe to call on every Streamlit rerun)."""
+    global _original_import, _started_at
+    with _lock:
+        if _original_import is not None:
+            return
+        _original_import = builtins.__import__
+        _started_at = time.perf_counter()
+        builtins.__import__ = _timed_import
+
+
+def start_from_env(variable="RAG_PROFILE_STARTUP"):
+    """Start profiling if the environment variable is set to 1."""
+    if os.environ.get(variable) == "1":
+        start()
+
+
+def mark_interactive():
+    """Record that the first page has finished rendering."""
+    global _interactive_at
+    if not enabled() or _interactive_at is not None:
+        return
+    _interactive_at = time.perf_counter()
+    print(format_report(), file=sys.stderr)
+
+
+def format_report(limit=25):
+    """
+    Build a plain-text report of import costs.
+
+    Args:
+        limit: How many of the slowest imports to list
+
+    Returns:
+        str: The report
+    """
+    with _lock:
+        records = sorted(_records, key=lambda record: record[1], reverse=True)
+
+    lines = ["Startup profile"]
+    if _interactive_at is not None:
+        lines.append(f"  time to interactive: {1000 * (_interactive_at - _started_at):.0f} ms")
+    for phase in ("startup", "first use"):
+        rows = [record for record in records if record[2] == phase]
+        if not rows:
+            continue
+        total = sum(seconds for _, seconds, _ in rows)
+        lines.append(f"  {phase} imports ({1000 * total:.0f} ms total):")
+        for name, seconds, _ in rows[:limit]:
+            lines.append(f"    {1000 * seconds:8.1f} ms  {name}")
+    return "\n".join(lines)
@@ -0,0 +1,50 @@
+"""
+Prompt layout that keeps the start of every request identical.
+
+Model servers cache the work done on a prompt prefix (the KV cache in
+Ollama/llama.cpp, prompt caching in the Anthropic API). The cache only helps
+if the beginning of the next request is byte-for-byte the same. So requests
+are laid out from most stable to least stable:
+
+    1. static system prompt        - same for every turn and every user
+    2. conversation history        - only ever grows at the end
+    3. this turn's retrieved data  - changes every turn, so it goes last,
+       together with the question, in the final user message
+
+Retrieved context used to be appended to the system prompt, which changed
+the very first tokens of the prompt on every turn and defeated the cache.
+"""
+
+
+def conversation_history(messages, user_message):
+    """
+    Prior turns as plain role/content dicts.
+
+    The apps add the new question to the chat history before answering it,
+    so a trailing copy of `user_message` is left out (it is sent with the
+    context in ``build_turn_messages`` instead).
+    """
+    history = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+    if history and history[-1] == {"role": "user", "content": user_message}:
+        history.pop()
+    return history
+
+
+def build_turn_messages(history, user_message, context="", context_label="RELEVANT INFORMATION"):
+    """
+    Messages for one turn: the stable history, then context + question.
+
+    Args:
+        history: Prior turns (see ``conversation_history``)
+        user_message: This turn's question
+        context: Retrieved documents / search results for this turn
+        context_label: Heading placed above the context
+
+    Returns:
+        list: Role/content dicts, ending with the new user message
+    """
+    if context:
+        content = f"{context_label}:{context}\n\nQUESTION: {user_message}"
+    else:
+        content = user_message
+    return history + [{"role": "user", "content": content}]
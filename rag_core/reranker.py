@@ -0,0 +1,168 @@
+"""
+Cross-encoder re-ranking of retrieved chunks, within a latency budget.
+
+The bi-encoder (MiniLM) embeds the question and every chunk separately, so
+rows that read almost the same - "Small Vanilla Cone" next to "Medium
+Vanilla Cone" - get nearly the same score and the wrong one is often first.
+A cross-encoder reads the question and one chunk together and tells them
+apart much better, but it costs a model pass per (question, chunk) pair.
+
+So retrieval becomes two steps: fetch a wider candidate set cheaply with
+the vector index, then let ``CrossEncoderReranker`` re-score the top
+candidates in batches on the CPU and keep the best few. With a reliable
+first hit, fewer chunks need to go into the prompt.
+
+Two things keep it cheap:
+
+- a budget: candidates are scored in batches, best bi-encoder rank first,
+  and scoring stops before a batch would overrun ``budget_ms``. Candidates
+  that were not scored keep their vector-search order after the scored ones.
+- a score cache: (question, chunk) scores are kept in an LRU cache, so the
+  same quick question asked again costs nothing.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from rag_core import tracing
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+_lock = threading.Lock()
+_models = {}
+
+
+def load_cross_encoder(model_name=DEFAULT_CROSS_ENCODER):
+    """Return the shared cross-encoder for `model_name`, loading it on first use."""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _lock:
+        if model_name not in _models:
+            from sentence_transformers import CrossEncoder
+
+            _models[model_name] = CrossEncoder(model_name, device="cpu")
+        return _models[model_name]
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders retrieval hits by cross-encoder relevance.
+
+    Args:
+        model_name: sentence-transformers cross-encoder
+        candidates: How many vector-search hits to fetch for re-ranking
+        budget_ms: Most time to spend scoring per question
+        batch_size: Pairs per model call
+        cache_size: (question, chunk) scores to remember
+    """
+
+    def __init__(self, model_name=DEFAULT_CROSS_ENCODER, candidates=20, budget_ms=150.0,
+                 batch_size=16, cache_size=4096):
+        self.model_name = model_name
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._ms_per_pair = None  # running estimate, to see if a batch fits
+        self.scored = 0
+        self.cache_hits = 0
+        self.over_budget = 0
+
+    def warm_up(self):
+        """Load the model now rather than on the first question."""
+        load_cross_encoder(self.model_name).predict([("warm up", "warm up")])
+
+    @staticmethod
+    def _key(query, text):
+        return hashlib.blake2b(f"{query}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def _cached(self, key):
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _remember(self, key, score):
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _fits(self, spent_ms, pairs):
+        if spent_ms == 0 or self._ms_per_pair is None:
+            return True  # always score at least one batch
+        return spent_ms + pairs * self._ms_per_pair <= self.budget_ms
+
+    def rerank(self, query, hits, top_k):
+        """
+        The `top_k` most relevant of `hits`.
+
+        Args:
+            query: The question
+            hits: Vector-search hits, best first (dicts with a "text" key)
+            top_k: How many to return
+
+        Returns:
+            list: Hits, best first; scored ones carry a "rerank_score"
+        """
+        with tracing.span("rerank", candidates=len(hits)) as span:
+            keys = [self._key(query, hit["text"]) for hit in hits]
+            scores = [self._cached(key) for key in keys]
+            cached = sum(score is not None for score in scores)
+            todo = [i for i, score in enumerate(scores) if score is None]
+
+            model = load_cross_encoder(self.model_name)
+            started = time.perf_counter()
+            spent_ms = 0.0
+            scored = 0
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                if not self._fits(spent_ms, len(batch)):
+                    self.over_budget += 1
+                    break
+                batch_started = time.perf_counter()
+                predictions = model.predict([(query, hits[i]["text"]) for i in batch],
+                                            batch_size=self.batch_size)
+                batch_ms = (time.perf_counter() - batch_started) * 1000
+                per_pair = batch_ms / len(batch)
+                self._ms_per_pair = (per_pair if self._ms_per_pair is None
+                                     else 0.8 * self._ms_per_pair + 0.2 * per_pair)
+                for i, score in zip(batch, predictions):
+                    scores[i] = float(score)
+                    self._remember(keys[i], scores[i])
+                scored += len(batch)
+                spent_ms = (time.perf_counter() - started) * 1000
+
+            self.scored += scored
+            self.cache_hits += cached
+            if span is not None:
+                span.attributes.update(scored=scored, cached=cached,
+                                       unscored=len(hits) - scored - cached)
+
+        ranked = sorted((i for i, score in enumerate(scores) if score is not None),
+                        key=lambda i: -scores[i])
+        ranked += [i for i, score in enumerate(scores) if score is None]
+        results = []
+        for i in ranked[:top_k]:
+            hit = dict(hits[i])
+            if scores[i] is not None:
+                hit["rerank_score"] = scores[i]
+            results.append(hit)
+        return results
+
+    def stats(self):
+        """Pairs scored, cache hits and questions that ran out of budget."""
+        return {
+            "model": self.model_name,
+            "scored": self.scored,
+            "cache_hits": self.cache_hits,
+            "over_budget": self.over_budget,
+            "ms_per_pair": self._ms_per_pair,
+        }
@@ -0,0 +1,242 @@
+"""
+Bounded concurrency for LLM calls, with priorities and backpressure.
+
+Without a limit, a burst of sessions all hit the model server at once and
+everybody's answer gets slow together. ``LLMScheduler`` lets at most
+``max_concurrency`` calls run at the same time and queues the rest:
+
+- Fair: each session has its own queue and sessions take turns, so one
+  busy kiosk cannot push everybody else back.
+- Prioritized: short structured questions (and quick-question buttons) go
+  ahead of long free-form ones. Normal requests that have waited for half
+  the deadline are served as if they were high priority, so they never
+  starve.
+- Backpressure: if the estimated wait is already longer than the deadline,
+  the request is rejected right away with ``SchedulerBusy`` instead of
+  joining a queue it would time out in anyway.
+
+``metrics()`` exports queue depth, running calls and wait-time percentiles.
+
+Example:
+    scheduler = LLMScheduler(max_concurrency=2, max_queue_wait=30)
+    with scheduler.slot(session_id, classify_priority(question)):
+        response = chat(model="llama3.2", messages=messages)
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from rag_core.stats import percentile
+
+HIGH = 0
+NORMAL = 1
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal"}
+
+# Questions up to this many words count as short/structured
+SHORT_QUESTION_WORDS = 12
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request would wait longer than the queue deadline."""
+
+    def __init__(self, estimated_wait):
+        self.estimated_wait = estimated_wait
+        seconds = max(1, round(estimated_wait))
+        super().__init__(
+            "The assistant is busy right now - please try again in about "
+            f"{seconds} second{'s' if seconds != 1 else ''}."
+        )
+
+
+def classify_priority(question, quick_question=False):
+    """
+    Pick a priority for a question.
+
+    Args:
+        question: The user's question
+        quick_question: True for the pre-written sidebar questions
+
+    Returns:
+        int: HIGH for quick or short questions, NORMAL otherwise
+    """
+    if quick_question or len(question.split()) <= SHORT_QUESTION_WORDS:
+        return HIGH
+    return NORMAL
+
+
+class _Waiter:
+    __slots__ = ("session_id", "priority", "enqueued_at", "granted")
+
+    def __init__(self, session_id, priority):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+
+class LLMScheduler:
+    """
+    In-process scheduler limiting how many LLM calls run at once.
+
+    Args:
+        max_concurrency: Calls allowed to run at the same time
+        max_queue_wait: Longest a request may wait for a slot (seconds)
+        initial_service_time: Guess for how long one call takes, used for
+            wait estimates until real calls have been timed
+    """
+
+    def __init__(self, max_concurrency=2, max_queue_wait=30.0, initial_service_time=5.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue_wait = max_queue_wait
+        self._lock = threading.Lock()
+        self._queues = {HIGH: OrderedDict(), NORMAL: OrderedDict()}
+        self._running = 0
+        self._service_time = initial_service_time
+        self._wait_times = deque(maxlen=1000)
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    # ------------------------------------------------------------------
+    # Queue bookkeeping (call with self._lock held)
+    # ------------------------------------------------------------------
+
+    def _depth(self, priority=None):
+        priorities = self._queues if priority is None else [priority]
+        return sum(len(waiters) for p in priorities for waiters in self._queues[p].values())
+
+    def _estimated_wait(self, priority):
+        if self._running < self.max_concurrency and self._depth() == 0:
+            return 0.0
+        ahead = self._depth(HIGH) if priority == HIGH else self._depth()
+        return (ahead + 1) / self.max_concurrency * self._service_time
+
+    def _pop_from(self, priority):
+        queues = self._queues[priority]
+        session_id, waiters = next(iter(queues.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            queues.move_to_end(session_id)  # next session's turn
+        else:
+            del queues[session_id]
+        return waiter
+
+    def _oldest_waited(self, priority):
+        queues = self._queues[priority]
+        if not queues:
+            return 0.0
+        oldest = min(waiters[0].enqueued_at for waiters in queues.values())
+        return time.monotonic() - oldest
+
+    def _next_waiter(self):
+        if self._queues[NORMAL] and self._oldest_waited(NORMAL) > self.max_queue_wait / 2:
+            return self._pop_from(NORMAL)
+        for priority in (HIGH, NORMAL):
+            if self._queues[priority]:
+                return self._pop_from(priority)
+        return None
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._running += 1
+            waiter.granted.set()
+
+    def _remove(self, waiter):
+        waiters = self._queues[waiter.priority].get(waiter.session_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.priority][waiter.session_id]
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def acquire(self, session_id, priority=NORMAL):
+        """
+        Wait for a free slot.
+
+        Raises:
+            SchedulerBusy: If the estimated or actual wait exceeds the deadline
+        """
+        with self._lock:
+            if self._running < self.max_concurrency and self._depth() == 0:
+                self._running += 1
+                self._wait_times.append(0.0)
+                return
+
+            estimated = self._estimated_wait(priority)
+            if estimated > self.max_queue_wait:
+                self.rejected += 1
+                raise SchedulerBusy(estimated)
+
+            waiter = _Waiter(session_id, priority)
+            self._queues[priority].setdefault(session_id, deque()).append(waiter)
+
+        if not waiter.granted.wait(timeout=self.max_queue_wait):
+            with self._lock:
+                if not waiter.granted.is_set():
+                    self._remove(waiter)
+                    self.timed_out += 1
+                    raise SchedulerBusy(self._estimated_wait(priority))
+
+        with self._lock:
+            self._wait_times.append(time.monotonic() - waiter.enqueued_at)
+
+    def release(self, duration=None):
+        """Free a slot, updating the service-time estimate with `duration`."""
+        with self._lock:
+            if duration is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * duration
+            self.completed += 1
+            self._running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_id, priority=NORMAL):
+        """Context manager holding one slot for the duration of the block."""
+        self.acquire(session_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stream(self, session_id, priority, produce):
+        """
+        Run a streamed call inside a slot, holding it until the stream ends.
+
+        Args:
+            session_id: Session the request belongs to
+            priority: HIGH or NORMAL
+            produce: Function returning an iterator of text pieces
+
+        Yields:
+            str: The text pieces
+        """
+        with self.slot(session_id, priority):
+            yield from produce()
+
+    def metrics(self):
+        """Current load: running calls, queue depth and wait times (seconds)."""
+        with self._lock:
+            waits = list(self._wait_times)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queue_depth": self._depth(),
+                "queue_depth_by_priority": {
+                    PRIORITY_NAMES[p]: self._depth(p) for p in self._queues
+                },
+                "wait_p50": percentile(waits, 0.50),
+                "wait_p95": percentile(waits, 0.95),
+                "service_time_avg": self._service_time,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
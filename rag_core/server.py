@@ -0,0 +1,384 @@
+"""
+HTTP/JSON API for the Dairi-O assistant (ordering app, menu boards, ...).
+
+Same pipeline as the Streamlit app - ``rag_core.dairio.create_assistant()``
+- behind an async Starlette app served by uvicorn:
+
+    GET  /health             liveness check
+    GET  /metrics            scheduler load, shared answers, LLM usage, sessions
+    POST /chat               {"message", "session_id"?, "quick_question"?, "stream"?}
+                             streams Server-Sent Events by default, or returns
+                             {"session_id", "answer"} with "stream": false
+    POST /menu/search        {"query", "n_results"?, "session_id"?}
+                             the best-matching chunks with ids, metadata, distance
+                             and a citation (file, page, table row)
+    GET  /menu/items?q=...   structured table rows (one dict per menu item);
+                             also takes "limit" and "session_id"
+    POST /ingest?source=...  a PDF (raw body or multipart "file" field); replies
+                             with a new session that answers from it
+
+Chat SSE stream:
+
+    event: session   data: {"session_id": "..."}
+    (message)        data: {"text": "..."}          one per streamed piece
+    event: done      data: {"answer": "..."}
+    event: error     data: {"error": "...", "message": "..."}
+
+A busy model server is reported before the stream starts, as HTTP 503
+with a Retry-After header; any other failure before the first piece as a
+JSON error (502). Either way the question is not added to the session.
+
+Each worker process keeps its most recent sessions in memory
+(``DAIRIO_API_MAX_SESSIONS``, default 1000). Conversations are also saved
+in the conversation database (``DAIRIO_CONVERSATION_DB``), which all
+workers share, so a session evicted from memory or first seen by another
+worker is read back from there. Without the database, put the server
+behind a load balancer with session affinity - or send the conversation so
+far as "history" with every /chat request.
+
+A menu uploaded with /ingest is only held in the memory of the worker that
+indexed it, for as long as that worker keeps its session: uploads need
+single-worker affinity. Once the session has been evicted or has gone idle,
+requests for it get HTTP 410 ("menu_gone") instead of quietly being
+answered from the prebuilt menu; upload the PDF again. A worker only knows
+about its own uploads, so behind a load balancer without session affinity
+use ``--workers 1``.
+
+Run it (LLM_BACKEND=fake needs no model server):
+
+    python -m rag_core.server --port 8000 --workers 4
+    curl -N localhost:8000/chat -d '{"message": "Highest protein item?"}'
+"""
+
+import argparse
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from rag_core import dairio
+from rag_core.assistant import ChatSession
+from rag_core.scheduler import SchedulerBusy
+
+MAX_SESSIONS = int(os.environ.get("DAIRIO_API_MAX_SESSIONS", "1000"))
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+
+class SessionStore:
+    """
+    The most recently used sessions of this worker, by id.
+
+    Also remembers which session ids were started by /ingest (many more of
+    them than sessions: only the ids), so that a request for one whose
+    uploaded menu is gone can be told apart from a new session.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._uploaded = OrderedDict()  # session id -> None, oldest first
+
+    def get(self, session_id=None):
+        """The session for `session_id` (read back if saved), or a new one."""
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None or session.idle:
+                # An idle session has been released: start it again from
+                # the saved conversation and the prebuilt menu
+                session = dairio.new_session(session_id)
+            self._put(session)
+            return session
+
+    def find(self, session_id):
+        """The live session for `session_id`, or None (never creates one)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session if session is not None and not session.idle else None
+
+    def menu_gone(self, session_id):
+        """True if `session_id` was started by /ingest and its menu is no longer held."""
+        if not session_id:
+            return False
+        with self._lock:
+            if session_id not in self._uploaded:
+                return False
+            session = self._sessions.get(session_id)
+            return session is None or session.idle or session.knowledge is None
+
+    def add(self, session, uploaded=False):
+        with self._lock:
+            self._put(session)
+            if uploaded:
+                self._uploaded[session.session_id] = None
+                self._uploaded.move_to_end(session.session_id)
+                while len(self._uploaded) > 10 * self.max_sessions:
+                    self._uploaded.popitem(last=False)
+
+    def _put(self, session):
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def _error(status, error, message, headers=None):
+    return JSONResponse({"error": error, "message": message}, status_code=status,
+                        headers=headers)
+
+
+def _busy(busy):
+    retry_after = str(max(1, round(busy.estimated_wait)))
+    return _error(503, "busy", str(busy), headers={"Retry-After": retry_after})
+
+
+def _menu_gone():
+    return _error(410, "menu_gone", "The menu uploaded for this session is no longer loaded "
+                                    "on this server; upload the PDF again.")
+
+
+def _bounded_int(value, default, maximum):
+    """
+    `value` as a whole number clamped to 1..`maximum` (`default` if missing).
+
+    Returns None if `value` is not a number, for a 400 reply.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return max(1, min(number, maximum))
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _valid_history(history):
+    return isinstance(history, list) and all(
+        isinstance(msg, dict) and msg.get("role") in ("user", "assistant")
+        and isinstance(msg.get("content"), str)
+        for msg in history
+    )
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def create_app(assistant=None):
+    """
+    Build the ASGI app.
+
+    Args:
+        assistant: ``Assistant`` to serve (default: ``dairio.create_assistant()``)
+    """
+    assistant = assistant or dairio.create_assistant()
+    sessions = SessionStore()
+
+    async def health(request):
+        return JSONResponse({"status": "ok"})
+
+    async def metrics(request):
+        data = assistant.metrics()
+        data["sessions"]["stored"] = len(sessions)
+        return JSONResponse(data)
+
+    def _session_knowledge(session_id):
+        """(knowledge, None) for the session's menu or the prebuilt one, or (None, error)."""
+        if session_id:
+            if sessions.menu_gone(session_id):
+                return None, _menu_gone()
+            session = sessions.find(session_id)
+            if session is None:
+                return None, _error(404, "no_session", f"No session {session_id!r} on this server.")
+            knowledge = session.knowledge
+        else:
+            knowledge = dairio.load_menu_knowledge()
+        if knowledge is None:
+            return None, _error(404, "no_menu",
+                                "No menu loaded: build the menu index or POST /ingest.")
+        return knowledge, None
+
+    async def chat(request):
+        body = await _json_body(request)
+        message = (body or {}).get("message")
+        if not isinstance(message, str) or not message.strip():
+            return _error(400, "bad_request", 'Send JSON with a non-empty "message".')
+
+        if "history" in body:
+            # Stateless use: the client sends the conversation so far
+            history = body["history"]
+            if not _valid_history(history):
+                return _error(400, "bad_request",
+                              '"history" must be a list of {"role", "content"} messages.')
+            session = ChatSession(messages=history, session_id=body.get("session_id"),
+                                  knowledge=dairio.load_menu_knowledge())
+        else:
+            if sessions.menu_gone(body.get("session_id")):
+                return _menu_gone()
+            session = sessions.get(body.get("session_id"))
+        session.messages.append({"role": "user", "content": message})
+
+        # Retrieval and waiting for the first piece are blocking work; a
+        # question that fails before any answer is taken back out of the history
+        try:
+            pieces = await run_in_threadpool(
+                assistant.chat, session, message, bool(body.get("quick_question"))
+            )
+            first = await run_in_threadpool(next, pieces, None)
+        except SchedulerBusy as busy:
+            session.messages.pop()
+            return _busy(busy)
+        except Exception as exc:
+            session.messages.pop()
+            return _error(502, "failed", str(exc))
+
+        if not body.get("stream", True):
+            try:
+                rest = await run_in_threadpool(lambda: "".join(pieces))
+            except Exception as exc:
+                session.messages.pop()
+                return _error(502, "failed", str(exc))
+            answer = (first or "") + rest
+            session.messages.append({"role": "assistant", "content": answer})
+            return JSONResponse({"session_id": session.session_id, "answer": answer})
+
+        async def events():
+            yield _sse({"session_id": session.session_id}, event="session")
+            answer = []
+            try:
+                if first is not None:
+                    answer.append(first)
+                    yield _sse({"text": first})
+                async for piece in iterate_in_threadpool(pieces):
+                    answer.append(piece)
+                    yield _sse({"text": piece})
+            except SchedulerBusy as busy:
+                yield _sse({"error": "busy", "message": str(busy)}, event="error")
+                return
+            except Exception as exc:
+                yield _sse({"error": "failed", "message": str(exc)}, event="error")
+                return
+            text = "".join(answer)
+            session.messages.append({"role": "assistant", "content": text})
+            yield _sse({"answer": text}, event="done")
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+
+    async def menu_search(request):
+        body = await _json_body(request)
+        query = (body or {}).get("query")
+        if not isinstance(query, str) or not query.strip():
+            return _error(400, "bad_request", 'Send JSON with a non-empty "query".')
+        n_results = _bounded_int(body.get("n_results"), 5, 50)
+        if n_results is None:
+            return _error(400, "bad_request", '"n_results" must be a whole number.')
+        knowledge, error = _session_knowledge(body.get("session_id"))
+        if error is not None:
+            return error
+        hits = await run_in_threadpool(knowledge.hits, query, n_results)
+        return JSONResponse({"source": knowledge.source, "results": hits})
+
+    async def menu_items(request):
+        limit = _bounded_int(request.query_params.get("limit"), 50, 500)
+        if limit is None:
+            return _error(400, "bad_request", '"limit" must be a whole number.')
+        knowledge, error = _session_knowledge(request.query_params.get("session_id"))
+        if error is not None:
+            return error
+        items = knowledge.menu_items(request.query_params.get("q"), limit=limit)
+        return JSONResponse({"source": knowledge.source, "items": items})
+
+    async def ingest(request):
+        content_type = request.headers.get("content-type", "")
+        source = request.query_params.get("source", "upload.pdf")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                return _error(400, "bad_request", 'Send the PDF in a "file" form field.')
+            data = await upload.read()
+            source = upload.filename or source
+        else:
+            data = await request.body()
+        if not data:
+            return _error(400, "bad_request", "Send a PDF as the request body.")
+        if len(data) > MAX_UPLOAD_BYTES:
+            return _error(413, "too_large", "The PDF is larger than 50 MB.")
+        if b"%PDF-" not in data[:1024]:
+            return _error(415, "not_a_pdf", "The upload is not a PDF file.")
+
+        try:
+            knowledge = await run_in_threadpool(
+                dairio.ingest_menu_pdf, assistant, io.BytesIO(data), source
+            )
+        except ValueError as exc:
+            return _error(422, "unreadable", str(exc))
+
+        session = ChatSession(session_id=request.query_params.get("session_id"),
+                              knowledge=knowledge,
+                              messages=[{"role": "assistant", "content": dairio.WELCOME_MESSAGE}])
+        sessions.add(session, uploaded=True)
+        return JSONResponse({
+            "session_id": session.session_id,
+            "source": knowledge.source,
+            "chunks": knowledge.count(),
+            "tables": len(knowledge.tables),
+        })
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Open the prebuilt menu index before the first request needs it
+        await run_in_threadpool(dairio.load_menu_knowledge)
+        yield
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/metrics", metrics),
+            Route("/chat", chat, methods=["POST"]),
+            Route("/menu/search", menu_search, methods=["POST"]),
+            Route("/menu/items", menu_items),
+            Route("/ingest", ingest, methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Dairi-O assistant over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes (each has its own sessions and LLM queue)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run("rag_core.server:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Compact, bounded per-session state.
+
+A kiosk session used to keep its chat as an ever-growing list of dicts and
+hold on to everything it had loaded for as long as the browser tab stayed
+open - which for a kiosk is forever. This module keeps that in check:
+
+- ``Message``: one chat message as a slotted record (no per-message dict).
+  It still supports ``message["role"]`` / ``message["content"]``, so code
+  written for role/content dicts keeps working.
+- ``MessageHistory``: the chat history with a byte budget. Once the
+  messages take more than `max_bytes`, the oldest ones are dropped.
+- ``SessionRegistry``: every ``ChatSession`` of the process, weakly held.
+  Sessions that have been idle for `idle_seconds` are swept (their history
+  and loaded documents released), and their memory is reported as metrics.
+
+Large objects are not copied into sessions: embedding models are shared per
+process (``rag_core.embeddings``) and uploaded PDFs are indexed once and
+shared by every session that uploads the same file (``Assistant.ingest_pdf``).
+"""
+
+import os
+import sys
+import threading
+import time
+import weakref
+
+# Chat history kept per session before the oldest messages are dropped
+DEFAULT_HISTORY_BYTES = int(os.environ.get("RAG_SESSION_HISTORY_KB", "256")) * 1024
+
+# Sessions untouched for this long have their state released
+DEFAULT_IDLE_SECONDS = float(os.environ.get("RAG_SESSION_IDLE_SECONDS", "1800"))
+
+
+class Message:
+    """One chat message (`seq` is its number in a ``ConversationStore``, if saved)."""
+
+    __slots__ = ("role", "content", "seq")
+
+    def __init__(self, role, content, seq=None):
+        self.role = role
+        self.content = content
+        self.seq = seq
+
+    @classmethod
+    def coerce(cls, message):
+        """`message` as a ``Message`` (role/content dicts are converted)."""
+        if isinstance(message, cls):
+            return message
+        return cls(message["role"], message["content"])
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    @property
+    def nbytes(self):
+        """Memory held by this message (the record plus its text)."""
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+class MessageHistory:
+    """
+    Chat messages, oldest first, within a byte budget.
+
+    Behaves like a list of messages for the things the apps do with one
+    (append, pop, len, iterate, index, slice). Appending past the budget
+    drops the oldest messages; the last message is always kept.
+
+    Args:
+        messages: Initial messages (``Message`` objects or role/content dicts)
+        max_bytes: Budget for all messages together (see ``Message.nbytes``)
+    """
+
+    def __init__(self, messages=(), max_bytes=DEFAULT_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        self._messages = []
+        self.nbytes = 0
+        self.dropped = 0  # messages dropped from the front so far
+        self.extend(messages)
+
+    def append(self, message):
+        message = Message.coerce(message)
+        self._messages.append(message)
+        self.nbytes += message.nbytes
+        self._trim()
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def pop(self, index=-1):
+        message = self._messages.pop(index)
+        self.nbytes -= message.nbytes
+        return message
+
+    def clear(self):
+        self._messages.clear()
+        self.nbytes = 0
+
+    def _trim(self):
+        over = self.nbytes - self.max_bytes
+        if over <= 0:
+            return
+        count = 0
+        while over > 0 and count < len(self._messages) - 1:
+            over -= self._messages[count].nbytes
+            count += 1
+        for message in self._messages[:count]:
+            self.nbytes -= message.nbytes
+        del self._messages[:count]
+        self.dropped += count
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __repr__(self):
+        return f"MessageHistory({len(self)} messages, {self.nbytes} bytes)"
+
+
+class SessionRegistry:
+    """
+    The live sessions of this process.
+
+    Sessions are held weakly, so a session the app has let go of simply
+    disappears. ``touch`` marks a session as active; idle ones are swept by
+    the next ``touch`` or ``stats`` call after `sweep_interval` seconds.
+
+    Args:
+        idle_seconds: Inactivity after which a session is released
+        on_idle: Function called with each idle session (default:
+            ``session.release()``)
+        sweep_interval: Least time between two sweeps (seconds)
+    """
+
+    def __init__(self, idle_seconds=DEFAULT_IDLE_SECONDS, on_idle=None, sweep_interval=60.0):
+        self.idle_seconds = idle_seconds
+        self.on_idle = on_idle or (lambda session: session.release())
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sessions = weakref.WeakSet()
+        self._last_sweep = time.monotonic()
+        self.released = 0
+
+    def touch(self, session):
+        """Record activity on `session` (registering it if it is new)."""
+        session.last_active = time.monotonic()
+        session.idle = False
+        with self._lock:
+            self._sessions.add(session)
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def sweep(self, now=None):
+        """Release every session idle for longer than `idle_seconds`."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            idle = [
+                session for session in self._sessions
+                if not session.idle and now - session.last_active >= self.idle_seconds
+            ]
+        for session in idle:
+            self.on_idle(session)
+            session.idle = True
+        with self._lock:
+            self.released += len(idle)
+        return len(idle)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Session count and memory: per-session history plus shared documents."""
+        self._maybe_sweep()
+        with self._lock:
+            sessions = list(self._sessions)
+        history = [session.history_bytes() for session in sessions]
+        knowledge = {id(s.knowledge): s.knowledge for s in sessions if s.knowledge is not None}
+        knowledge_bytes = sum(
+            kb.memory_bytes() for kb in knowledge.values() if hasattr(kb, "memory_bytes")
+        )
+        total = sum(history) + knowledge_bytes
+        return {
+            "sessions": len(sessions),
+            "idle": sum(1 for session in sessions if session.idle),
+            "released": self.released,
+            "history_bytes": sum(history),
+            "history_bytes_max": max(history, default=0),
+            "knowledge_bases": len(knowledge),
+            "knowledge_bytes": knowledge_bytes,
+            "bytes_per_session": total / len(sessions) if sessions else 0.0,
+        }
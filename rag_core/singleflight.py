@@ -0,0 +1,134 @@
+"""
+Single-flight request coalescing for streamed LLM calls.
+
+At lunch rush many kiosks ask the same quick question within a second. With
+``SingleFlight``, the first request for a given key starts the generation;
+every identical request that arrives while it is still running joins it
+instead of starting another. All of them receive the full streamed answer,
+from the first token, while the model only generates it once.
+
+This is not a cache: once a generation finishes, the next identical request
+starts a new one.
+
+Example:
+    flights = SingleFlight()
+    key = request_key("llama3.2", messages)
+    for piece in flights.stream(key, lambda: stream_ollama(messages)):
+        print(piece, end="")
+"""
+
+import hashlib
+import json
+import threading
+
+
+def request_key(model, messages):
+    """Stable key for a (model, full prompt) pair."""
+    payload = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One in-progress generation and everything it has produced so far."""
+
+    def __init__(self):
+        self.pieces = []
+        self.finished = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def publish(self, piece):
+        with self.condition:
+            self.pieces.append(piece)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.finished = True
+            self.error = error
+            self.condition.notify_all()
+
+    def follow(self):
+        """Yield every piece (already produced ones first), then stop."""
+        position = 0
+        while True:
+            with self.condition:
+                while position == len(self.pieces) and not self.finished:
+                    self.condition.wait()
+                new_pieces = self.pieces[position:]
+                finished, error = self.finished, self.error
+            position += len(new_pieces)
+
+            yield from new_pieces
+            if finished and position == len(self.pieces):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    Share one in-flight streamed call between concurrent identical requests.
+
+    The underlying generation runs in its own background thread, so a caller
+    that stops reading early (e.g. a closed browser tab) does not stall the
+    other callers waiting on the same answer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def stream(self, key, produce):
+        """
+        Stream the result for `key`, joining an in-flight call if there is one.
+
+        Args:
+            key: Identifies identical requests (see ``request_key``)
+            produce: Function returning an iterator of text pieces; only
+                called when no identical request is already running
+
+        Returns:
+            iterator: The text pieces of the (shared) result. Nothing
+            happens until it is first read: that is when the in-flight call
+            is joined or a new one started, so an iterator that is dropped
+            unread never costs a model call.
+        """
+        return self._join(key, produce)
+
+    def _join(self, key, produce):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.started += 1
+                threading.Thread(
+                    target=self._run, args=(key, flight, produce), daemon=True
+                ).start()
+            else:
+                self.coalesced += 1
+        yield from flight.follow()
+
+    def _run(self, key, flight, produce):
+        error = None
+        try:
+            for piece in produce():
+                flight.publish(piece)
+        except Exception as exc:
+            error = exc
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish(error)
+
+    def stats(self):
+        """Counters: generations started, requests coalesced, in flight now."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,11 @@
+"""
+Small statistics helpers shared by the scheduler, tracing and the benchmarks.
+"""
+
+
+def percentile(values, fraction):
+    """Simple nearest-rank percentile (0.0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
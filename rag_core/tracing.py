@@ -0,0 +1,355 @@
+"""
+Per-turn latency tracing: where does a slow answer spend its time?
+
+Each chat turn (or PDF ingestion) is one *turn*; the stages inside it
+(extraction, chunking, embedding, vector query, web search, LLM call) are
+*spans*. Finished turns are
+
+- kept in memory (the last ``keep_turns``) for the in-app debug panel,
+- appended to a JSON-lines file if ``RAG_TRACE_FILE`` is set, one turn per
+  line,
+- sent to an OpenTelemetry collector if ``RAG_TRACE_OTLP`` is set to its
+  OTLP/HTTP traces URL, e.g. ``http://localhost:4318/v1/traces`` (plain
+  JSON over HTTP, so no OpenTelemetry packages are needed).
+
+Spans are cheap (two clock reads and a list append), and ``span()`` does
+nothing outside a turn, so library code can be instrumented unconditionally.
+
+Example:
+    tracer = tracer_from_env()
+    with tracer.turn("chat", session=session_id):
+        with span("retrieve"):
+            context = search_documents(question)
+        answer = "".join(traced_stream("llm", backend.stream(system, messages)))
+"""
+
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+from rag_core.stats import percentile
+
+_current_turn = contextvars.ContextVar("rag_current_turn", default=None)
+
+
+class Span:
+    """One timed stage. ``attributes`` can be added to while it is open."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes")
+
+    def __init__(self, name, parent_id=None, attributes=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes or {})
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.time()
+        return 1000 * (end - self.start)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Turn:
+    """One traced request: a root span plus the stage spans inside it."""
+
+    def __init__(self, tracer, name, attributes=None):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(name, attributes=attributes)
+        self.spans = []
+        self._open = [self.root]
+        self._token = None
+        self._pending_streams = 0
+        self._exited = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time one stage of this turn."""
+        stage = Span(name, parent_id=self._open[-1].span_id, attributes=attributes)
+        self._open.append(stage)
+        try:
+            yield stage
+        except Exception as exc:
+            stage.attributes["error"] = type(exc).__name__
+            raise
+        finally:
+            stage.end = time.time()
+            self._open.remove(stage)
+            self.spans.append(stage)
+
+    def stream(self, name, pieces, **attributes):
+        """
+        Time a streamed stage, e.g. the LLM answer.
+
+        The span (and the turn, if it has already been left) ends when the
+        stream is used up, so it covers the whole answer, not just the call
+        that started it. Records ``first_token_ms`` as an attribute. A
+        stream that is dropped without ever being read lets the turn end
+        too, when it is garbage collected.
+        """
+        with self._lock:
+            self._pending_streams += 1
+        stage = Span(name, parent_id=self.root.span_id, attributes=attributes)
+        settled = []  # non-empty once the stream has ended or been dropped
+        follow = self._follow(stage, pieces, settled)
+        # A generator that never started does not run its ``finally``
+        weakref.finalize(follow, self._stream_done, settled)
+        return follow
+
+    def _follow(self, stage, pieces, settled):
+        try:
+            for piece in pieces:
+                if "first_token_ms" not in stage.attributes:
+                    stage.attributes["first_token_ms"] = round(stage.duration_ms, 3)
+                yield piece
+        except Exception as exc:
+            stage.attributes["error"] = type(exc).__name__
+            raise
+        finally:
+            stage.end = time.time()
+            self.spans.append(stage)
+            self._stream_done(settled)
+
+    def _stream_done(self, settled):
+        with self._lock:
+            if settled:
+                return
+            settled.append(True)
+            self._pending_streams -= 1
+            done = self._exited and self._pending_streams == 0
+        if done:
+            self._finish()
+
+    def stage_durations(self):
+        """Total milliseconds per stage name (top-level stages only)."""
+        totals = {}
+        for stage in self.spans:
+            if stage.parent_id == self.root.span_id:
+                totals[stage.name] = totals.get(stage.name, 0.0) + stage.duration_ms
+        return totals
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "turn": self.root.name,
+            "start": self.root.start,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "attributes": self.root.attributes,
+            "stages": {name: round(ms, 3) for name, ms in self.stage_durations().items()},
+            "spans": [stage.to_dict() for stage in self.spans],
+        }
+
+    def _exit(self):
+        with self._lock:
+            self._exited = True
+            done = self._pending_streams == 0
+        if done:
+            self._finish()
+
+    def _finish(self):
+        self.root.end = time.time()
+        self.tracer._record(self)
+
+
+class Tracer:
+    """
+    Collects finished turns and hands them to the configured exporters.
+
+    Args:
+        jsonl_path: Append each finished turn to this file as one JSON line
+        otlp_endpoint: OTLP/HTTP JSON traces URL of a local collector
+        keep_turns: How many recent turns to keep in memory
+        service_name: ``service.name`` reported to the collector
+    """
+
+    def __init__(self, jsonl_path=None, otlp_endpoint=None, keep_turns=50,
+                 service_name="dairio-chatbot"):
+        self.jsonl_path = jsonl_path
+        self.otlp_endpoint = otlp_endpoint
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._turns = deque(maxlen=keep_turns)
+        self._export_queue = None
+        if otlp_endpoint:
+            self._export_queue = queue.Queue(maxsize=1000)
+            threading.Thread(target=self._export_loop, daemon=True).start()
+
+    @contextmanager
+    def turn(self, name, **attributes):
+        """
+        Trace one request. Spans opened inside the block (via ``span()``)
+        belong to it.
+
+        If the block hands out a stream from ``traced_stream()``, the turn
+        is recorded once that stream has been used up.
+        """
+        current = Turn(self, name, attributes)
+        current._token = _current_turn.set(current)
+        try:
+            yield current
+        except Exception as exc:
+            current.root.attributes["error"] = type(exc).__name__
+            raise
+        finally:
+            _current_turn.reset(current._token)
+            current._exit()
+
+    def _record(self, current):
+        record = current.to_dict()
+        with self._lock:
+            self._turns.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._export_queue is not None:
+            try:
+                self._export_queue.put_nowait(current)
+            except queue.Full:
+                # Never slow a request down because the collector is slow
+                # or down; the turn is dropped from the export
+                pass
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def recent_turns(self, limit=None, name=None):
+        """The most recent finished turns, newest first, as dicts."""
+        with self._lock:
+            turns = [t for t in reversed(self._turns) if name is None or t["turn"] == name]
+        return turns[:limit] if limit else turns
+
+    def stage_percentiles(self, name=None):
+        """
+        p50/p95 milliseconds per stage over the turns kept in memory.
+
+        Returns:
+            dict: stage -> {"count", "p50_ms", "p95_ms"}; the whole turn is
+            reported under "total"
+        """
+        samples = {}
+        for record in self.recent_turns(name=name):
+            for stage, ms in record["stages"].items():
+                samples.setdefault(stage, []).append(ms)
+            samples.setdefault("total", []).append(record["duration_ms"])
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+            }
+            for stage, values in samples.items()
+        }
+
+    # ------------------------------------------------------------------
+    # OTLP export
+    # ------------------------------------------------------------------
+
+    def _export_loop(self):
+        import urllib.request
+
+        while True:
+            batch = [self._export_queue.get()]
+            while len(batch) < 50:
+                try:
+                    batch.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            body = json.dumps(self._otlp_payload(batch)).encode("utf-8")
+            request = urllib.request.Request(
+                self.otlp_endpoint, data=body, headers={"Content-Type": "application/json"}
+            )
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception:
+                pass  # tracing is best effort; the collector may be down
+
+    def _otlp_payload(self, turns):
+        spans = []
+        for current in turns:
+            for stage in [current.root] + current.spans:
+                spans.append({
+                    "traceId": current.trace_id,
+                    "spanId": stage.span_id,
+                    "parentSpanId": stage.parent_id or "",
+                    "name": stage.name,
+                    "kind": 1,  # internal
+                    "startTimeUnixNano": str(int(stage.start * 1e9)),
+                    "endTimeUnixNano": str(int(stage.end * 1e9)),
+                    "attributes": [_otlp_attribute(k, v) for k, v in stage.attributes.items()],
+                })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "rag_core.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+# ----------------------------------------------------------------------
+# Module-level helpers for instrumenting code that has no tracer handy
+# ----------------------------------------------------------------------
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage of the current turn (does nothing outside a turn)."""
+    current = _current_turn.get()
+    if current is None:
+        yield None
+        return
+    with current.span(name, **attributes) as stage:
+        yield stage
+
+
+def traced_stream(name, pieces, **attributes):
+    """Time a streamed stage of the current turn (see ``Turn.stream``)."""
+    current = _current_turn.get()
+    if current is None:
+        return pieces
+    return current.stream(name, pieces, **attributes)
+
+
+def tracer_from_env():
+    """Tracer configured from RAG_TRACE_FILE, RAG_TRACE_OTLP and RAG_TRACE_KEEP."""
+    return Tracer(
+        jsonl_path=os.environ.get("RAG_TRACE_FILE") or None,
+        otlp_endpoint=os.environ.get("RAG_TRACE_OTLP") or None,
+        keep_turns=int(os.environ.get("RAG_TRACE_KEEP", "50")),
+    )
+
+
+def debug_panel_enabled(variable="RAG_TRACE_PANEL"):
+    """True when the in-app latency panel should be shown."""
+    return os.environ.get(variable) == "1"
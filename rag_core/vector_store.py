@@ -0,0 +1,358 @@
+"""
+Compact in-memory vector store for chunk embeddings.
+
+Chroma keeps every embedding as a list of Python floats, which is a lot of
+memory per session once a big PDF is loaded. ``QuantizedVectorStore`` keeps
+all vectors in one contiguous NumPy array instead, stored either as:
+
+- ``"float32"`` - full precision (4 bytes per dimension)
+- ``"float16"`` - half precision (2 bytes per dimension)
+- ``"int8"``    - scalar quantized with one float32 scale per vector
+                  (1 byte per dimension + 4 bytes per vector)
+
+Search runs directly on the compact vectors. Optionally, a full-precision
+copy can be kept and used to re-rank the top candidates exactly.
+
+The store mimics the small part of the Chroma collection API the apps use
+(``add``, ``query`` and ``count``), so ``search_documents`` works unchanged.
+``query`` also takes a Chroma-style ``where`` filter on the metadata; only
+the rows that pass it are scored (see ``where_mask``).
+
+Vectors can be added while other threads search (a PDF that is still being
+indexed, see rag_core/ingest_jobs.py): each search works on the rows that
+were complete when it started.
+"""
+
+import threading
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# Rows scored per step while searching, so int8/float16 blocks are widened
+# to float32 a slice at a time instead of all at once.
+SEARCH_BLOCK_ROWS = 4096
+
+# Queries scored together in one matrix product by ``search_batch``
+SEARCH_BLOCK_QUERIES = 256
+
+
+def normalize_rows(vectors):
+    """Scale every row to unit length (zero rows are left as zeros)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_COMPARISONS = {
+    "$gt": np.greater, "$gte": np.greater_equal,
+    "$lt": np.less, "$lte": np.less_equal,
+}
+
+
+def _column(metadatas, key, columns, numeric):
+    """One metadata field of every row as an array, cached in `columns`."""
+    cache_key = (key, numeric)
+    if cache_key not in columns:
+        values = [metadata.get(key) if metadata else None for metadata in metadatas]
+        if numeric:
+            # Missing or non-numeric values are NaN, which fails every comparison
+            columns[cache_key] = np.array(
+                [value if isinstance(value, (int, float)) and not isinstance(value, bool)
+                 else np.nan for value in values], dtype=np.float64)
+        else:
+            columns[cache_key] = np.array(values, dtype=object)
+    return columns[cache_key]
+
+
+def where_mask(metadatas, where, columns=None):
+    """
+    Which rows pass a Chroma-style ``where`` filter.
+
+    Supports field equality (``{"kind": "row"}``), ``$eq``, ``$ne``, ``$in``,
+    ``$nin``, ``$gt``, ``$gte``, ``$lt``, ``$lte`` and nesting with ``$and``
+    / ``$or``. Each field is turned into an array once and kept in
+    `columns`, so repeated queries compare whole columns at a time.
+
+    Args:
+        metadatas: One metadata dict (or None) per row
+        where: The filter
+        columns: Dict to cache field arrays in (pass the same one each time)
+
+    Returns:
+        numpy.ndarray: Boolean mask, one entry per row
+    """
+    columns = {} if columns is None else columns
+    mask = np.ones(len(metadatas), dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(metadatas, clause, columns)
+        elif key == "$or":
+            either = np.zeros(len(metadatas), dtype=bool)
+            for clause in condition:
+                either |= where_mask(metadatas, clause, columns)
+            mask &= either
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op in _COMPARISONS:
+                    mask &= _COMPARISONS[op](_column(metadatas, key, columns, True), value)
+                elif op == "$eq":
+                    mask &= _column(metadatas, key, columns, False) == value
+                elif op == "$ne":
+                    mask &= _column(metadatas, key, columns, False) != value
+                elif op in ("$in", "$nin"):
+                    found = np.isin(_column(metadatas, key, columns, False), list(value))
+                    mask &= found if op == "$in" else ~found
+                else:
+                    raise ValueError(f"Unsupported where operator {op!r}")
+    return mask
+
+
+def quantize_int8(vectors):
+    """
+    Scalar-quantize float vectors to int8 with one scale per vector.
+
+    Args:
+        vectors: 2D float array, one embedding per row
+
+    Returns:
+        tuple: (int8 codes, float32 scales) where codes * scale ~= vector
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127)
+    return codes.astype(np.int8), scales.astype(np.float32)
+
+
+class QuantizedVectorStore:
+    """
+    Vector index holding embeddings in a compact contiguous array.
+
+    Args:
+        dtype: "float32", "float16" or "int8"
+        keep_full_precision: Also keep float32 vectors for exact re-ranking
+        rerank_candidates: How many compact-search hits to re-rank exactly
+            (0 means "4x the requested results")
+    """
+
+    def __init__(self, dtype="int8", keep_full_precision=False, rerank_candidates=0):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"dtype must be one of {STORAGE_DTYPES}, got {dtype!r}")
+
+        self.dtype = dtype
+        self.keep_full_precision = keep_full_precision
+        self.rerank_candidates = rerank_candidates
+
+        self.dim = None
+        self._size = 0
+        self._codes = None
+        self._scales = None
+        self._full = None
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._columns = {}  # metadata fields as arrays, for where filters
+        self._lock = threading.Lock()  # add() vs. a search taking its snapshot
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def _reserve(self, extra_rows):
+        """Grow the backing arrays (by doubling) to fit extra_rows more."""
+        needed = self._size + extra_rows
+        capacity = 0 if self._codes is None else self._codes.shape[0]
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 64)
+        codes = np.zeros((new_capacity, self.dim), dtype=self.dtype)
+        scales = np.ones(new_capacity, dtype=np.float32)
+        full = None
+        if self.keep_full_precision:
+            full = np.zeros((new_capacity, self.dim), dtype=np.float32)
+
+        if self._size:
+            codes[:self._size] = self._codes[:self._size]
+            scales[:self._size] = self._scales[:self._size]
+            if full is not None:
+                full[:self._size] = self._full[:self._size]
+
+        self._codes, self._scales, self._full = codes, scales, full
+
+    def add(self, embeddings, documents, ids, metadatas=None):
+        """
+        Add embeddings with their chunk texts.
+
+        Args:
+            embeddings: 2D array or list of vectors (one per document)
+            documents: List of chunk texts
+            ids: List of unique chunk IDs
+            metadatas: Optional list of metadata dicts
+        """
+        vectors = normalize_rows(embeddings)
+        if len(vectors) != len(documents) or len(documents) != len(ids):
+            raise ValueError("embeddings, documents and ids must have the same length")
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-dim embeddings, got {vectors.shape[1]}")
+
+        with self._lock:
+            self._reserve(len(vectors))
+            rows = slice(self._size, self._size + len(vectors))
+
+            if self.dtype == "int8":
+                self._codes[rows], self._scales[rows] = quantize_int8(vectors)
+            else:
+                self._codes[rows] = vectors.astype(self.dtype)
+            if self.keep_full_precision:
+                self._full[rows] = vectors
+
+            self.ids.extend(ids)
+            self.documents.extend(documents)
+            self.metadatas.extend(metadatas if metadatas is not None else [None] * len(ids))
+            # A new dict rather than clearing the old one: searches already
+            # running keep the columns that match their snapshot
+            self._columns = {}
+            self._size += len(vectors)
+
+    def _snapshot(self):
+        """Row count, arrays and column cache as of now, consistent with each other."""
+        with self._lock:
+            return self._size, self._codes, self._scales, self._full, self._columns
+
+    def count(self):
+        """Number of stored vectors."""
+        return self._size
+
+    def memory_bytes(self):
+        """Bytes used by the vector arrays (excluding chunk texts)."""
+        if self._codes is None:
+            return 0
+        used = self._codes[:self._size].nbytes
+        if self.dtype == "int8":
+            used += self._scales[:self._size].nbytes
+        if self._full is not None:
+            used += self._full[:self._size].nbytes
+        return used
+
+    # ------------------------------------------------------------------
+    # Searching
+    # ------------------------------------------------------------------
+
+    def _compact_scores(self, queries, rows=None, snapshot=None):
+        """
+        Cosine similarity of unit queries (one per row) against every stored
+        vector, or only against `rows` (indices) when given.
+        """
+        total, codes, scales, _, _ = snapshot or self._snapshot()
+        size = total if rows is None else len(rows)
+        scores = np.empty((len(queries), size), dtype=np.float32)
+        for start in range(0, size, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, size)
+            if rows is None:
+                block = codes[start:stop].astype(np.float32)
+            else:
+                block = codes[rows[start:stop]].astype(np.float32)
+            scores[:, start:stop] = queries @ block.T
+        if self.dtype == "int8":
+            scores *= scales[:total] if rows is None else scales[rows]
+        return scores
+
+    def search(self, query_embedding, n_results=5, rerank=None, where=None):
+        """
+        Find the closest stored vectors to one query.
+
+        Args:
+            query_embedding: 1D query vector
+            n_results: How many hits to return
+            rerank: Re-rank with full-precision vectors (defaults to
+                keep_full_precision)
+            where: Only consider rows whose metadata passes this filter
+
+        Returns:
+            list: (row index, cosine similarity) pairs, best first
+        """
+        return self.search_batch([query_embedding], n_results, rerank, where)[0]
+
+    def search_batch(self, query_embeddings, n_results=5, rerank=None, where=None):
+        """
+        Like ``search`` for many queries, scored together as matrix products.
+
+        Args:
+            query_embeddings: 2D array or list of query vectors
+
+        Returns:
+            list: One list of (row index, cosine similarity) pairs per query
+        """
+        queries = normalize_rows(query_embeddings)
+        snapshot = self._snapshot()
+        total, _, _, full, columns = snapshot
+        rows = None
+        if where is not None and total:
+            metadatas = self.metadatas if len(self.metadatas) == total else self.metadatas[:total]
+            rows = np.flatnonzero(where_mask(metadatas, where, columns))
+        size = total if rows is None else len(rows)
+        if size == 0:
+            return [[] for _ in queries]
+
+        n_results = min(n_results, size)
+        if rerank is None:
+            rerank = self.keep_full_precision
+        if rerank and full is None:
+            raise ValueError("re-ranking needs keep_full_precision=True")
+
+        n_candidates = n_results
+        if rerank:
+            n_candidates = min(size, max(n_results, self.rerank_candidates or 4 * n_results))
+
+        results = []
+        for start in range(0, len(queries), SEARCH_BLOCK_QUERIES):
+            block = queries[start:start + SEARCH_BLOCK_QUERIES]
+            scores = self._compact_scores(block, rows, snapshot)
+            candidates = np.argpartition(-scores, n_candidates - 1, axis=1)[:, :n_candidates]
+            for query, row_scores, row_candidates in zip(block, scores, candidates):
+                # Positions in the filtered scores -> row indices
+                row_ids = row_candidates if rows is None else rows[row_candidates]
+                if rerank:
+                    exact = full[row_ids] @ query
+                    order = np.argsort(-exact)[:n_results]
+                    results.append([(int(row_ids[i]), float(exact[i])) for i in order])
+                else:
+                    candidate_scores = row_scores[row_candidates]
+                    order = np.argsort(-candidate_scores)[:n_results]
+                    results.append([(int(row_ids[i]), float(candidate_scores[i]))
+                                    for i in order])
+        return results
+
+    def query(self, query_embeddings, n_results=5, rerank=None, where=None):
+        """
+        Chroma-style query.
+
+        Args:
+            query_embeddings: List of query vectors
+            n_results: How many hits per query
+            rerank: See ``search``
+            where: Metadata filter (see ``where_mask``)
+
+        Returns:
+            dict: "ids", "documents", "metadatas" and "distances" (cosine
+            distance), each a list with one inner list per query
+        """
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for hits in self.search_batch(query_embeddings, n_results=n_results, rerank=rerank,
+                                      where=where):
+            results["ids"].append([self.ids[i] for i, _ in hits])
+            results["documents"].append([self.documents[i] for i, _ in hits])
+            results["metadatas"].append([self.metadatas[i] for i, _ in hits])
+            results["distances"].append([1.0 - score for _, score in hits])
+        return results
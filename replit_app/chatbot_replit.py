@@ -3,17 +3,36 @@ AI Chatbot Workshop - Replit Version
 This version uses the Anthropic API instead of Ollama so it works in cloud environments.
 
 To use in Replit:
-1. Add ANTHROPIC_API_KEY to Secrets (left sidebar, lock icon)
-2. Click Run!
+1. Upload this file as main.py, and the rag_core/ folder next to it
+   (see REPLIT_BASIC_README.md)
+2. Add ANTHROPIC_API_KEY to Secrets (left sidebar, lock icon)
+3. Click Run!
 """
 
-import streamlit as st
-from anthropic import Anthropic
-from sentence_transformers import SentenceTransformer
-import chromadb
-from duckduckgo_search import DDGS
-import PyPDF2
 import os
+import sys
+import uuid
+
+# Shared helpers live in rag_core/ at the repository root (on Replit: next
+# to main.py, which is on the import path already)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag_core import profiling
+profiling.start_from_env()  # RAG_PROFILE_STARTUP=1 reports import costs
+
+from rag_core import tracing
+
+import streamlit as st
+from rag_core.chat_history import HistoryView
+from rag_core.embeddings import load_embedding_model
+from rag_core.llm_backends import backend_from_env
+from rag_core.prompts import build_turn_messages, conversation_history
+from rag_core.scheduler import LLMScheduler, SchedulerBusy, classify_priority
+from rag_core.sessions import MessageHistory
+
+# The heavy libraries (sentence_transformers, chromadb, PyPDF2 and
+# duckduckgo_search) are imported inside the functions that use them.
+# That way the chat page shows up right away, and you only wait for them
+# the first time you upload a document or search the web.
 
 # ============================================================================
 # SETUP
@@ -23,21 +42,55 @@ st.set_page_config(page_title="AI Chatbot Workshop", page_icon="🤖", layout="w
 st.title("🤖 AI Chatbot with RAG & Search")
 st.caption("Built from scratch in Python! (Replit Version)")
 
-# Initialize Anthropic client
+# Connect to Claude once per server (the connection is reused by every session)
 # In Replit, set ANTHROPIC_API_KEY in Secrets
+@st.cache_resource
+def get_llm_backend():
+    return backend_from_env(default_backend="anthropic", default_model="claude-3-5-sonnet-20241022")
+
 try:
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    llm = get_llm_backend()
 except:
     st.error("⚠️ Please add ANTHROPIC_API_KEY to Secrets (lock icon in left sidebar)")
     st.stop()
 
+# Chat messages shown at once (older ones load with a button)
+HISTORY_WINDOW = 20
+
 # Initialize session state
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # Chat history; the oldest messages are dropped once it gets very long
+    st.session_state.messages = MessageHistory()
 
 if "documents_loaded" not in st.session_state:
     st.session_state.documents_loaded = False
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Which chat messages to show (each one is prepared for display only once)
+if "history_view" not in st.session_state:
+    st.session_state.history_view = HistoryView(window=HISTORY_WINDOW, page_size=HISTORY_WINDOW)
+
+
+@st.cache_resource
+def get_llm_scheduler():
+    """
+    One scheduler shared by every session on this server.
+    It limits how many Claude calls run at once (set LLM_CONCURRENCY to change it)
+    and turns people away early when the line is too long.
+    """
+    return LLMScheduler(
+        max_concurrency=int(os.environ.get("LLM_CONCURRENCY", "4")),
+        max_queue_wait=float(os.environ.get("LLM_MAX_WAIT", "30"))
+    )
+
+
+@st.cache_resource
+def get_tracer():
+    """Times each step of every answer (RAG_TRACE_FILE=traces.jsonl saves them)."""
+    return tracing.tracer_from_env()
+
 
 # ============================================================================
 # DOCUMENT PROCESSING (RAG)
@@ -45,10 +98,12 @@ if "documents_loaded" not in st.session_state:
 
 def extract_text_from_pdf(pdf_file):
     """Extract all text from a PDF file."""
+    import PyPDF2
+    
     pdf_reader = PyPDF2.PdfReader(pdf_file)
     text = ""
     for page in pdf_reader.pages:
-        text += page.extract_text()
+        text += page.extract_text() or ""  # None for scanned pages
     return text
 
 
@@ -66,10 +121,13 @@ def chunk_text(text, chunk_size=500, overlap=50):
     return chunks
 
 
-def setup_vector_database(text_chunks):
-    """Create a vector database from text chunks."""
+def setup_vector_database(text_chunks, metadatas=None):
+    """Create a vector database from text chunks (and one metadata dict per chunk)."""
     st.info("📊 Converting text to embeddings...")
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    import chromadb
+    
+    # One copy of the model is shared by everyone using the app
+    embedding_model = load_embedding_model('all-MiniLM-L6-v2')
     
     client = chromadb.Client()
     
@@ -80,16 +138,19 @@ def setup_vector_database(text_chunks):
     
     collection = client.create_collection("documents")
     
-    for i, chunk in enumerate(text_chunks):
-        embedding = embedding_model.encode(chunk).tolist()
-        collection.add(
-            embeddings=[embedding],
-            documents=[chunk],
-            ids=[f"chunk_{i}"]
-        )
+    with tracing.span("index_build", chunks=len(text_chunks)):
+        if metadatas is None:
+            metadatas = [{"chunk_index": i} for i in range(len(text_chunks))]
+        for i, (chunk, metadata) in enumerate(zip(text_chunks, metadatas)):
+            embedding = embedding_model.encode(chunk).tolist()
+            collection.add(
+                embeddings=[embedding],
+                documents=[chunk],
+                ids=[f"chunk_{i}"],
+                metadatas=[metadata]
+            )
     
     st.session_state.collection = collection
-    st.session_state.embedding_model = embedding_model
     st.success(f"✅ Processed {len(text_chunks)} chunks!")
 
 
@@ -98,12 +159,14 @@ def search_documents(query, n_results=3):
     if "collection" not in st.session_state:
         return None
     
-    query_embedding = st.session_state.embedding_model.encode(query).tolist()
+    with tracing.span("embed_query"):
+        query_embedding = load_embedding_model('all-MiniLM-L6-v2').encode(query).tolist()
     
-    results = st.session_state.collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
+    with tracing.span("vector_query"):
+        results = st.session_state.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results
+        )
     
     relevant_text = "\n\n".join(results['documents'][0])
     return relevant_text
@@ -115,6 +178,8 @@ def search_documents(query, n_results=3):
 
 def google_search(query, max_results=3):
     """Search Google using DuckDuckGo API."""
+    from duckduckgo_search import DDGS
+    
     try:
         with DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
@@ -166,37 +231,24 @@ Be conversational and helpful!"""
     should_search = any(keyword in user_message.lower() for keyword in search_keywords)
     
     if should_search:
-        search_results = google_search(user_message)
+        with tracing.span("google_search"):
+            search_results = google_search(user_message)
         context += f"\n\n{search_results}"
     
-    # Add context to system message
-    if context:
-        system_message += f"\n\nADDITIONAL CONTEXT:{context}"
-    
     # Prepare messages for Claude API
-    # Note: Claude API format is slightly different from Ollama
-    api_messages = []
-    
-    for msg in st.session_state.messages:
-        api_messages.append({
-            "role": msg["role"],
-            "content": msg["content"]
-        })
-    
-    api_messages.append({
-        "role": "user",
-        "content": user_message
-    })
-    
-    # Call Claude API
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20241022",  # Using Claude 3.5 Sonnet
-        max_tokens=1024,
-        system=system_message,
-        messages=api_messages
-    )
-    
-    return response.content[0].text
+    # Note: the system message is passed separately, not as a message.
+    # It never changes, and the history only grows at the end, so Claude can
+    # reuse its prompt cache for them; this turn's context goes last.
+    history = conversation_history(st.session_state.messages, user_message)
+    api_messages = build_turn_messages(history, user_message, context, "ADDITIONAL CONTEXT")
+    
+    # Call Claude API (waits for a free slot; raises SchedulerBusy if the line is too long)
+    priority = classify_priority(user_message)
+    with get_llm_scheduler().slot(st.session_state.session_id, priority):
+        with tracing.span("llm"):
+            response = llm.complete(system_message, api_messages, max_tokens=1024)
+    
+    return response
 
 
 # ============================================================================
@@ -215,18 +267,27 @@ with st.sidebar:
     )
     
     if uploaded_files and st.button("Process Documents"):
-        all_text = ""
-        
-        for uploaded_file in uploaded_files:
-            if uploaded_file.type == "application/pdf":
-                text = extract_text_from_pdf(uploaded_file)
-            else:
-                text = uploaded_file.read().decode()
+        with get_tracer().turn("ingest", files=len(uploaded_files)):
+            texts = []
             
-            all_text += text + "\n\n"
-        
-        chunks = chunk_text(all_text)
-        setup_vector_database(chunks)
+            with tracing.span("extract_pdf"):
+                for uploaded_file in uploaded_files:
+                    if uploaded_file.type == "application/pdf":
+                        text = extract_text_from_pdf(uploaded_file)
+                    else:
+                        text = uploaded_file.read().decode()
+                    
+                    texts.append((uploaded_file.name, text))
+            
+            chunks, metadatas = [], []
+            with tracing.span("chunk_text"):
+                for name, text in texts:
+                    file_chunks = chunk_text(text)
+                    chunks.extend(file_chunks)
+                    metadatas.extend(
+                        {"source": name, "chunk_index": i} for i in range(len(file_chunks))
+                    )
+            setup_vector_database(chunks, metadatas)
         st.session_state.documents_loaded = True
     
     if st.session_state.documents_loaded:
@@ -235,16 +296,29 @@ with st.sidebar:
     st.divider()
     
     if st.button("🗑️ Clear Chat"):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
         st.rerun()
+    
+    with st.expander("📈 Prompt cache"):
+        usage = llm.usage_totals()
+        st.caption(
+            f"Cached prompt tokens: {usage['cached_prompt_tokens']:,} · "
+            f"Uncached: {usage['uncached_prompt_tokens']:,}"
+        )
 
 # Main chat interface
 st.write("### Chat")
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.write(message["content"])
+# Display chat history - only the latest messages, so long chats stay fast.
+# Older ones are behind a "show earlier" button.
+history_view = st.session_state.history_view
+hidden, shown = history_view.visible(st.session_state.messages)
+if hidden and st.button(history_view.earlier_label(hidden)):
+    history_view.show_earlier()
+    hidden, shown = history_view.visible(st.session_state.messages)
+for item in shown:
+    with st.chat_message(item["role"]):
+        st.markdown(item["body"])
 
 # Chat input
 if prompt := st.chat_input("Type your message here..."):
@@ -257,11 +331,19 @@ if prompt := st.chat_input("Type your message here..."):
     # Get AI response
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
-            response = chat_with_ai(prompt)
-            st.write(response)
-    
-    # Add AI response
-    st.session_state.messages.append({"role": "assistant", "content": response})
+            try:
+                with get_tracer().turn("chat"):
+                    response = chat_with_ai(prompt)
+                st.write(response)
+            except SchedulerBusy as busy:
+                response = None
+                st.warning(f"🚦 {busy}")
+    
+    # Add AI response (or take the question back out if we were too busy)
+    if response is None:
+        st.session_state.messages.pop()
+    else:
+        st.session_state.messages.append({"role": "assistant", "content": response})
 
 # Instructions
 with st.expander("ℹ️ How to use this chatbot"):
@@ -288,3 +370,9 @@ with st.expander("ℹ️ How to use this chatbot"):
 # Teaching note
 st.sidebar.divider()
 st.sidebar.caption("💡 **For Instructors:** This version uses Claude API instead of Ollama so it works in cloud environments like Replit, Colab, or shared servers.")
+
+# Startup profile (only shown when RAG_PROFILE_STARTUP=1)
+if profiling.enabled():
+    profiling.mark_interactive()
+    with st.expander("⏱️ Startup profile"):
+        st.code(profiling.format_report())